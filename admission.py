@@ -0,0 +1,93 @@
+import threading
+import time
+
+from config import DASHBOARD_MAX_CONCURRENCY, DASHBOARD_QUEUE_SIZE, DASHBOARD_QUEUE_TIMEOUT
+from metrics import registry
+
+admission_in_flight = registry.gauge(
+    "weather_admission_in_flight", "Requests admitted by an admission gate and still running, by route.")
+admission_queue_depth = registry.gauge(
+    "weather_admission_queue_depth", "Requests waiting for an admission gate, by route.")
+admission_wait_seconds = registry.histogram(
+    "weather_admission_wait_seconds", "Seconds requests waited for an admission gate, by route and outcome.")
+admission_shed = registry.counter(
+    "weather_admission_shed_total", "Requests an admission gate turned away, by route and response (degraded, rejected).")
+
+
+class AdmissionGate:
+    """
+    Bounds the concurrent requests of a route, with a bounded queue and a wait deadline.
+
+    Up to `limit` requests run at once. Further requests wait in arrival order, up to
+    `queue_size` of them and for at most `timeout` seconds each; requests arriving at a full
+    queue, or still waiting at their deadline, are not admitted and the caller sheds them
+    (a cheaper response or 503). Under a spike the server thus keeps its latency for the
+    admitted requests instead of slowing every request down.
+
+    Args:
+        route (str): The route name, used as the metric label.
+        limit (int): The requests running at once.
+        queue_size (int): The requests waiting at once.
+        timeout (float): The seconds a request may wait.
+
+    Usage Example:
+        >>> gate = AdmissionGate('weather', limit=4, queue_size=16, timeout=2.0)
+        >>> if gate.enter():
+        ...     try:
+        ...         render()
+        ...     finally:
+        ...         gate.leave()
+    """
+
+    def __init__(self, route: str, limit: int, queue_size: int, timeout: float) -> None:
+        self.route = route
+        self.limit = max(limit, 1)
+        self.queue_size = max(queue_size, 0)
+        self.timeout = timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self._condition = threading.Condition()
+        admission_in_flight.set(0, route=route)
+        admission_queue_depth.set(0, route=route)
+
+    def enter(self) -> bool:
+        """
+        Waits for a slot; returns whether the request was admitted. Admitted requests must call `leave`.
+        """
+        started = time.perf_counter()
+        with self._condition:
+            # Newcomers queue behind waiting requests; the condition wakes waiters in arrival order
+            if self.waiting or self.in_flight >= self.limit:
+                if self.waiting >= self.queue_size:
+                    admission_wait_seconds.observe(0.0, route=self.route, outcome="shed")
+                    return False
+                self.waiting += 1
+                admission_queue_depth.set(self.waiting, route=self.route)
+                deadline = time.monotonic() + self.timeout
+                try:
+                    while self.in_flight >= self.limit:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            admission_wait_seconds.observe(time.perf_counter() - started, route=self.route, outcome="shed")
+                            return False
+                        self._condition.wait(remaining)
+                finally:
+                    self.waiting -= 1
+                    admission_queue_depth.set(self.waiting, route=self.route)
+            self.in_flight += 1
+            admission_in_flight.set(self.in_flight, route=self.route)
+        admission_wait_seconds.observe(time.perf_counter() - started, route=self.route, outcome="admitted")
+        return True
+
+    def leave(self) -> None:
+        """
+        Frees the slot of an admitted request for the longest waiting one.
+        """
+        with self._condition:
+            self.in_flight -= 1
+            admission_in_flight.set(self.in_flight, route=self.route)
+            self._condition.notify()
+
+
+# Gate of the dashboard route; each admitted request fetches three data sets and renders six charts
+dashboard_gate = AdmissionGate("weather", DASHBOARD_MAX_CONCURRENCY, DASHBOARD_QUEUE_SIZE, DASHBOARD_QUEUE_TIMEOUT)
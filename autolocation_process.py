@@ -1,5 +1,8 @@
 import requests
 
+from config import OPENWEATHERMAP_API_KEY, OWM_API_BASE_URL
+from metrics import upstream_request_seconds
+
 def get_city_name_auto(coordinates: str) -> str:
     """
     Fetches the city name based on the provided latitude and longitude coordinates.
@@ -21,10 +24,11 @@ def get_city_name_auto(coordinates: str) -> str:
     lat, lon = map(float, coordinates.split(","))
     
     # Use OpenWeatherMap API to get the city name
-    api_key="your_api_key_here"  #Replace your API keys here
-    url = f"https://api.openweathermap.org/geo/1.0/reverse?lat={lat}&lon={lon}&limit=1&appid={api_key}"
+    api_key = OPENWEATHERMAP_API_KEY  # Configured in config.py or through the environment
+    url = f"{OWM_API_BASE_URL}/geo/1.0/reverse?lat={lat}&lon={lon}&limit=1&appid={api_key}"
     
-    response = requests.get(url)
+    with upstream_request_seconds.time(endpoint="reverse"):
+        response = requests.get(url)
     data = response.json()
     
     # Extract the city name and remove "City" from it because Chinese city name with "city" like "Guangzhou City" could be found but "Guangzhou" can.
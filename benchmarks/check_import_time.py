@@ -0,0 +1,104 @@
+"""
+Import-time budget check of the application entry points.
+
+Each entry point is imported in a fresh interpreter, after the web framework it
+builds on, so the measured time is what this project's modules add to a cold
+start or a worker spawn. The check fails when that time exceeds the budget, when
+a module that should load on first use (matplotlib, numpy, Flask, ...) is loaded
+by the import, or when importing blocks on input.
+
+Usage:
+    python benchmarks/check_import_time.py                  # Check against the default budget
+    python benchmarks/check_import_time.py --budget-ms 80 --runs 5
+
+The script exits with status 1 when any entry point breaks its budget.
+tests/test_import_time.py runs the same check with the default budget in CI.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_BUDGET_MS = 100.0
+
+# Entry points, the framework modules imported before timing (their cost is not this
+# project's), and the modules the entry point's import must not load
+ENTRY_POINTS: Dict[str, Tuple[Tuple[str, ...], Tuple[str, ...]]] = {
+    "main_app": (("fasthtml.common", "fasthtml.pico", "starlette.responses", "uvicorn"),
+                 ("matplotlib", "numpy", "PIL", "flask", "fastapi", "requests")),
+    "make_API_runnable": (("flask",), ("matplotlib", "numpy", "PIL", "fastapi", "requests")),
+}
+
+_PROBE = """
+import json, sys, time
+for name in {framework!r}:
+    __import__(name)
+before = set(sys.modules)
+start = time.perf_counter()
+__import__({module!r})
+elapsed = time.perf_counter() - start
+loaded = sorted({{name.split(".")[0] for name in set(sys.modules) - before}})
+print(json.dumps({{"seconds": elapsed, "loaded": loaded}}))
+"""
+
+
+def measure_import(module: str, framework: Tuple[str, ...]) -> Dict:
+    """
+    Imports a module in a fresh interpreter with no input available.
+
+    Args:
+        module (str): The module to import.
+        framework (tuple): The modules imported before the timed import.
+
+    Returns:
+        dict: The import time in seconds and the top-level packages the import loaded.
+    """
+    code = _PROBE.format(framework=framework, module=module)
+    environment = dict(os.environ, WEATHER_API_CITY="", MPLBACKEND="Agg")
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=environment, stdin=subprocess.DEVNULL,
+                            capture_output=True, text=True, timeout=60)
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def check_entry_point(module: str, runs: int = 3) -> Tuple[float, List[str]]:
+    """
+    Imports an entry point of ENTRY_POINTS `runs` times in fresh interpreters.
+
+    Returns:
+        tuple: The fastest import time in milliseconds, and the forbidden modules the import loaded.
+
+    Usage Example:
+        >>> check_entry_point('main_app')
+        (19.5, [])
+    """
+    framework, forbidden = ENTRY_POINTS[module]
+    measured = [measure_import(module, framework) for _ in range(runs)]
+    best_ms = min(run["seconds"] for run in measured) * 1000
+    return best_ms, sorted(set(forbidden) & set(measured[0]["loaded"]))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help="allowed import time of each entry point")
+    parser.add_argument("--runs", type=int, default=3, help="imports per entry point; the fastest one is compared")
+    args = parser.parse_args()
+
+    failed = False
+    for module in ENTRY_POINTS:
+        best_ms, eager = check_entry_point(module, args.runs)
+        status = "ok" if best_ms <= args.budget_ms and not eager else "FAIL"
+        failed = failed or status == "FAIL"
+        print(f"{module:<20} {best_ms:>8.1f} ms (budget {args.budget_ms:.0f} ms)  {status}")
+        if eager:
+            print(f"{'':<20} loaded at import time instead of on first use: {', '.join(eager)}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""
+Compares rendering the dashboard charts as six figures with rendering them as one atlas figure.
+
+Both paths draw the same panels with the draw functions of visualization.py, on the recorded
+fixtures, and are timed by phase: figure setup (creating the figures, drawing the artists and
+the layout passes), PNG encoding (rasterizing and compressing, twice per figure saved with
+bbox_inches='tight') and base64.
+
+Usage:
+    python benchmarks/compare_chart_atlas.py
+    python benchmarks/compare_chart_atlas.py --iterations 20 --no-table   # As with FORECAST_TABLE_RENDERER=html
+"""
+import argparse
+import base64
+import os
+import sys
+import time
+from io import BytesIO
+from typing import Any, Callable, Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+from owm_stub import OWMStub, load_fixture  # noqa: E402
+from run_benchmarks import percentile  # noqa: E402
+
+
+def panel_arguments(with_table: bool) -> Dict[str, tuple]:
+    """
+    Returns the draw function arguments of every panel, processed from the recorded fixtures.
+    """
+    from processingdata import processing_data_now, processing_data_today, processing_data_five_days
+
+    temperature, humidity, _, _, _, _ = processing_data_now(load_fixture("weather"))
+    wind_speeds, wind_directions = processing_data_today(load_fixture("forecast_8"))
+    highs, lows, averages, dates, icons, conditions, chances = processing_data_five_days(load_fixture("forecast_40"))
+    panels = {
+        'wind_rose': (wind_speeds, wind_directions),
+        'temperature_progressbar': (temperature, 'metric'),
+        'temperature_chart': (highs, lows, averages, dates, 'metric'),
+        'humidity_gauge': (humidity,),
+        'precipitation_pies': (chances, dates),
+    }
+    if with_table:
+        panels['forecast_table'] = (icons, conditions, dates)
+    return panels
+
+
+def six_figures(panels: Dict[str, tuple]) -> Dict[str, float]:
+    """
+    Renders the panels as the create_* functions of visualization.py do; returns the seconds of each phase and the sizes.
+    """
+    import matplotlib.pyplot as plt
+    import visualization
+
+    # The figure size, tight_layout call and savefig arguments of each create_* function
+    standalone: Dict[str, Tuple[Tuple[float, float], bool, Dict[str, Any]]] = {
+        'temperature_progressbar': ((6, 0.5), False, dict(bbox_inches='tight', pad_inches=0.2)),
+        'humidity_gauge': ((4, 3), False, dict(bbox_inches='tight', pad_inches=0.2)),
+        'wind_rose': ((7, 7), False, {}),
+        'temperature_chart': ((6, 3.5), False, dict(bbox_inches='tight')),
+        'precipitation_pies': ((15, 5), True, dict(bbox_inches='tight', pad_inches=0.2)),
+        'forecast_table': ((15, 6), True, dict(bbox_inches='tight', pad_inches=0.2)),
+    }
+    draw_names = {'precipitation_pies': 'draw_precipitation_chances_pie_charts', 'forecast_table': 'draw_weather_forecast_table'}
+    result = {"setup": 0.0, "encode": 0.0, "base64": 0.0, "pixels": 0, "png_bytes": 0}
+    for name, arguments in panels.items():
+        figsize, tight_layout, savefig_kwargs = standalone[name]
+        started = time.perf_counter()
+        fig = plt.figure(figsize=figsize, dpi=100)
+        getattr(visualization, draw_names.get(name, f"draw_{name}"))(fig, *arguments)
+        if tight_layout:
+            fig.tight_layout()
+        drawn = time.perf_counter()
+        buffer = BytesIO()
+        fig.savefig(buffer, format='png', **savefig_kwargs)
+        plt.close(fig)
+        encoded = time.perf_counter()
+        png = buffer.getvalue()
+        base64.b64encode(png).decode()
+        result["setup"] += drawn - started
+        result["encode"] += encoded - drawn
+        result["base64"] += time.perf_counter() - encoded
+        result["png_bytes"] += len(png)
+        result["pixels"] += int.from_bytes(png[16:20], "big") * int.from_bytes(png[20:24], "big")  # IHDR width, height
+    return result
+
+
+def atlas(panels: Dict[str, tuple]) -> Dict[str, float]:
+    """
+    Renders the panels as chart_atlas.create_chart_atlas does; returns the seconds of each phase and the sizes.
+    """
+    import matplotlib.pyplot as plt
+    from chart_atlas import build_atlas_figure
+
+    started = time.perf_counter()
+    fig, subfigures = build_atlas_figure(panels)
+    drawn = time.perf_counter()
+    buffer = BytesIO()
+    fig.savefig(buffer, format='png')
+    renderer = fig.canvas.get_renderer()
+    for subfigure in subfigures.values():
+        subfigure.get_tightbbox(renderer)  # The crops, measured by encode_atlas
+    plt.close(fig)
+    encoded = time.perf_counter()
+    png = buffer.getvalue()
+    base64.b64encode(png).decode()
+    return {"setup": drawn - started, "encode": encoded - drawn, "base64": time.perf_counter() - encoded,
+            "pixels": int.from_bytes(png[16:20], "big") * int.from_bytes(png[20:24], "big"), "png_bytes": len(png)}
+
+
+def compare(path: Callable[[Dict[str, tuple]], Dict[str, float]], panels: Dict[str, tuple],
+            iterations: int, warmup: int = 2) -> Dict[str, float]:
+    """
+    Runs a rendering path repeatedly; returns the p50 milliseconds of each phase and of the total, and the sizes.
+    """
+    for _ in range(warmup):
+        path(panels)
+    runs: List[Dict[str, float]] = [path(panels) for _ in range(iterations)]
+    result = {phase: percentile([run[phase] for run in runs], 0.5) * 1000 for phase in ("setup", "encode", "base64")}
+    result["total"] = percentile([run["setup"] + run["encode"] + run["base64"] for run in runs], 0.5) * 1000
+    result["pixels"] = runs[0]["pixels"]
+    result["png_bytes"] = runs[0]["png_bytes"]
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=10, help="Timed renders of each path")
+    parser.add_argument("--no-table", action="store_true", help="Leave out the forecast table, as with FORECAST_TABLE_RENDERER=html")
+    args = parser.parse_args()
+
+    OWMStub().install()  # The forecast table fetches its icons
+    panels = panel_arguments(with_table=not args.no_table)
+    print(f"{len(panels)} panels, p50 of {args.iterations} renders")
+    print(f"{'path':<12} {'setup ms':>9} {'encode ms':>10} {'base64 ms':>10} {'total ms':>9} {'pixels':>10} {'PNG KB':>7}")
+    for name, path in (("six figures", six_figures), ("atlas", atlas)):
+        result = compare(path, panels, args.iterations)
+        print(f"{name:<12} {result['setup']:>9.1f} {result['encode']:>10.1f} {result['base64']:>10.2f} "
+              f"{result['total']:>9.1f} {result['pixels']:>10,} {result['png_bytes'] / 1024:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
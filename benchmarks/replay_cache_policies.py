@@ -0,0 +1,109 @@
+"""
+Replays an access log against the cache eviction policies and compares their hit rates.
+
+Each line of the log is one access. Web server log lines are reduced to the city of
+their request (the city_name query parameter of the dashboard, or the city of an API
+path); any other line is used as the key as it is. Without a log, a synthetic trace is
+replayed: a few hundred popular cities with Zipf-distributed traffic, interleaved with a
+long tail of one-off cities such as typos and bot probes.
+
+Usage:
+    python benchmarks/replay_cache_policies.py                              # Synthetic trace
+    python benchmarks/replay_cache_policies.py access.log --sizes 64 256 1024
+    python benchmarks/replay_cache_policies.py --tail-share 0.5 --accesses 500000
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from typing import Iterable, List
+from urllib.parse import unquote_plus
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from cache_policy import LRUStore, TinyLFUStore  # noqa: E402
+from negative_cache import NegativeCache  # noqa: E402
+
+POLICIES = {"lru": LRUStore, "tinylfu": TinyLFUStore}
+
+_CITY_PATTERNS = (re.compile(r"[?&]city_name=([^&\s\"]+)"), re.compile(r"/api/v1\.0/(?:history|export)/([^/?\s\"]+)"))
+
+
+def key_of(line: str) -> str:
+    """
+    Returns the cache key of a log line: the normalized city of a request, or the line itself.
+
+    Usage Example:
+        >>> key_of('127.0.0.1 - - [18/Feb/2025:03:00:00 +0000] "GET /weather?city_name=Guang+Zhou HTTP/1.1" 200 5120')
+        'guang zhou'
+    """
+    for pattern in _CITY_PATTERNS:
+        match = pattern.search(line)
+        if match:
+            return NegativeCache.normalize(unquote_plus(match.group(1)))
+    return line.strip()
+
+
+def read_log(path: str) -> List[str]:
+    with open(path, encoding="utf-8", errors="replace") as log:
+        return [key_of(line) for line in log if line.strip()]
+
+
+def synthetic_trace(accesses: int, popular: int, tail_share: float, seed: int = 0) -> List[str]:
+    """
+    Builds a trace of Zipf-distributed accesses to `popular` cities, with `tail_share` of one-off keys.
+    """
+    rng = random.Random(seed)
+    weights = [1.0 / rank for rank in range(1, popular + 1)]
+    hot = rng.choices(range(popular), weights=weights, k=accesses)
+    return [f"tail-{index}" if rng.random() < tail_share else f"city-{hot[index]}" for index in range(accesses)]
+
+
+def replay(trace: Iterable[str], policy: str, size: int) -> tuple:
+    """
+    Replays a trace against an empty cache; returns the hit rate and the microseconds per access.
+    """
+    store = POLICIES[policy](size)
+    hits = accesses = 0
+    started = time.perf_counter()
+    for key in trace:
+        accesses += 1
+        if store.get(key) is not None:
+            hits += 1
+        else:
+            store.put(key, True)
+        # The dashboard caches the fetched data on a miss, like this loop
+    elapsed = time.perf_counter() - started
+    return hits / max(accesses, 1), elapsed / max(accesses, 1) * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("log", nargs="?", help="Access log to replay; a synthetic trace when omitted")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[64, 128, 256, 512, 1024], help="Cache sizes to compare")
+    parser.add_argument("--accesses", type=int, default=200_000, help="Accesses of the synthetic trace")
+    parser.add_argument("--popular", type=int, default=500, help="Popular cities of the synthetic trace")
+    parser.add_argument("--tail-share", type=float, default=0.3, help="Share of one-off keys in the synthetic trace")
+    args = parser.parse_args()
+
+    if args.log:
+        trace = read_log(args.log)
+        source = f"{args.log}: {len(trace)} accesses, {len(set(trace))} keys"
+    else:
+        trace = synthetic_trace(args.accesses, args.popular, args.tail_share)
+        source = (f"synthetic: {len(trace)} accesses, {args.popular} Zipf cities, "
+                  f"{args.tail_share:.0%} one-off keys")
+    print(source)
+    print(f"{'size':>6}  {'lru hit':>8}  {'tinylfu hit':>11}  {'gain':>7}  {'lru µs':>7}  {'tinylfu µs':>10}")
+    for size in args.sizes:
+        lru_hit, lru_cost = replay(trace, "lru", size)
+        lfu_hit, lfu_cost = replay(trace, "tinylfu", size)
+        print(f"{size:>6}  {lru_hit:>8.1%}  {lfu_hit:>11.1%}  {(lfu_hit - lru_hit) * 100:>+6.1f}p  "
+              f"{lru_cost:>7.2f}  {lfu_cost:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+"""
+Micro and macro benchmarks of the fetch, processing and rendering pipeline.
+
+By default all upstream requests are answered in-process from the recorded
+payloads in benchmarks/fixtures, so the numbers only measure this project's
+code. With --standin they go over HTTP to a local owm_standin.py server instead.
+
+Usage:
+    python benchmarks/run_benchmarks.py                   # Run and compare against benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --save-baseline   # Run and store the results as the new baseline
+    python benchmarks/run_benchmarks.py --only micro --iterations 50
+    python benchmarks/run_benchmarks.py --standin --standin-latency-ms 50   # Real HTTP against owm_standin.py
+    python benchmarks/run_benchmarks.py --require-baseline   # As in CI: a missing baseline fails the run
+
+The script exits with status 1 when a p50 or p95 latency, or the peak RSS, is
+worse than the baseline by more than the tolerance (20% by default). Without a
+baseline it only reports the results, unless --require-baseline is given, which
+makes it exit with status 2. Baselines depend on the machine, so none is
+committed: CI records one from the previous commit on the same runner.
+"""
+import argparse
+import base64
+import copy
+import itertools
+import json
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Measure the whole pipeline on every iteration: no snapshot or chart reuse, no history recording
+for _name, _value in {"WEATHER_CACHE_DB": "", "WEATHER_CACHE_TTL": "0", "SHARED_CACHE_BACKEND": "none",
+                      "CHART_CACHE_TTL": "0", "HISTORY_DIR": "", "TREND_ARCHIVE_DIR": "",
+                      "MPLBACKEND": "Agg"}.items():
+    os.environ.setdefault(_name, _value)
+
+from owm_stub import OWMStub, load_fixture, shift_forecast  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    """
+    Returns the nearest-rank percentile of a list of samples.
+
+    Usage Example:
+        >>> percentile([1.0, 2.0, 3.0, 4.0], 0.5)
+        2.0
+    """
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def peak_rss_mb() -> float:
+    """
+    Returns the peak resident set size of this process in megabytes.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024  # Bytes on macOS, kilobytes elsewhere
+
+
+def measure(function: Callable[[], object], iterations: int, warmup: int = 2) -> Dict[str, float]:
+    """
+    Times repeated calls of a function.
+
+    Args:
+        function (Callable): The code under test, called without arguments.
+        iterations (int): The number of timed calls.
+        warmup (int): The number of untimed calls made first.
+
+    Returns:
+        dict: p50, p95, p99 and mean latency in milliseconds, calls per second, and the peak RSS in megabytes.
+    """
+    for _ in range(warmup):
+        function()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return {
+        "p50_ms": percentile(samples, 0.50) * 1000,
+        "p95_ms": percentile(samples, 0.95) * 1000,
+        "p99_ms": percentile(samples, 0.99) * 1000,
+        "mean_ms": sum(samples) / len(samples) * 1000,
+        "ops_per_sec": len(samples) / sum(samples),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def measure_throughput(make_call: Callable[[], Callable[[], object]], concurrency: int, requests: int) -> Dict[str, float]:
+    """
+    Measures the throughput of concurrent clients.
+
+    Args:
+        make_call (Callable): Creates one client and returns the call it makes, once per thread.
+        concurrency (int): The number of client threads.
+        requests (int): The total number of calls.
+
+    Returns:
+        dict: Calls per second over the whole run and the peak RSS in megabytes.
+    """
+    calls = [make_call() for _ in range(concurrency)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(lambda index: calls[index % concurrency](), range(requests)))
+    elapsed = time.perf_counter() - start
+    return {"ops_per_sec": requests / elapsed, "peak_rss_mb": peak_rss_mb()}
+
+
+def micro_benchmarks(iterations: int) -> Dict[str, Dict[str, float]]:
+    """
+    Benchmarks the processing functions, each chart and the base64 encoding on their own.
+    """
+    from processingdata import processing_data_now, processing_data_today, processing_data_five_days, FiveDayAggregator
+    from visualization import (create_temperature_progressbar, create_humidity_gauge, create_wind_rose,
+                               create_temperature_chart, create_precipitation_chances_pie_charts,
+                               create_weather_forecast_table)
+    from chart_atlas import create_chart_atlas
+    from html_widgets import create_chart_data, create_chart_scripts, create_weather_forecast_table_html
+    from fasthtml.common import to_xml
+    from persistent_cache import PersistentCache
+
+    data_now = load_fixture("weather")
+    data_today = load_fixture("forecast_8")
+    data_five_days = load_fixture("forecast_40")
+    temperature, humidity, _, _, _, _ = processing_data_now(data_now)
+    wind_speeds, wind_directions = processing_data_today(data_today)
+    highs, lows, averages, dates, icons, conditions, chances = processing_data_five_days(data_five_days)
+    png = base64.b64decode(create_temperature_chart(highs, lows, averages, dates))
+    aggregator = FiveDayAggregator()
+    aggregator.process("benchmark", data_five_days)
+    # Alternates between the forecast and the same forecast one slot later, as a refresh every three hours
+    refreshes = itertools.cycle([shift_forecast(data_five_days, 1), copy.deepcopy(data_five_days)])
+    # A snapshot hit served from memory, and the same hit checked against the database as every hit was before
+    snapshots = PersistentCache(os.path.join(tempfile.mkdtemp(), "snapshots.sqlite3"))
+    snapshots.set("forecast|benchmark", data_five_days)
+
+    cases: Dict[str, Callable[[], object]] = {
+        "processing.now": lambda: processing_data_now(data_now),
+        "processing.today": lambda: processing_data_today(data_today),
+        "processing.five_days": lambda: processing_data_five_days(data_five_days),
+        "processing.five_days_unchanged": lambda: aggregator.process("benchmark", data_five_days),
+        "processing.five_days_shifted": lambda: aggregator.process("benchmark_shifted", next(refreshes)),
+        "chart.temperature_progressbar": lambda: create_temperature_progressbar(temperature),
+        "chart.humidity_gauge": lambda: create_humidity_gauge(humidity),
+        "chart.wind_rose": lambda: create_wind_rose(wind_speeds, wind_directions),
+        "chart.temperature_chart": lambda: create_temperature_chart(highs, lows, averages, dates),
+        "chart.precipitation_pies": lambda: create_precipitation_chances_pie_charts(chances, dates),
+        "chart.forecast_table": lambda: create_weather_forecast_table(icons, conditions, dates),
+        # All six charts in one figure, as CHART_RENDERER=atlas renders them (see compare_chart_atlas.py)
+        "chart.atlas": lambda: create_chart_atlas(temperature, humidity, wind_speeds, wind_directions, highs, lows, averages,
+                                                  chances, dates, icons, conditions),
+        "chart.forecast_table_html": lambda: to_xml(create_weather_forecast_table_html(icons, conditions, dates)),
+        # Everything the server does for the five charts when CHART_RENDERER=client
+        "chart.client_data_html": lambda: to_xml(create_chart_scripts(create_chart_data(
+            temperature, humidity, "metric", wind_speeds, wind_directions, highs, lows, averages, chances, dates))),
+        "encode.base64": lambda: base64.b64encode(png).decode(),
+        "cache.snapshot_hit": lambda: snapshots.get("forecast|benchmark", max_age=600),
+        "cache.snapshot_hit_revalidated": lambda: snapshots.get("forecast|benchmark", max_age=600, revalidate=True),
+    }
+    results = {}
+    for name, function in cases.items():
+        # Cheap functions get more iterations so their percentiles are stable
+        results[name] = measure(function, iterations * (50 if name.startswith(("processing", "encode", "cache")) or name.endswith("_html") else 1))
+        print(f"  {name:<32} p50 {results[name]['p50_ms']:9.3f} ms", flush=True)
+    return results
+
+
+def macro_benchmarks(iterations: int, concurrency: int) -> Dict[str, Dict[str, float]]:
+    """
+    Benchmarks the /weather dashboard route and the RESTful API end to end against the stub.
+    """
+    from starlette.testclient import TestClient
+    from main_app import create_app
+    from restful_api import create_api
+
+    dashboard = TestClient(create_app())
+    api = create_api("Guangzhou")
+
+    def dashboard_call() -> None:
+        response = dashboard.get("/weather", params={"city_name": "Guangzhou"})
+        assert response.status_code == 200, response.status_code
+
+    def api_client_call() -> Callable[[], object]:
+        client = api.test_client()
+        return lambda: client.get("/weatherdashboard/api/v1.0/weatherdatas/3")
+
+    api_client = api.test_client()
+    cases: Dict[str, Callable[[], object]] = {
+        "e2e.weather_dashboard": dashboard_call,
+        "e2e.api_create": lambda: create_api("Guangzhou"),
+        "e2e.api_get_all": lambda: api_client.get("/weatherdashboard/api/v1.0/weatherdatas"),
+        "e2e.api_get_one": lambda: api_client.get("/weatherdashboard/api/v1.0/weatherdatas/3"),
+    }
+    results = {}
+    for name, function in cases.items():
+        results[name] = measure(function, iterations if name == "e2e.weather_dashboard" else iterations * 10)
+        print(f"  {name:<32} p50 {results[name]['p50_ms']:9.3f} ms", flush=True)
+    results["throughput.api_get_one"] = measure_throughput(api_client_call, concurrency, iterations * 50)
+    print(f"  {'throughput.api_get_one':<32} {results['throughput.api_get_one']['ops_per_sec']:9.1f} req/s", flush=True)
+    return results
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], tolerance: float) -> List[str]:
+    """
+    Lists the measurements that regressed against the baseline by more than the tolerance.
+
+    Usage Example:
+        >>> compare({'a': {'p50_ms': 13.0}}, {'a': {'p50_ms': 10.0}}, 0.2)
+        ['a: p50_ms 13.000 vs baseline 10.000 (+30.0%)']
+    """
+    regressions = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            reference = baseline.get(name, {}).get(metric)
+            if reference is None or metric == "mean_ms" or metric == "p99_ms":
+                continue  # p99 of a short run is too noisy to gate on
+            higher_is_better = metric == "ops_per_sec"
+            change = (reference - value) / reference if higher_is_better else (value - reference) / reference
+            if reference > 0 and change > tolerance:
+                sign = "-" if higher_is_better else "+"
+                regressions.append(f"{name}: {metric} {value:.3f} vs baseline {reference:.3f} ({sign}{change * 100:.1f}%)")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20, help="timed iterations of each rendering benchmark")
+    parser.add_argument("--concurrency", type=int, default=8, help="client threads of the throughput benchmark")
+    parser.add_argument("--only", choices=["micro", "macro"], help="run one group of benchmarks")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline file to compare against or save to")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--require-baseline", action="store_true", help="exit with status 2 when there is no baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression, 0.2 is 20%%")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    parser.add_argument("--standin", action="store_true", help="fetch over HTTP from a local owm_standin.py server")
+    parser.add_argument("--standin-latency-ms", type=float, default=0.0, help="latency injected by the stand-in")
+    args = parser.parse_args()
+
+    stub = OWMStub()
+    if args.standin:
+        from owm_standin import Faults, make_server
+
+        server = make_server(port=0, faults=Faults(latency_ms=args.standin_latency_ms))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        # Must be set before the application modules read their configuration
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+        os.environ["OWM_API_BASE_URL"] = os.environ["OWM_ICON_BASE_URL"] = base_url
+    else:
+        stub.install()
+
+    results: Dict[str, Dict[str, float]] = {}
+    if args.only in (None, "micro"):
+        print("Micro benchmarks")
+        results.update(micro_benchmarks(args.iterations))
+    if args.only in (None, "macro"):
+        print("Macro benchmarks")
+        results.update(macro_benchmarks(args.iterations, args.concurrency))
+
+    print(f"\n{'benchmark':<32} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'ops/s':>10} {'RSS MB':>8}")
+    for name, metrics in results.items():
+        print(f"{name:<32} {metrics.get('p50_ms', float('nan')):>10.3f} {metrics.get('p95_ms', float('nan')):>10.3f} "
+              f"{metrics.get('p99_ms', float('nan')):>10.3f} {metrics['ops_per_sec']:>10.1f} {metrics['peak_rss_mb']:>8.1f}")
+    if args.standin:
+        print(f"\nStand-in server statistics: {server.RequestHandlerClass.state.stats}")  # type: ignore[attr-defined]
+    else:
+        print(f"\nUpstream requests answered by the stub: {stub.calls}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one.")
+        return 2 if args.require_baseline else 0
+
+    with open(args.baseline, encoding="utf-8") as file:
+        regressions = compare(results, json.load(file), args.tolerance)
+    if regressions:
+        print("\nREGRESSIONS against the baseline:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print("\nNo regressions against the baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,345 @@
+"""
+Streaming bulk export of processed weather data for many cities.
+
+Cities are fetched and processed a few at a time by a thread pool, and the rows
+are written out as they arrive, so memory stays bounded however many cities
+are exported. NDJSON and CSV are written row by row; Arrow IPC and Parquet are
+written in record batches of `batch_size` rows and need the optional pyarrow
+package.
+
+Usage:
+    python bulk_export.py --cities-file cities.txt --dataset five_days --format parquet --output forecasts.parquet
+    python bulk_export.py Guangzhou London Tokyo --dataset now --format csv
+"""
+import argparse
+import csv
+import io
+import json
+import logging
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from getdata import get_weather_now, get_weather_today, get_weather_five_days
+from processingdata import processing_data_now, processing_data_today, processing_data_five_days
+from units import CANONICAL_UNITS, UNIT_SYSTEMS, convert_speed, convert_temperature
+from config import DEFAULT_UNITS
+
+logger = logging.getLogger(__name__)
+
+# Columns of each dataset and their Arrow types; every dataset has one row per city, slot or day
+DATASETS: Dict[str, Tuple[Tuple[str, str], ...]] = {
+    "now": (("city", "string"), ("observed_at", "int64"), ("temperature", "float64"), ("humidity", "float64"),
+            ("weather_description", "string"), ("icon_code", "string")),
+    "today": (("city", "string"), ("slot", "int64"), ("time", "int64"), ("wind_speed", "float64"),
+              ("wind_direction", "float64")),
+    "five_days": (("city", "string"), ("date", "string"), ("daily_high", "float64"), ("daily_low", "float64"),
+                  ("daily_average", "float64"), ("icon_code", "string"), ("condition", "string"),
+                  ("precipitation_chance", "float64")),
+}
+
+# Export formats and their media types
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+CHUNK_SIZE = 64 * 1024  # Bytes of NDJSON or CSV collected before a chunk is yielded
+
+
+def city_rows(city_name: str, dataset: str, units: str = CANONICAL_UNITS) -> List[Dict]:
+    """
+    Fetches and processes one dataset of a city.
+
+    Args:
+        city_name (str): The name of the city.
+        dataset (str): "now", "today" or "five_days".
+        units (str): The unit system of the temperatures and wind speeds.
+
+    Returns:
+        list: The rows of the city, as dictionaries with the columns of the dataset.
+
+    Usage Example:
+        >>> city_rows('Guangzhou', 'now')
+        [{'city': 'Guangzhou', 'observed_at': 1739843673, 'temperature': 21.5, 'humidity': 64, ...}]
+    """
+    if dataset == "now":
+        data_now = get_weather_now(city_name)
+        temperature, humidity, weather_description, city, icon_code, icon_url = processing_data_now(data_now)
+        temperature = convert_temperature(temperature, units)
+        return [{"city": city_name, "observed_at": data_now["dt"], "temperature": temperature, "humidity": humidity,
+                 "weather_description": weather_description, "icon_code": icon_code}]
+    if dataset == "today":
+        data_today = get_weather_today(city_name)
+        wind_speeds, wind_directions = processing_data_today(data_today)
+        wind_speeds = convert_speed(wind_speeds, units)
+        return [{"city": city_name, "slot": slot, "time": hour["dt"], "wind_speed": speed, "wind_direction": direction}
+                for slot, (hour, speed, direction)
+                in enumerate(zip(data_today.get("list", []), wind_speeds, wind_directions))]
+    if dataset == "five_days":
+        daily_highs, daily_lows, daily_averages, dates, icons, conditions, precipitation_chances = \
+            processing_data_five_days(get_weather_five_days(city_name))
+        daily_highs, daily_lows, daily_averages = (convert_temperature(values, units)
+                                                   for values in (daily_highs, daily_lows, daily_averages))
+        return [{"city": city_name, "date": date, "daily_high": high, "daily_low": low, "daily_average": average,
+                 "icon_code": icon, "condition": condition, "precipitation_chance": chance}
+                for date, high, low, average, icon, condition, chance
+                in zip(dates, daily_highs, daily_lows, daily_averages, icons, conditions, precipitation_chances)]
+    raise ValueError(f"Unknown dataset {dataset!r}")
+
+
+def iter_rows(cities: Iterable[str], dataset: str, workers: int = 8,
+              on_error: Optional[Callable[[str, Exception], None]] = None,
+              units: str = CANONICAL_UNITS) -> Iterator[Dict]:
+    """
+    Yields the rows of many cities in input order, fetching up to `workers` cities at a time.
+
+    At most twice `workers` cities are in flight or buffered, so `cities` can be a lazy
+    iterable of any length. Cities that fail are skipped and passed to `on_error`.
+
+    Args:
+        cities (iterable): The city names.
+        dataset (str): "now", "today" or "five_days".
+        workers (int): The number of cities fetched concurrently.
+        on_error (callable, optional): Called with the city name and the exception of each failed city.
+        units (str): The unit system of the temperatures and wind speeds.
+
+    Yields:
+        dict: One row, with the columns of the dataset.
+    """
+    if dataset not in DATASETS:
+        raise ValueError(f"Unknown dataset {dataset!r}")
+    pool = ThreadPoolExecutor(max_workers=workers)
+    pending: deque = deque()
+
+    def finished() -> Iterator[Dict]:
+        city_name, future = pending.popleft()
+        try:
+            yield from future.result()
+        except Exception as error:
+            if on_error is not None:
+                on_error(city_name, error)
+            else:
+                logger.warning("Export of %s failed: %s", city_name, error)
+
+    try:
+        for city_name in cities:
+            city_name = city_name.strip()
+            if not city_name:
+                continue
+            pending.append((city_name, pool.submit(city_rows, city_name, dataset, units)))
+            if len(pending) >= 2 * workers:
+                yield from finished()
+        while pending:
+            yield from finished()
+    finally:
+        # Also reached when the consumer stops early, for example when an HTTP client disconnects
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_ndjson(rows: Iterable[Dict]) -> Iterator[bytes]:
+    """
+    Encodes rows as newline-delimited JSON, in chunks of about CHUNK_SIZE bytes.
+    """
+    chunk: List[str] = []
+    size = 0
+    for row in rows:
+        line = json.dumps(row, separators=(",", ":")) + "\n"
+        chunk.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield "".join(chunk).encode("utf-8")
+            chunk, size = [], 0
+    if chunk:
+        yield "".join(chunk).encode("utf-8")
+
+
+def iter_csv(rows: Iterable[Dict], dataset: str) -> Iterator[bytes]:
+    """
+    Encodes rows as CSV with a header line, in chunks of about CHUNK_SIZE bytes.
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=[name for name, _ in DATASETS[dataset]], lineterminator="\n")
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+class _ChunkSink:
+    """
+    A write-only file collecting what pyarrow writes, so the bytes can be yielded as they are produced.
+    """
+
+    def __init__(self) -> None:
+        self.chunks: List[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def take(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+    except ImportError as error:
+        raise RuntimeError("The arrow and parquet formats need pyarrow: pip install pyarrow") from error
+    return pyarrow
+
+
+def _arrow_schema(dataset: str):
+    pa = _import_pyarrow()
+    return pa.schema([(name, getattr(pa, type_name)()) for name, type_name in DATASETS[dataset]])
+
+
+def _record_batches(rows: Iterable[Dict], schema, batch_size: int) -> Iterator:
+    pa = _import_pyarrow()
+    batch: List[Dict] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield pa.RecordBatch.from_pylist(batch, schema=schema)
+            batch = []
+    if batch:
+        yield pa.RecordBatch.from_pylist(batch, schema=schema)
+
+
+def iter_arrow(rows: Iterable[Dict], dataset: str, batch_size: int = 4096) -> Iterator[bytes]:
+    """
+    Encodes rows as an Arrow IPC stream, one record batch of `batch_size` rows at a time.
+    """
+    pa = _import_pyarrow()
+    schema = _arrow_schema(dataset)
+    sink = _ChunkSink()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for record_batch in _record_batches(rows, schema, batch_size):
+            writer.write_batch(record_batch)
+            yield sink.take()
+    yield sink.take()
+
+
+def iter_parquet(rows: Iterable[Dict], dataset: str, batch_size: int = 4096) -> Iterator[bytes]:
+    """
+    Encodes rows as a Parquet file, one row group of `batch_size` rows at a time.
+    """
+    _import_pyarrow()
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema(dataset)
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema, compression="zstd") as writer:
+        for record_batch in _record_batches(rows, schema, batch_size):
+            writer.write_batch(record_batch)
+            yield sink.take()
+    yield sink.take()  # The footer
+
+
+def export(cities: Iterable[str], dataset: str = "five_days", output_format: str = "ndjson", workers: int = 8,
+           batch_size: int = 4096, on_error: Optional[Callable[[str, Exception], None]] = None,
+           units: str = CANONICAL_UNITS) -> Iterator[bytes]:
+    """
+    Streams one dataset of many cities in the given format.
+
+    Args:
+        cities (iterable): The city names; can be a lazy iterable, such as an open file.
+        dataset (str): "now", "today" or "five_days".
+        output_format (str): "ndjson", "csv", "arrow" or "parquet".
+        workers (int): The number of cities fetched concurrently.
+        batch_size (int): Rows per Arrow record batch or Parquet row group.
+        on_error (callable, optional): Called with the city name and the exception of each failed city.
+        units (str): The unit system of the temperatures and wind speeds.
+
+    Yields:
+        bytes: Consecutive chunks of the output.
+
+    Usage Example:
+        >>> with open('forecasts.ndjson', 'wb') as file:
+        ...     for chunk in export(['Guangzhou', 'London'], 'five_days', 'ndjson'):
+        ...         file.write(chunk)
+    """
+    if dataset not in DATASETS:
+        raise ValueError(f"Unknown dataset {dataset!r}")
+    if output_format not in FORMATS:
+        raise ValueError(f"Unknown format {output_format!r}")
+    if output_format in ("arrow", "parquet"):
+        _import_pyarrow()  # Fail before any city is fetched
+    if units not in UNIT_SYSTEMS:
+        raise ValueError(f"Unknown unit system {units!r}")
+    rows = iter_rows(cities, dataset, workers, on_error, units)
+    if output_format == "ndjson":
+        return iter_ndjson(rows)
+    if output_format == "csv":
+        return iter_csv(rows, dataset)
+    if output_format == "arrow":
+        return iter_arrow(rows, dataset, batch_size)
+    return iter_parquet(rows, dataset, batch_size)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("cities", nargs="*", help="city names; use --cities-file for long lists")
+    parser.add_argument("--cities-file", help="file with one city name per line, read lazily; - for standard input")
+    parser.add_argument("--dataset", choices=sorted(DATASETS), default="five_days")
+    parser.add_argument("--format", dest="output_format", choices=sorted(FORMATS), default="ndjson")
+    parser.add_argument("--units", choices=sorted(UNIT_SYSTEMS), default=DEFAULT_UNITS,
+                        help="unit system of temperatures and wind speeds")
+    parser.add_argument("--output", help="output file, standard output by default")
+    parser.add_argument("--workers", type=int, default=8, help="cities fetched concurrently")
+    parser.add_argument("--batch-size", type=int, default=4096, help="rows per Arrow batch or Parquet row group")
+    args = parser.parse_args()
+
+    failures = []
+
+    def report_failure(city_name: str, error: Exception) -> None:
+        failures.append(city_name)
+        print(f"{city_name}: {error}", file=sys.stderr)
+
+    if args.cities_file == "-":
+        cities: Iterable[str] = sys.stdin
+    elif args.cities_file:
+        cities = open(args.cities_file, encoding="utf-8")
+    else:
+        cities = args.cities
+    output = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for chunk in export(cities, args.dataset, args.output_format, args.workers, args.batch_size, report_failure,
+                            args.units):
+            output.write(chunk)
+    finally:
+        if args.output:
+            output.close()
+        if isinstance(cities, io.IOBase) and cities is not sys.stdin:
+            cities.close()
+    if failures:
+        print(f"{len(failures)} cities failed", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,206 @@
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from config import CACHE_EVICTION_POLICY
+from negative_cache import BloomFilter
+
+
+class CountMinSketch:
+    """
+    Approximate access counts of many keys in a fixed amount of memory, with aging.
+
+    Each key increments one 4-bit counter (capped at 15) in each of `depth` rows, and its
+    estimate is the smallest of them, so collisions can only overestimate. A Bloom filter
+    "doorkeeper" absorbs the first access of every key: keys seen once, such as typos and
+    bot probes, never reach the counters. After `sample_size` recorded accesses every
+    counter is halved and the doorkeeper cleared, so old popularity fades.
+
+    Args:
+        width (int): Counters per row, rounded up to a power of two; about the number of cached entries.
+        depth (int): Rows, each indexed by a different hash of the key.
+        sample_size (int): Accesses between two agings, 10 times the width by default.
+
+    Usage Example:
+        >>> sketch = CountMinSketch(width=1024)
+        >>> for _ in range(3):
+        ...     sketch.increment('guangzhou')
+        >>> sketch.estimate('guangzhou')
+        3
+    """
+
+    MAX_COUNT = 15
+
+    def __init__(self, width: int, depth: int = 4, sample_size: Optional[int] = None) -> None:
+        self.width = 1 << max(4, (max(width, 1) - 1).bit_length())
+        self.depth = depth
+        self.sample_size = sample_size or 10 * self.width
+        self.counters = bytearray(self.width * depth)
+        self.doorkeeper = BloomFilter(capacity=self.sample_size, error_rate=0.01)
+        self.additions = 0
+
+    def _indexes(self, key: Hashable) -> list:
+        # Double hashing, as in BloomFilter, from Python's hash: the counts only live in this process
+        h = hash(key)
+        h1, h2 = h & 0xFFFFFFFF, ((h >> 32) & 0xFFFFFFFF) | 1
+        mask = self.width - 1
+        return [row * self.width + ((h1 + row * h2) & mask) for row in range(self.depth)]
+
+    def increment(self, key: Hashable) -> None:
+        """
+        Records one access of a key.
+        """
+        name = str(key)
+        if name not in self.doorkeeper:
+            self.doorkeeper.add(name)
+        else:
+            for index in self._indexes(key):
+                if self.counters[index] < self.MAX_COUNT:
+                    self.counters[index] += 1
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            self.age()
+
+    def estimate(self, key: Hashable) -> int:
+        """
+        Returns the estimated recent accesses of a key.
+        """
+        count = min(self.counters[index] for index in self._indexes(key))
+        return count + (1 if str(key) in self.doorkeeper else 0)
+
+    def age(self) -> None:
+        """
+        Halves every counter and clears the doorkeeper.
+        """
+        self.counters = bytearray(count >> 1 for count in self.counters)
+        self.doorkeeper.clear()
+        self.additions //= 2
+
+
+class LRUStore:
+    """
+    A bounded mapping evicting the least recently used key; the eviction policy of plain caches.
+
+    Stores are not thread-safe; the caches using them hold their own lock.
+
+    Args:
+        maxsize (int): The maximum number of keys.
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = max(maxsize, 1)
+        self._entries: OrderedDict = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Returns the value of a key, or None, and records the access.
+        """
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """
+        Stores a value, evicting beyond `maxsize`.
+        """
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+
+class TinyLFUStore(LRUStore):
+    """
+    A bounded mapping that admits new keys by access frequency (W-TinyLFU).
+
+    New keys enter a small LRU window (1% of the entries). A key leaving the window
+    becomes a candidate for the main LRU area and replaces its least recently used key
+    only if the CountMinSketch estimates it was accessed more often; otherwise the
+    candidate is dropped. A long tail of keys accessed once therefore cannot flush the
+    popular keys, while the window still holds every new key for a while.
+
+    Args:
+        maxsize (int): The maximum number of keys.
+
+    Usage Example:
+        >>> store = TinyLFUStore(maxsize=256)
+        >>> store.put('chart|wind_rose|3f2a', (1739843673.0, 'iVBORw0KGgo...'))
+        >>> store.get('chart|wind_rose|3f2a')
+        (1739843673.0, 'iVBORw0KGgo...')
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        super().__init__(maxsize)
+        self.window_size = max(1, self.maxsize // 100)
+        self.main_size = max(self.maxsize - self.window_size, 1)
+        self._window: OrderedDict = OrderedDict()
+        self.sketch = CountMinSketch(self.maxsize)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        self.sketch.increment(key)
+        value = self._window.get(key)
+        if value is not None:
+            self._window.move_to_end(key)
+            return value
+        return super().get(key)
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if key in self._entries:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            return
+        self._window[key] = value
+        self._window.move_to_end(key)
+        while len(self._window) > self.window_size:
+            candidate, candidate_value = self._window.popitem(last=False)
+            if len(self._entries) < self.main_size:
+                self._entries[candidate] = candidate_value
+                continue
+            victim = next(iter(self._entries))
+            if self.sketch.estimate(candidate) > self.sketch.estimate(victim):
+                del self._entries[victim]
+                self._entries[candidate] = candidate_value
+
+    def pop(self, key: Hashable) -> None:
+        self._window.pop(key, None)
+        super().pop(key)
+
+    def clear(self) -> None:
+        self._window.clear()
+        super().clear()
+
+    def __len__(self) -> int:
+        return len(self._window) + len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._window or key in self._entries
+
+
+def make_store(maxsize: int, policy: str = CACHE_EVICTION_POLICY) -> LRUStore:
+    """
+    Builds the bounded mapping of a cache for the CACHE_EVICTION_POLICY setting.
+
+    Args:
+        maxsize (int): The maximum number of keys.
+        policy (str): "tinylfu" or "lru".
+
+    Returns:
+        LRUStore: A TinyLFUStore or an LRUStore.
+    """
+    if policy == "lru":
+        return LRUStore(maxsize)
+    if policy == "tinylfu":
+        return TinyLFUStore(maxsize)
+    raise ValueError(f"Unknown cache eviction policy {policy!r}; expected 'tinylfu' or 'lru'")
@@ -0,0 +1,182 @@
+"""
+Single-figure rendering of the dashboard charts (CHART_RENDERER=atlas).
+
+The panels are drawn by the chart functions of visualization.py into subfigures of one
+figure, which is rasterized and PNG-encoded once; the page shows each panel as a CSS
+sprite of that image (see html_widgets.chart_atlas_panel).
+"""
+import base64
+from io import BytesIO
+from typing import Callable, Dict, Optional, Tuple
+
+import matplotlib.pyplot as plt
+
+from metrics import rendered_bytes, stage_seconds
+from units import CANONICAL_UNITS
+from visualization import (cached_chart, timed_chart, draw_temperature_progressbar, draw_humidity_gauge, draw_wind_rose,
+                           draw_temperature_chart, draw_precipitation_chances_pie_charts, draw_weather_forecast_table)
+
+DPI = 100
+
+# Cells of the panels in inches (left, top, width, height), tiling the atlas without overlap. Each panel
+# is drawn at the figure size of its standalone chart, centered in a cell that leaves room for the labels
+# standalone charts place outside their figure (bbox_inches='tight' grows the saved area for them)
+ATLAS_CELLS: Dict[str, Tuple[float, float, float, float]] = {
+    'wind_rose': (0, 0, 7, 7),
+    'temperature_progressbar': (0, 7, 7, 1.4),
+    'temperature_chart': (7, 0, 8, 4.6),
+    'humidity_gauge': (7, 4.6, 8, 3.8),
+    'precipitation_pies': (0, 8.4, 15, 5),
+    'forecast_table': (0, 13.4, 15, 6),
+}
+PANEL_SIZES = {
+    'wind_rose': (7, 7),
+    'temperature_progressbar': (6, 0.5),
+    'temperature_chart': (6, 3.5),
+    'humidity_gauge': (4, 3),
+    'precipitation_pies': (15, 5),
+    'forecast_table': (15, 6),
+}
+
+# Padding in inches of the tight crop of each panel, as the pad_inches of its standalone chart;
+# None keeps the whole panel, as the wind rose is saved without bbox_inches='tight'
+CROP_PADDING = {
+    'wind_rose': None,
+    'temperature_progressbar': 0.2,
+    'temperature_chart': 0.1,
+    'humidity_gauge': 0.2,
+    'precipitation_pies': 0.2,
+    'forecast_table': 0.2,
+}
+
+# Subfigures have no tight_layout; these are the spacings it computes for the standalone charts
+PANEL_SPACING = {
+    'precipitation_pies': dict(left=0.031, right=0.99, bottom=0.077, top=0.959, wspace=0.261),
+    'forecast_table': dict(left=0.033, right=0.967, bottom=0.026, top=0.975, wspace=0.394, hspace=0.134),
+}
+
+
+def build_atlas_figure(panels: Dict[str, tuple]):
+    """
+    Creates the atlas figure and draws the panels into their subfigures, without rendering it.
+
+    Args:
+    panels (dict): Panel names of ATLAS_CELLS mapped to the arguments of their draw function.
+
+    Returns:
+    tuple: The figure and a dict of the panel names mapped to their subfigures.
+    """
+    draw_functions: Dict[str, Callable[..., None]] = {
+        'temperature_progressbar': draw_temperature_progressbar,
+        'humidity_gauge': draw_humidity_gauge,
+        'wind_rose': draw_wind_rose,
+        'temperature_chart': draw_temperature_chart,
+        'precipitation_pies': draw_precipitation_chances_pie_charts,
+        'forecast_table': draw_weather_forecast_table,
+    }
+    # Panel rectangles in inches, and a grid whose rows and columns break at every panel edge,
+    # since a subfigure is placed by the width and height ratios of its gridspec
+    rects = {}
+    for name in panels:
+        left, top, width, height = ATLAS_CELLS[name]
+        panel_width, panel_height = PANEL_SIZES[name]
+        x, y = left + (width - panel_width) / 2, top + (height - panel_height) / 2
+        rects[name] = (x, y, x + panel_width, y + panel_height)
+    atlas_width = max(ATLAS_CELLS[name][0] + ATLAS_CELLS[name][2] for name in panels)
+    atlas_height = max(ATLAS_CELLS[name][1] + ATLAS_CELLS[name][3] for name in panels)
+    xs = sorted({0.0, atlas_width, *(edge for rect in rects.values() for edge in (rect[0], rect[2]))})
+    ys = sorted({0.0, atlas_height, *(edge for rect in rects.values() for edge in (rect[1], rect[3]))})
+
+    fig = plt.figure(figsize=(atlas_width, atlas_height), dpi=DPI)
+    grid = fig.add_gridspec(len(ys) - 1, len(xs) - 1, width_ratios=[b - a for a, b in zip(xs, xs[1:])],
+                            height_ratios=[b - a for a, b in zip(ys, ys[1:])])
+    subfigures = {}
+    for name, arguments in panels.items():
+        x0, y0, x1, y1 = rects[name]
+        subfigure = fig.add_subfigure(grid[ys.index(y0):ys.index(y1), xs.index(x0):xs.index(x1)])
+        draw_functions[name](subfigure, *arguments)
+        if name in PANEL_SPACING:
+            subfigure.subplots_adjust(**PANEL_SPACING[name])
+        subfigures[name] = subfigure
+    return fig, subfigures
+
+
+def encode_atlas(fig, subfigures: dict) -> dict:
+    """
+    Rasterizes and encodes the atlas figure once, then measures the crop of every panel, and closes the figure.
+
+    Returns:
+    dict: The base64 PNG ("png"), its size in pixels ("width", "height"), and the crop of every
+    panel in pixels from the top left ("panels", name mapped to [x, y, width, height]).
+    """
+    buffer = BytesIO()
+    with stage_seconds.time(stage="png_encode", chart="atlas"):
+        fig.savefig(buffer, format='png')
+    # Text extents come from the renderer of the draw above, so measuring draws nothing again
+    renderer = fig.canvas.get_renderer()
+    width, height = (round(size) for size in fig.bbox.size)
+    crops = {}
+    for name, subfigure in subfigures.items():
+        left, top, cell_width, cell_height = (value * DPI for value in ATLAS_CELLS[name])
+        padding = CROP_PADDING[name]
+        box = subfigure.bbox if padding is None else subfigure.get_tightbbox(renderer).padded(padding * DPI)
+        x0, x1, y0, y1 = box.x0, box.x1, height - box.y1, height - box.y0  # Display y grows upwards
+        # Labels bleeding out of a panel stay within its cell, so crops never overlap
+        x0, y0 = max(x0, left), max(y0, top)
+        x1, y1 = min(x1, left + cell_width), min(y1, top + cell_height)
+        crops[name] = [round(x0), round(y0), round(x1 - x0), round(y1 - y0)]
+    plt.close(fig)
+    png = buffer.getvalue()
+    rendered_bytes.inc(len(png), chart="atlas")
+    with stage_seconds.time(stage="base64", chart="atlas"):
+        encoded = base64.b64encode(png).decode()
+    return {"png": encoded, "width": width, "height": height, "panels": crops}
+
+
+@cached_chart('atlas')
+@timed_chart('atlas')
+def create_chart_atlas(temperature: float, humidity: float, wind_speeds: list, wind_directions: list,
+                       daily_highs: list, daily_lows: list, daily_averages: list, precipitation_chances: list,
+                       dates: list, weather_icons: Optional[list] = None, weather_conditions: Optional[list] = None,
+                       units: str = CANONICAL_UNITS) -> dict:
+    """
+    Renders the dashboard charts as one atlas image, with the crop of every panel.
+
+    Drawing every panel into one figure replaces six canvas setups, six layout passes and six
+    PNG encodes with one of each; standalone charts saved with bbox_inches='tight' even draw
+    twice. The result is cached like a chart, so a degraded page can look it up.
+
+    Args:
+    temperature (float): The current temperature, in `units`.
+    humidity (float): The current humidity.
+    wind_speeds, wind_directions (List[float]): The wind of today.
+    daily_highs, daily_lows, daily_averages (List[float]): The five-day temperatures, in `units`.
+    precipitation_chances (List[float]): The five-day precipitation chances in percent.
+    dates (List[str]): The five dates.
+    weather_icons, weather_conditions (List[str]): The icon codes and conditions of the forecast table,
+        which is left out of the atlas when they are not given.
+    units (str): The unit system of the temperatures.
+
+    Returns:
+    dict: The atlas of `encode_atlas`.
+
+    Usage Example:
+        >>> atlas = create_chart_atlas(21.5, 64, [3.35, 3.09], [12, 10], [25.0, 26.1, 24.3, 23.8, 27.2],
+                                       [17.0, 18.4, 16.9, 15.5, 19.1], [21.0, 22.2, 20.6, 19.7, 23.1],
+                                       [10, 35, 80, 0, 55], ['2025-02-18', '2025-02-19', '2025-02-20', '2025-02-21', '2025-02-22'])
+        >>> atlas['panels']['humidity_gauge']
+        [920, 516, 378, 277]
+    """
+    if not wind_speeds or not wind_directions:
+        raise ValueError("No wind data available to plot.")
+    panels = {
+        'wind_rose': (wind_speeds, wind_directions),
+        'temperature_progressbar': (temperature, units),
+        'temperature_chart': (daily_highs, daily_lows, daily_averages, dates, units),
+        'humidity_gauge': (humidity,),
+        'precipitation_pies': (precipitation_chances, dates),
+    }
+    if weather_icons is not None and weather_conditions is not None:
+        panels['forecast_table'] = (weather_icons, weather_conditions, dates)
+    fig, subfigures = build_atlas_figure(panels)
+    return encode_atlas(fig, subfigures)
@@ -0,0 +1,142 @@
+import os
+
+# Settings shared by the dashboard and the RESTful API.
+# Every value can be overridden through an environment variable of the same name.
+
+def _env_int(name: str, default: int) -> int:
+    """
+    Reads an integer setting from the environment.
+
+    Args:
+        name (str): The name of the environment variable.
+        default (int): The value used when the variable is unset or empty.
+
+    Returns:
+        int: The configured value.
+
+    Usage Example:
+        >>> _env_int('NEGATIVE_CACHE_SIZE', 1024)
+        1024
+    """
+    value = os.environ.get(name, "")
+    return int(value) if value.strip() else default
+
+
+def _env_float(name: str, default: float) -> float:
+    """
+    Reads a floating point setting from the environment.
+
+    Args:
+        name (str): The name of the environment variable.
+        default (float): The value used when the variable is unset or empty.
+
+    Returns:
+        float: The configured value.
+
+    Usage Example:
+        >>> _env_float('NEGATIVE_CACHE_TTL', 300.0)
+        300.0
+    """
+    value = os.environ.get(name, "")
+    return float(value) if value.strip() else default
+
+
+# Negative cache for locations that OpenWeatherMap does not know
+NEGATIVE_CACHE_TTL = _env_float("NEGATIVE_CACHE_TTL", 300.0)  # Seconds a failed lookup is remembered
+NEGATIVE_CACHE_SIZE = _env_int("NEGATIVE_CACHE_SIZE", 4096)  # Maximum number of remembered locations
+
+# Persistent cache of fetched OpenWeatherMap snapshots, shared by the dashboard and the API
+WEATHER_CACHE_DB = os.environ.get("WEATHER_CACHE_DB", "weather_cache.sqlite3")  # SQLite database path, "" disables the disk tier
+WEATHER_CACHE_TTL = _env_float("WEATHER_CACHE_TTL", 600.0)  # Seconds a snapshot is served without refetching
+WEATHER_CACHE_MEMORY_SIZE = _env_int("WEATHER_CACHE_MEMORY_SIZE", 1024)  # Snapshots kept in memory in front of the database
+WEATHER_CACHE_REVALIDATE = _env_float("WEATHER_CACHE_REVALIDATE", 1.0)  # Seconds a snapshot in memory is served without checking the database
+CACHE_EVICTION_POLICY = os.environ.get("CACHE_EVICTION_POLICY", "tinylfu")  # "tinylfu" (admission by access frequency) or "lru", for the in-memory snapshot, chart and response caches
+
+# Display units of the dashboard and the API ("metric", "imperial" or "standard"); data is always
+# fetched in metric units and converted locally (see units.py), so every view shares one fetch
+DEFAULT_UNITS = os.environ.get("DEFAULT_UNITS", "metric")
+
+# Incremental processing of refreshed five-day forecasts
+INCREMENTAL_FORECAST_CITIES = _env_int("INCREMENTAL_FORECAST_CITIES", 1024)  # Cities whose previous forecast days are kept for reuse
+
+# Historical observation store and long-range archive
+HISTORY_DIR = os.environ.get("HISTORY_DIR", "weather_history")  # Root directory of the partitioned store, "" disables recording
+TREND_ARCHIVE_DIR = os.environ.get("TREND_ARCHIVE_DIR", "weather_archive")  # Root directory of the memory-mapped archive, "" disables it
+TREND_ARCHIVE_MAPS = _env_int("TREND_ARCHIVE_MAPS", 192)  # Column memory maps kept open per process, three per city
+
+# Server-Sent Events of current conditions
+LIVE_POLL_INTERVAL = _env_float("LIVE_POLL_INTERVAL", WEATHER_CACHE_TTL)  # Seconds between polls of a city with subscribers; shorter than WEATHER_CACHE_TTL only re-reads the snapshot
+LIVE_MAX_CHANNELS = _env_int("LIVE_MAX_CHANNELS", 256)  # Cities (per unit system) polled at once; further cities get 503
+LIVE_RETRY_AFTER = _env_int("LIVE_RETRY_AFTER", 30)  # Seconds of the Retry-After header when no channel is free
+LIVE_HEARTBEAT_INTERVAL = _env_float("LIVE_HEARTBEAT_INTERVAL", 15.0)  # Seconds between keep-alive comments
+
+# OpenWeatherMap endpoints; point both base URLs at owm_standin.py to run without the real service
+OPENWEATHERMAP_API_KEY = os.environ.get("OPENWEATHERMAP_API_KEY", "your_api_key_here")  # Replace with your API key
+OWM_API_BASE_URL = os.environ.get("OWM_API_BASE_URL", "https://api.openweathermap.org").rstrip("/")  # Weather and geocoding API
+OWM_ICON_BASE_URL = os.environ.get("OWM_ICON_BASE_URL", "https://openweathermap.org").rstrip("/")  # Weather icon images
+
+# Source of the weather data (see providers.py): "owm", "fake" (synthesized, for tests and offline
+# development), "cache" (stored snapshots), or "race:" and two or more of them, answered by the first valid response
+WEATHER_PROVIDER = os.environ.get("WEATHER_PROVIDER", "owm")
+WEATHER_PROVIDER_CACHE_MAX_AGE = _env_float("WEATHER_PROVIDER_CACHE_MAX_AGE", 3600.0)  # Oldest snapshot in seconds the "cache" provider answers with
+
+# Tail-latency controls of the OpenWeatherMap requests (see resilience.py)
+UPSTREAM_DEADLINE_WEATHER = _env_float("UPSTREAM_DEADLINE_WEATHER", 2.0)  # Seconds a current-weather fetch may take, retries included
+UPSTREAM_DEADLINE_FORECAST = _env_float("UPSTREAM_DEADLINE_FORECAST", 3.0)  # Seconds a forecast fetch may take, retries included
+UPSTREAM_MAX_RETRIES = _env_int("UPSTREAM_MAX_RETRIES", 2)  # Retries after timeouts, transport errors, 429 and 5xx
+UPSTREAM_RETRY_BACKOFF = _env_float("UPSTREAM_RETRY_BACKOFF", 0.1)  # Base of the jittered exponential backoff in seconds
+UPSTREAM_HEDGING = _env_int("UPSTREAM_HEDGING", 1)  # 1 sends a duplicate request when one runs past the recent p95 latency
+CIRCUIT_FAILURE_THRESHOLD = _env_int("CIRCUIT_FAILURE_THRESHOLD", 5)  # Consecutive failures that open an endpoint's circuit
+CIRCUIT_RESET_TIMEOUT = _env_float("CIRCUIT_RESET_TIMEOUT", 30.0)  # Seconds an open circuit serves stale snapshots before probing
+
+# On-demand request profiling; disabled (and free) unless a sample rate or an admin token is set
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "weather_profiles")  # Directory of the captured pstats files
+PROFILE_SAMPLE_RATE = _env_float("PROFILE_SAMPLE_RATE", 0.0)  # Fraction of requests profiled, from 0 to 1
+PROFILE_ADMIN_TOKEN = os.environ.get("PROFILE_ADMIN_TOKEN", "")  # Requests with this X-Profile-Token header are profiled
+PROFILE_KEEP = _env_int("PROFILE_KEEP", 50)  # Number of most recent captures kept on disk
+
+# City served by make_API_runnable.py; when empty the script asks for it on an interactive terminal
+WEATHER_API_CITY = os.environ.get("WEATHER_API_CITY", "")
+
+# Renderer of the dashboard's five-day forecast table: "image" (a matplotlib figure with downloaded icons)
+# or "html" (HTML elements with the icon URLs, loaded and cached by the browser, and no server-side rendering)
+FORECAST_TABLE_RENDERER = os.environ.get("FORECAST_TABLE_RENDERER", "image")
+
+# Renderer of the dashboard charts: "server" (one matplotlib PNG per chart embedded in the page), "atlas"
+# (all charts drawn in one matplotlib figure, encoded once and shown as CSS sprites, see chart_atlas.py)
+# or "client" (the processed series sent as JSON and drawn in the browser by static/weather_charts.js)
+CHART_RENDERER = os.environ.get("CHART_RENDERER", "server")
+
+# Admission control of the dashboard route (see admission.py); requests beyond the limit wait in a
+# bounded queue, and those that cannot wait are shed with DASHBOARD_OVERLOAD_RESPONSE
+DASHBOARD_MAX_CONCURRENCY = _env_int("DASHBOARD_MAX_CONCURRENCY", os.cpu_count() or 1)  # Dashboards built at once
+DASHBOARD_QUEUE_SIZE = _env_int("DASHBOARD_QUEUE_SIZE", 16)  # Requests waiting for a slot at once
+DASHBOARD_QUEUE_TIMEOUT = _env_float("DASHBOARD_QUEUE_TIMEOUT", 2.0)  # Seconds a request waits for a slot
+DASHBOARD_OVERLOAD_RESPONSE = os.environ.get("DASHBOARD_OVERLOAD_RESPONSE", "degraded")  # "degraded" (stored snapshots and cached charts only) or "reject" (503)
+DASHBOARD_RETRY_AFTER = _env_int("DASHBOARD_RETRY_AFTER", 5)  # Seconds of the Retry-After header of rejected requests
+
+# Offline prerendering of the busiest dashboards (see prerender.py)
+PRERENDER_DIR = os.environ.get("PRERENDER_DIR", "prerendered")  # Directory of the prerendered pages and charts, "" disables them
+PRERENDER_CITIES = os.environ.get("PRERENDER_CITIES", "")  # Comma separated cities rendered by prerender.py
+PRERENDER_MAX_AGE = _env_float("PRERENDER_MAX_AGE", 900.0)  # Seconds /weather serves a prerendered page
+PRERENDER_WORKERS = _env_int("PRERENDER_WORKERS", os.cpu_count() or 1)  # Worker processes of a prerender run
+PRERENDER_INTERVAL = _env_float("PRERENDER_INTERVAL", 0.0)  # Seconds between prerender runs inside the dashboard, 0 leaves them to cron
+
+# Chart warm-up before the dashboard accepts traffic
+WARM_UP_CHARTS = _env_int("WARM_UP_CHARTS", 1)  # 1 renders every chart once on synthetic data at startup, 0 skips it
+
+# RESTful API server; see gunicorn.conf.py for the production server
+API_SERVER_NAME = os.environ.get("API_SERVER_NAME", "localhost:5000")  # Public host:port of the API, used in record URLs
+API_URL_SCHEME = os.environ.get("API_URL_SCHEME", "http")  # Public URL scheme of the API
+API_BIND = os.environ.get("API_BIND", "0.0.0.0:5000")  # Address the production server listens on
+API_WORKERS = _env_int("API_WORKERS", os.cpu_count() or 1)  # Worker processes, one per core by default
+API_THREADS = _env_int("API_THREADS", 4)  # Request threads per worker process
+API_GRACEFUL_TIMEOUT = _env_int("API_GRACEFUL_TIMEOUT", 30)  # Seconds workers get to finish requests on shutdown
+RESPONSE_COMPRESSION_MIN_BYTES = _env_int("RESPONSE_COMPRESSION_MIN_BYTES", 512)  # Smaller API responses are sent uncompressed
+RESPONSE_CACHE_SIZE = _env_int("RESPONSE_CACHE_SIZE", 256)  # Encoded API responses kept in each process
+EXPORT_MAX_CITIES = _env_int("EXPORT_MAX_CITIES", 50)  # Cities of one export request; more need the PROFILE_ADMIN_TOKEN
+
+# Cache of rendered charts shared by the worker processes of a host
+SHARED_CACHE_BACKEND = os.environ.get("SHARED_CACHE_BACKEND", "sqlite")  # "sqlite" (in WEATHER_CACHE_DB), "memory" (stand-in for tests) or "none"
+CHART_CACHE_TTL = _env_float("CHART_CACHE_TTL", 3600.0)  # Seconds a rendered chart is reused
+CHART_CACHE_PROCESS_SIZE = _env_int("CHART_CACHE_PROCESS_SIZE", 64)  # Charts kept in each process in front of the host tier
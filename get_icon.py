@@ -5,6 +5,9 @@ from PIL import Image
 from io import BytesIO
 from PIL import Image
 
+from config import OWM_ICON_BASE_URL
+from metrics import upstream_request_seconds
+
 def get_weather_icon(icon_code: Literal["01d", "01n", "02d", "02n", "03d", "03n", "04d", "04n", "09d", "09n", "10d", "10n", "11d", "11n", "13d", "13n", "50d", "50n"]) -> Image.Image:
     """
     Download and return a weather icon image based on the provided OpenWeatherMap icon code.
@@ -40,7 +43,8 @@ def get_weather_icon(icon_code: Literal["01d", "01n", "02d", "02n", "03d", "03n"
         <PIL.PngImagePlugin.PngImageFile image mode=RGBA size=50x50 at 0x1E944F24BF0>
     """
 
-    OPENWEATHERMAP_ICON_URL = "http://openweathermap.org/img/wn/{icon}.png"
-    response = get(OPENWEATHERMAP_ICON_URL.format(icon=icon_code))
+    OPENWEATHERMAP_ICON_URL = OWM_ICON_BASE_URL + "/img/wn/{icon}.png"
+    with upstream_request_seconds.time(endpoint="icon"):
+        response = get(OPENWEATHERMAP_ICON_URL.format(icon=icon_code))
     response.raise_for_status()  # Ensure the request was successful
     return Image.open(BytesIO(response.content))
@@ -1,15 +1,222 @@
-from fasthtml.common import Strong, fast_app, serve, Titled, Div, P, Img, H1, H2, H3, A, Form, Label, Input, Button, Script, Ul, Li  
+import threading
+import time
+
 import httpx
-from httpx import get
-from fastapi import FastAPI, HTTPException, Query
-from fastapi.responses import HTMLResponse
-import matplotlib.pyplot as plt
-import numpy as np
-import io
-import base64
-from datetime import datetime, timedelta
+from starlette.exceptions import HTTPException
+
+from typing import Dict, Optional, Tuple
+
+from config import (OPENWEATHERMAP_API_KEY, OWM_API_BASE_URL, UPSTREAM_DEADLINE_FORECAST, UPSTREAM_DEADLINE_WEATHER,
+                    WEATHER_CACHE_TTL, WEATHER_PROVIDER, WEATHER_PROVIDER_CACHE_MAX_AGE)
+from metrics import cache_requests, registry, upstream_errors, upstream_request_seconds
+from negative_cache import NegativeCache, unknown_locations
+from persistent_cache import weather_cache
+from providers import WeatherProvider, make_provider
+from resilience import UpstreamUnavailable, upstream_policy
+from units import CANONICAL_UNITS
+
+# OpenWeatherMap answers these status codes when the location itself is invalid
+UNKNOWN_LOCATION_STATUS_CODES = (400, 404)
+
+# Seconds each endpoint may take in total, retries and hedged requests included
+ENDPOINT_DEADLINES = {"weather": UPSTREAM_DEADLINE_WEATHER, "forecast": UPSTREAM_DEADLINE_FORECAST}
+
+# Key added to snapshots served older than WEATHER_CACHE_TTL, because OpenWeatherMap is failing or by a
+# cache tier racing it; its value is the fetch time
+STALE_KEY = "stale_fetched_at"
+
+stale_served = registry.counter(
+    "weather_stale_snapshots_total", "Expired snapshots served because OpenWeatherMap failed, by endpoint.")
+
+_client: Optional[httpx.Client] = None
+_client_lock = threading.Lock()
+
+_provider: Optional[WeatherProvider] = None
+_provider_lock = threading.Lock()
+
+
+def get(url: str, **kwargs) -> httpx.Response:
+    """
+    Sends a GET request through one connection-pooling client shared by all threads.
+
+    `httpx.get` builds a new client, with its TLS context, for every request, which
+    costs about 30 ms of CPU; the shared client is built on first use and keeps
+    connections to OpenWeatherMap open between requests.
+
+    Args:
+        url (str): The request URL.
+        **kwargs: Further arguments of `httpx.Client.get`, such as params.
+
+    Returns:
+        httpx.Response: The response.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = httpx.Client(limits=httpx.Limits(max_connections=64, max_keepalive_connections=32))
+    return _client.get(url, **kwargs)
+
+
+def _snapshot_key(url: str, location: str, params: Dict) -> str:
+    """
+    Builds the cache key of an OpenWeatherMap response, leaving out the API key.
+
+    Usage Example:
+        >>> _snapshot_key('https://api.openweathermap.org/data/2.5/weather', 'Guangzhou', {'appid': 'xxx', 'units': 'metric'})
+        'https://api.openweathermap.org/data/2.5/weather|guangzhou|units=metric'
+    """
+    query = "&".join(f"{name}={value}" for name, value in sorted(params.items()) if name != "appid")
+    return f"{url}|{NegativeCache.normalize(location)}|{query}"
+
+
+def _request_owm(url: str, location: str, params: Dict) -> Dict:
+    """
+    Sends a request to the OpenWeatherMap API, rejecting recently failed locations without a round trip.
+
+    Responses are served from the persistent snapshot cache while they are younger
+    than WEATHER_CACHE_TTL seconds, so a restarted process starts warm.
+
+    Fetches run under the endpoint's UpstreamPolicy: a deadline, hedging, jittered retries and
+    a circuit breaker. When they fail, the last snapshot of any age is returned instead, as a
+    copy marked with STALE_KEY, so the dashboard keeps answering while OpenWeatherMap is down.
+
+    Args:
+        url (str): The OpenWeatherMap endpoint URL.
+        location (str): The city name or location identifier, sent as the `q` parameter.
+        params (dict): The remaining query parameters.
+
+    Returns:
+        dict: The JSON response of the OpenWeatherMap API.
+
+    Raises:
+        HTTPException: If the location recently failed, or the OpenWeatherMap API request fails
+            and there is no earlier snapshot to fall back to.
+    """
+    if location in unknown_locations:
+        cache_requests.inc(cache="negative", result="hit")
+        raise HTTPException(status_code=400, detail="OpenWeatherMap API error")
+
+    key = _snapshot_key(url, location, params)
+    snapshot = weather_cache.get(key, max_age=WEATHER_CACHE_TTL)
+    if snapshot is not None:
+        cache_requests.inc(cache="snapshot", result="hit")
+        return snapshot[1]
+    cache_requests.inc(cache="snapshot", result="miss")
+
+    endpoint = url.rsplit("/", 1)[-1]
+    policy = upstream_policy(endpoint, ENDPOINT_DEADLINES.get(endpoint, UPSTREAM_DEADLINE_FORECAST))
+    try:
+        with upstream_request_seconds.time(endpoint=endpoint):
+            response = policy.call(lambda timeout: get(url, params={"q": location, **params}, timeout=timeout))
+    except UpstreamUnavailable as error:
+        upstream_errors.inc(endpoint=endpoint, status="unavailable")
+        snapshot = weather_cache.get(key)
+        if snapshot is None:
+            raise HTTPException(status_code=503, detail=f"OpenWeatherMap is unavailable: {error}")
+        stale_served.inc(endpoint=endpoint)
+        return dict(snapshot[1], **{STALE_KEY: snapshot[0]})
+    if response.status_code != 200:
+        upstream_errors.inc(endpoint=endpoint, status=response.status_code)
+        if response.status_code in UNKNOWN_LOCATION_STATUS_CODES:
+            unknown_locations.add(location)
+        raise HTTPException(status_code=400, detail="OpenWeatherMap API error")
+    data = response.json()
+    weather_cache.set(key, data)
+    return data
+
+
+def _current_request() -> Tuple[str, Dict]:
+    # OpenWeatherMap API configuration (see config.py)
+    return f"{OWM_API_BASE_URL}/data/2.5/weather", {"appid": OPENWEATHERMAP_API_KEY, "units": CANONICAL_UNITS}
+
+
+def _forecast_request(slots: int) -> Tuple[str, Dict]:
+    # OpenWeatherMap API configuration (see config.py); `slots` 3-hour intervals from now
+    return f"{OWM_API_BASE_URL}/data/2.5/forecast", {"appid": OPENWEATHERMAP_API_KEY, "units": CANONICAL_UNITS,
+                                                    "cnt": slots}
+
+
+class OpenWeatherMapProvider(WeatherProvider):
+    """
+    The OpenWeatherMap API, behind the snapshot cache, negative cache and UpstreamPolicy of `_request_owm`.
+    """
+
+    name = "owm"
+
+    def current(self, location: str) -> Dict:
+        url, params = _current_request()
+        return _request_owm(url, location, params)
+
+    def forecast(self, location: str, slots: int) -> Dict:
+        url, params = _forecast_request(slots)
+        return _request_owm(url, location, params)
+
+
+class SnapshotCacheProvider(WeatherProvider):
+    """
+    The stored OpenWeatherMap snapshots, without any upstream request.
+
+    Meant to race OpenWeatherMapProvider ("race:cache,owm"): a snapshot younger than `max_age`
+    answers at once, while the upstream request finishes in the background and refreshes the
+    snapshot for the next caller once it is older than WEATHER_CACHE_TTL. A snapshot older than
+    WEATHER_CACHE_TTL is marked with STALE_KEY, as `_request_owm` marks its fallbacks, so the
+    dashboard says how old it is.
+
+    Args:
+        max_age (float): The oldest snapshot, in seconds, the provider answers with.
+
+    Raises:
+        LookupError: From `current` and `forecast`, when there is no snapshot young enough.
+    """
+
+    name = "cache"
+
+    def __init__(self, max_age: float = WEATHER_PROVIDER_CACHE_MAX_AGE) -> None:
+        self.max_age = max_age
+
+    def _lookup(self, url: str, location: str, params: Dict) -> Dict:
+        snapshot = weather_cache.get(_snapshot_key(url, location, params), max_age=self.max_age)
+        if snapshot is None:
+            raise LookupError(f"No snapshot of {location!r} younger than {self.max_age:g} seconds")
+        fetched_at, data = snapshot
+        if time.time() - fetched_at > WEATHER_CACHE_TTL:
+            return dict(data, **{STALE_KEY: fetched_at})
+        return data
+
+    def current(self, location: str) -> Dict:
+        url, params = _current_request()
+        return self._lookup(url, location, params)
+
+    def forecast(self, location: str, slots: int) -> Dict:
+        url, params = _forecast_request(slots)
+        return self._lookup(url, location, params)
+
+
+def weather_provider() -> WeatherProvider:
+    """
+    Returns the provider of the weather functions below, built from WEATHER_PROVIDER on first use.
+    """
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = make_provider(WEATHER_PROVIDER)
+    return _provider
+
+
+def set_weather_provider(provider: Optional[WeatherProvider]) -> None:
+    """
+    Replaces the provider of the weather functions, for example with a FakeWeatherProvider in tests;
+    None restores the configured provider.
+
+    Usage Example:
+        >>> set_weather_provider(FakeWeatherProvider())
+    """
+    global _provider
+    with _provider_lock:
+        _provider = provider
 
-from typing import Dict
 
 def get_weather_now(location: str) -> Dict:
     
@@ -40,7 +247,7 @@ def get_weather_now(location: str) -> Dict:
               }
 
     Raises:
-        HTTPException: If the OpenWeatherMap API request fails.
+        HTTPException: If the OpenWeatherMap API request fails, or the location failed within the last few minutes.
 
     Usage Example:
         >>> get_weather_now('guangzhou')
@@ -50,17 +257,7 @@ def get_weather_now(location: str) -> Dict:
             ...
         }
     """
-    # OpenWeatherMap API configuration
-    OPENWEATHERMAP_API_URL = "http://api.openweathermap.org/data/2.5/weather"
-    OPENWEATHERMAP_API_KEY = "your_api_key_here"  # Replace with your API key
-
-    response = get(
-        OPENWEATHERMAP_API_URL,
-        params={"q": location, "appid": OPENWEATHERMAP_API_KEY, "units": "metric"},
-    )
-    if response.status_code != 200:
-        raise HTTPException(status_code=400, detail="OpenWeatherMap API error")
-    return response.json()
+    return weather_provider().current(location)
 
 
 
@@ -99,7 +296,7 @@ def get_weather_today(location: str) -> Dict:
               }
 
     Raises:
-        HTTPException: If the OpenWeatherMap API request fails.
+        HTTPException: If the OpenWeatherMap API request fails, or the location failed within the last few minutes.
 
     Usage Example:
         >>> print(get_weather_today('guangzhou'))
@@ -111,22 +308,7 @@ def get_weather_today(location: str) -> Dict:
             'city': {...}
         }
     """
-
-    # OpenWeatherMap API configuration
-    OPENWEATHERMAP_API_URL = "http://api.openweathermap.org/data/2.5/forecast"
-    OPENWEATHERMAP_API_KEY = "your_api_key_here"  # Replace with your API key
-
-    response = get(
-        OPENWEATHERMAP_API_URL,
-        params={"q": location,
-                "appid": OPENWEATHERMAP_API_KEY,
-                "units": "metric",
-                "cnt": 8,  # Fetch data for today with a 3-hour interval
-                },
-    )
-    if response.status_code != 200:
-        raise HTTPException(status_code=400, detail="OpenWeatherMap API error")
-    return response.json()
+    return weather_provider().forecast(location, 8)  # Today, with a 3-hour interval
 
 def get_weather_five_days(location: str) -> Dict:
     
@@ -162,7 +344,7 @@ def get_weather_five_days(location: str) -> Dict:
               }
 
     Raises:
-        HTTPException: If the OpenWeatherMap API request fails.
+        HTTPException: If the OpenWeatherMap API request fails, or the location failed within the last few minutes.
 
     Usage Example:
         >>> get_weather_five_days('guangzhou')
@@ -174,20 +356,4 @@ def get_weather_five_days(location: str) -> Dict:
             'city': {...}
         }
     """
-
-    # OpenWeatherMap API configuration
-    OPENWEATHERMAP_API_URL = "http://api.openweathermap.org/data/2.5/forecast"
-    OPENWEATHERMAP_API_KEY = "your_api_key_here"  # Replace with your API key
-
-    response = get(
-        OPENWEATHERMAP_API_URL,
-        params={
-            "q": location,
-            "appid": OPENWEATHERMAP_API_KEY,
-            "units": "metric",
-            "cnt": 40,  # Fetch data for the next 5 days, with a 3-hour interval
-        },
-    )
-    if response.status_code != 200:
-        raise HTTPException(status_code=400, detail="OpenWeatherMap API error")
-    return response.json()
+    return weather_provider().forecast(location, 40)  # The next 5 days, with a 3-hour interval
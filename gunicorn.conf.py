@@ -0,0 +1,29 @@
+# gunicorn settings of the production RESTful API, read from the environment through config.py
+#
+#     WEATHER_API_CITY=Guangzhou gunicorn -c gunicorn.conf.py
+#
+# Every worker process builds its own app after the fork and keeps its own connection
+# to the SQLite snapshot cache, which all workers on the host share (WAL mode).
+from config import API_BIND, API_GRACEFUL_TIMEOUT, API_THREADS, API_WORKERS
+
+wsgi_app = "wsgi:create_app()"
+bind = API_BIND
+workers = API_WORKERS
+threads = API_THREADS
+worker_class = "gthread"
+preload_app = False  # Build the app in each worker, so no SQLite connection crosses a fork
+
+# On SIGTERM workers stop accepting connections and get this long to finish their requests
+graceful_timeout = API_GRACEFUL_TIMEOUT
+timeout = 60  # Restart a worker stuck on one request for longer (a slow upstream fetch included)
+keepalive = 5
+
+accesslog = "-"
+errorlog = "-"
+
+
+def worker_exit(server, worker):
+    # Close the worker's cache connection so its WAL is checkpointed on a clean shutdown
+    from persistent_cache import weather_cache
+
+    weather_cache.close()
@@ -0,0 +1,350 @@
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote
+
+import numpy as np
+
+from config import HISTORY_DIR
+from negative_cache import NegativeCache
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are only serialized within one process
+    fcntl = None  # type: ignore[assignment]
+
+# Columns stored for each kind of record; every kind is indexed by the `time` column (Unix seconds, UTC)
+SCHEMAS: Dict[str, Dict[str, type]] = {
+    "observations": {
+        "time": np.int64,
+        "temperature": np.float32,
+        "humidity": np.float32,
+    },
+    "forecasts": {
+        "time": np.int64,  # When the forecast run was issued
+        "day_offset": np.int8,  # Forecast day relative to the run, 0 to 4
+        "daily_high": np.float32,
+        "daily_low": np.float32,
+        "daily_average": np.float32,
+        "precipitation_chance": np.float32,
+    },
+}
+
+AGGREGATIONS = {"mean": np.add, "min": np.minimum, "max": np.maximum}  # Reduced per bucket; "mean" divides the sums by the counts
+
+# Rows a partition's append log collects before they are compacted into its npz file
+COMPACT_ROWS = 256
+
+
+def _empty(kind: str) -> Dict[str, np.ndarray]:
+    return {name: np.empty(0, dtype=dtype) for name, dtype in SCHEMAS[kind].items()}
+
+
+def _log_dtype(kind: str) -> np.dtype:
+    # One fixed-width record per row, with the columns of the kind
+    return np.dtype([(name, dtype) for name, dtype in SCHEMAS[kind].items()])
+
+
+@lru_cache(maxsize=512)
+def _load_partition(path: str, mtime_ns: int) -> Dict[str, np.ndarray]:
+    # Keyed on the modification time, so a rewritten partition is never served stale
+    with np.load(path) as archive:
+        return {name: archive[name] for name in archive.files}
+
+
+@lru_cache(maxsize=512)
+def _load_log(path: str, kind: str, size: int, mtime_ns: int) -> np.ndarray:
+    # Keyed on the size as well, since appends within the timer resolution keep the modification time
+    dtype = _log_dtype(kind)
+    with open(path, "rb") as file:
+        data = file.read(size - size % dtype.itemsize)  # Leaves out a partial row of an interrupted append
+    return np.frombuffer(data, dtype=dtype)
+
+
+class HistoryStore:
+    """
+    An append-only time-series store of processed observations and forecast runs.
+
+    Records are partitioned by city and UTC day into compressed columnar files
+    (`<root>/<city>/<YYYY-MM-DD>/<kind>.npz`, one array per column), so a range
+    query only opens the partitions of the requested days and reads whole columns.
+    New rows are appended to a log of fixed-width records next to the partition
+    (`<kind>.log`) and compacted into the npz file every COMPACT_ROWS rows, so an
+    append does not rewrite the day. Appends hold a lock file per partition, so
+    the workers of several processes can record the same city.
+
+    Args:
+        root (str): The root directory of the store. An empty string disables the store.
+
+    Usage Example:
+        >>> store = HistoryStore('weather_history')
+        >>> store.record_observation('Guangzhou', 1739843673, 17.64, 64)
+        >>> store.query_range('Guangzhou', 'observations', 1739800000, 1739900000)
+        {'time': array([1739843673]), 'temperature': array([17.64], dtype=float32), 'humidity': array([64.], dtype=float32)}
+    """
+
+    def __init__(self, root: str = HISTORY_DIR) -> None:
+        self.root = root
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.root)
+
+    def _city_dir(self, city: str) -> str:
+        # Percent-encoded like the pages of prerender.py: separators are encoded, and "." or ".." refused,
+        # so that no city name reaches outside the root
+        name = quote(NegativeCache.normalize(city).replace(" ", "_"), safe="")
+        path = os.path.join(self.root, name)
+        if name in ("", ".", "..") or os.path.dirname(os.path.abspath(path)) != os.path.abspath(self.root):
+            raise ValueError(f"Invalid city name: {city!r}")
+        return path
+
+    def _partition_path(self, city: str, kind: str, day: str) -> str:
+        return os.path.join(self._city_dir(city), day, f"{kind}.npz")
+
+    @staticmethod
+    def _day(timestamp: int) -> str:
+        return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime("%Y-%m-%d")
+
+    @staticmethod
+    def _log_path(path: str) -> str:
+        return f"{path[:-len('.npz')]}.log"
+
+    def _read_compacted(self, path: str, kind: str) -> Dict[str, np.ndarray]:
+        try:
+            return _load_partition(path, os.stat(path).st_mtime_ns)
+        except FileNotFoundError:
+            return _empty(kind)
+
+    def _read_log(self, path: str, kind: str) -> np.ndarray:
+        log_path = self._log_path(path)
+        try:
+            stat = os.stat(log_path)
+            return _load_log(log_path, kind, stat.st_size, stat.st_mtime_ns)
+        except FileNotFoundError:
+            return np.empty(0, dtype=_log_dtype(kind))
+
+    def _read(self, path: str, kind: str) -> Dict[str, np.ndarray]:
+        # The log is read first: rows compacted in between are then in the npz file, and dropped from the log
+        log = self._read_log(path, kind)
+        columns = self._read_compacted(path, kind)
+        if len(log) and len(columns["time"]):
+            log = log[log["time"] > columns["time"][-1]]
+        if not len(log):
+            return columns
+        return {name: np.concatenate([columns[name], log[name]]) for name in SCHEMAS[kind]}
+
+    @contextmanager
+    def _partition_lock(self, path: str) -> Iterator[None]:
+        # Serialize appends across threads and, where supported, across worker processes
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(f"{path[:-len('.npz')]}.lock", "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _append(self, city: str, kind: str, rows: Dict[str, list]) -> None:
+        timestamp = int(rows["time"][0])
+        path = self._partition_path(city, kind, self._day(timestamp))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._partition_lock(path):
+            columns = self._read(path, kind)
+            if len(columns["time"]) and columns["time"][-1] >= timestamp:
+                return  # Already recorded, e.g. the same snapshot served again from the cache
+            records = np.empty(len(rows["time"]), dtype=_log_dtype(kind))
+            for name in SCHEMAS[kind]:
+                records[name] = rows[name]
+            log_path = self._log_path(path)
+            logged = len(self._read_log(path, kind))
+            if logged + len(records) < COMPACT_ROWS:
+                with open(log_path, "r+b" if os.path.exists(log_path) else "wb") as log_file:
+                    # Truncate any partial row left behind by an interrupted append
+                    log_file.truncate(logged * records.dtype.itemsize)
+                    log_file.seek(0, os.SEEK_END)
+                    log_file.write(records.tobytes())
+                return
+            merged = {name: np.concatenate([columns[name], records[name]]) for name in SCHEMAS[kind]}
+            temporary_path = f"{path}.{os.getpid()}.tmp.npz"
+            np.savez_compressed(temporary_path, **merged)  # type: ignore[arg-type]
+            os.replace(temporary_path, path)  # Readers see either the old or the new partition
+            if os.path.exists(log_path):
+                os.truncate(log_path, 0)
+
+    def record_observation(self, city: str, observed_at: int, temperature: float, humidity: float) -> None:
+        """
+        Appends a current observation, as returned by processing_data_now.
+
+        Args:
+            city (str): The city name.
+            observed_at (int): The observation time in Unix seconds (the `dt` field of the current weather data).
+            temperature (float): The temperature in degrees Celsius.
+            humidity (float): The humidity percentage.
+        """
+        if not self.enabled:
+            return
+        self._append(city, "observations",
+                     {"time": [observed_at], "temperature": [temperature], "humidity": [humidity]})
+
+    def record_forecast(self, city: str, issued_at: int, daily_highs: list, daily_lows: list,
+                        daily_averages: list, precipitation_chances: list) -> None:
+        """
+        Appends a five-day forecast run, as returned by processing_data_five_days.
+
+        Args:
+            city (str): The city name.
+            issued_at (int): The run time in Unix seconds (the `dt` of the first forecast slot).
+            daily_highs (List[float]): The daily high temperatures.
+            daily_lows (List[float]): The daily low temperatures.
+            daily_averages (List[float]): The daily average temperatures.
+            precipitation_chances (List[float]): The daily precipitation chances as percentages.
+        """
+        if not self.enabled:
+            return
+        days = len(daily_highs)
+        self._append(city, "forecasts", {
+            "time": [issued_at] * days,
+            "day_offset": list(range(days)),
+            "daily_high": daily_highs,
+            "daily_low": daily_lows,
+            "daily_average": daily_averages,
+            "precipitation_chance": precipitation_chances,
+        })
+
+    def query_range(self, city: str, kind: str, start: int, end: int) -> Dict[str, np.ndarray]:
+        """
+        Returns every record of a city within a time range.
+
+        Args:
+            city (str): The city name.
+            kind (str): "observations" or "forecasts".
+            start (int): The start of the range in Unix seconds, inclusive.
+            end (int): The end of the range in Unix seconds, exclusive.
+
+        Returns:
+            dict: One NumPy array per column, sorted by time.
+
+        Raises:
+            ValueError: If the kind is unknown, or the city name is not a valid directory name.
+        """
+        if kind not in SCHEMAS:
+            raise ValueError(f"Unknown history kind: {kind}")
+        if not self.enabled or end <= start:
+            return _empty(kind)
+
+        first_day, last_day = self._day(start), self._day(end - 1)
+        try:
+            days = sorted(day for day in os.listdir(self._city_dir(city)) if first_day <= day <= last_day)
+        except FileNotFoundError:
+            days = []
+        partitions: List[Dict[str, np.ndarray]] = [
+            self._read(self._partition_path(city, kind, day), kind) for day in days
+        ]
+        partitions = [partition for partition in partitions if len(partition["time"])]
+        if not partitions:
+            return _empty(kind)
+
+        columns = {name: np.concatenate([partition[name] for partition in partitions]) for name in SCHEMAS[kind]}
+        # Partitions are time-ordered, so the range is one contiguous slice
+        low, high = np.searchsorted(columns["time"], [start, end])
+        return {name: values[low:high] for name, values in columns.items()}
+
+    def query_aggregate(self, city: str, kind: str, variable: str, start: int, end: int,
+                        bucket_seconds: int, aggregation: str = "mean") -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Downsamples one variable of a time range into fixed-width buckets.
+
+        Args:
+            city (str): The city name.
+            kind (str): "observations" or "forecasts".
+            variable (str): The column to aggregate, for example "temperature".
+            start (int): The start of the range in Unix seconds, inclusive.
+            end (int): The end of the range in Unix seconds, exclusive.
+            bucket_seconds (int): The bucket width in seconds, for example 3600 for hourly values.
+            aggregation (str): "mean", "min" or "max".
+
+        Returns:
+            tuple: The bucket start times and the aggregated values, skipping empty buckets.
+
+        Raises:
+            ValueError: If the kind, variable, aggregation, bucket width or city name is invalid.
+
+        Usage Example:
+            >>> store.query_aggregate('Guangzhou', 'observations', 'temperature', 1739800000, 1739900000, 3600)
+            (array([1739840400]), array([17.64]))
+        """
+        if kind not in SCHEMAS or variable not in SCHEMAS[kind] or variable == "time":
+            raise ValueError(f"Unknown history variable: {kind}.{variable}")
+        if aggregation not in AGGREGATIONS:
+            raise ValueError(f"Unknown aggregation: {aggregation}")
+        if bucket_seconds <= 0:
+            raise ValueError("The bucket width must be positive")
+
+        columns = self.query_range(city, kind, start, end)
+        times, values = columns["time"], columns[variable]
+        if len(times) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        buckets = (times - start) // bucket_seconds
+        # Times are sorted, so each bucket is a contiguous run starting at `boundaries`
+        boundaries = np.flatnonzero(np.diff(buckets, prepend=buckets[0] - 1))
+        aggregated = AGGREGATIONS[aggregation].reduceat(values.astype(np.float64), boundaries)
+        if aggregation == "mean":
+            aggregated /= np.diff(np.append(boundaries, len(values)))
+        return start + buckets[boundaries] * bucket_seconds, aggregated
+
+
+# Store shared by the dashboard and the RESTful API
+history_store = HistoryStore()
+
+
+def parse_time_range(start: Optional[str], end: Optional[str], days: Optional[str]) -> Tuple[int, int]:
+    """
+    Resolves the time range of a history request.
+
+    Args:
+        start (str, optional): The start in Unix seconds.
+        end (str, optional): The end in Unix seconds, exclusive, defaulting to just after now.
+        days (str, optional): The length of the range in days when no start is given, defaulting to 30.
+
+    Returns:
+        tuple: The start and end in Unix seconds.
+
+    Raises:
+        ValueError: If a value is not a number.
+
+    Usage Example:
+        >>> parse_time_range(None, '1739900000', '1')
+        (1739813600, 1739900000)
+    """
+    end_time = int(end) if end else int(datetime.now(tz=timezone.utc).timestamp()) + 1  # Include records of this second
+    start_time = int(start) if start else end_time - int(float(days or 30) * 86400)
+    return start_time, end_time
+
+
+def columns_to_json(columns: Dict[str, np.ndarray]) -> Dict[str, list]:
+    """
+    Converts query results to JSON serializable lists, rounding measurements to two decimals.
+
+    Args:
+        columns (dict): One NumPy array per column.
+
+    Returns:
+        dict: One list per column.
+
+    Usage Example:
+        >>> columns_to_json({'time': np.array([1739843673]), 'temperature': np.array([17.64], dtype=np.float32)})
+        {'time': [1739843673], 'temperature': [17.64]}
+    """
+    return {
+        name: (values.tolist() if values.dtype.kind in "iu" else np.round(values.astype(np.float64), 2).tolist())
+        for name, values in columns.items()
+    }
@@ -0,0 +1,142 @@
+import json
+from typing import Any
+
+from fasthtml.common import Canvas, Div, Img, P, Script, Style
+
+from processingdata import weather_icon_url
+from units import convert_temperature, unit_symbol
+
+# URL of the browser chart renderer, served from the static directory by FastHTML
+CHART_SCRIPT_URL = "/static/weather_charts.js"
+
+
+def create_weather_forecast_table_html(weather_icons: list, weather_conditions: list, dates: list) -> Div:
+    """
+    Builds the five-day forecast table as HTML elements, the FORECAST_TABLE_RENDERER=html alternative to
+    visualization.create_weather_forecast_table.
+
+    The icons are OpenWeatherMap image URLs, fetched and cached by the browser, so building
+    the table needs no download and no rendering; its colors and layout follow the image.
+
+    Args:
+    weather_icons (List[str]): List of OpenWeatherMap icon codes for the weather.
+    weather_conditions (List[str]): List of weather conditions descriptions.
+    dates (List[str]): List of dates for the forecast.
+
+    Returns:
+    Div: A five-column grid with the icon, description and date of each day.
+
+    Usage Example:
+        >>> create_weather_forecast_table_html(['04d', '10d', '01d', '01d', '13d'],
+                                               ['overcast clouds', 'light rain', 'clear sky', 'clear sky', 'snow'],
+                                               ['2025-02-18', '2025-02-19', '2025-02-20', '2025-02-21', '2025-02-22'])
+    """
+    return Div(
+        *(Div(
+            Img(src=weather_icon_url(icon_code), alt=condition, width="80", height="80", loading="lazy"),
+            P(condition, style="margin: 4px 0; font-weight: bold; color: #9370DB; font-size: 15px;"),
+            P(date, style="margin: 0; font-weight: bold; font-style: italic; color: #6A5ACD; font-size: 13px;"),
+            style="display: flex; flex-direction: column; align-items: center; text-align: center;"
+        ) for icon_code, condition, date in zip(weather_icons, weather_conditions, dates)),
+        style="display: grid; grid-template-columns: repeat(5, 1fr); gap: 8px; align-items: start; min-height: 250px;"
+    )
+
+
+def _numbers(values: Any) -> list:
+    # Plain rounded floats, whether the series are lists or numpy arrays
+    return [round(float(value), 2) for value in values]
+
+
+def create_chart_data(temperature: float, humidity: int, units: str, wind_speeds: list, wind_directions: list,
+                      daily_highs: list, daily_lows: list, daily_averages: list, precipitation_chances: list,
+                      dates: list) -> dict:
+    """
+    Collects the processed series drawn by the browser chart renderer (CHART_RENDERER=client).
+
+    Temperatures are expected in the displayed unit system; the progress bar range of
+    create_temperature_progressbar is converted here, so the renderer needs no unit logic.
+
+    Args:
+    temperature (float): The current temperature.
+    humidity (int): The current relative humidity in percent.
+    units (str): The displayed unit system.
+    wind_speeds (List[float]): The wind speeds of today.
+    wind_directions (List[int]): The wind directions of today in degrees.
+    daily_highs, daily_lows, daily_averages (List[float]): The five-day temperatures.
+    precipitation_chances (List[float]): The five-day precipitation chances in percent.
+    dates (List[str]): The five dates.
+
+    Returns:
+    dict: The chart data, a few hundred bytes once encoded as JSON.
+    """
+    minimum, zero, maximum = (round(float(value)) for value in convert_temperature([-30, 0, 50], units))
+    return {
+        "temperature": round(float(temperature), 2),
+        "humidity": int(humidity),
+        "temperature_scale": {"min": minimum, "zero": zero, "max": maximum, "symbol": unit_symbol("temperature", units)},
+        "wind": {"speeds": _numbers(wind_speeds), "directions": _numbers(wind_directions)},
+        "forecast": {"dates": [str(date) for date in dates], "highs": _numbers(daily_highs), "lows": _numbers(daily_lows),
+                     "averages": _numbers(daily_averages), "precipitation": _numbers(precipitation_chances)},
+    }
+
+
+def create_chart_scripts(chart_data: dict) -> tuple:
+    """
+    Returns the elements that draw the canvases of a client-rendered page: the chart data
+    as an inline JSON blob and the renderer script, which draws once the page is loaded.
+
+    Usage Example:
+        >>> Div(chart_canvas('chart-humidity', 300, 150), *create_chart_scripts(chart_data))
+    """
+    # "</" is escaped so that no series value can close the script element
+    blob = json.dumps(chart_data, separators=(",", ":")).replace("</", "<\\/")
+    return (Script(blob, type="application/json", id="weather-chart-data"),
+            Script(src=CHART_SCRIPT_URL, defer=True))
+
+
+def chart_canvas(canvas_id: str, width: int, height: int, **attributes) -> Canvas:
+    """
+    Returns a canvas for the browser chart renderer, which draws into the canvases with the
+    ids chart-progressbar, chart-humidity, chart-wind-rose, chart-temperature and chart-precipitation.
+    """
+    return Canvas(id=canvas_id, width=str(width), height=str(height), **attributes)
+
+
+def chart_atlas_style(atlas: dict) -> Style:
+    """
+    Returns the stylesheet of the panels of a chart atlas (CHART_RENDERER=atlas), which embeds
+    the atlas image once for all the panels of the page.
+    """
+    return Style(f".chart-atlas {{ background-image: url(data:image/png;base64,{atlas['png']}); "
+                 "background-repeat: no-repeat; display: block; margin: 0 auto; max-width: 100%; }")
+
+
+def chart_atlas_panel(atlas: dict, name: str, height: int, width: str = "100%", **attributes) -> Div:
+    """
+    Shows one panel of a chart atlas as a CSS sprite: a box with the aspect ratio of the panel's
+    crop, scaled like an image, whose background is the atlas offset to the crop.
+
+    Args:
+    atlas (dict): The atlas returned by chart_atlas.create_chart_atlas.
+    name (str): The panel name, such as "wind_rose".
+    height (int): The height of the box in pixels at most; narrow columns shrink it with the width.
+    width (str): The CSS width of the box at most.
+    **attributes: Further attributes of the box, such as its id.
+
+    Returns:
+    Div: The panel, labelled as an image.
+
+    Usage Example:
+        >>> chart_atlas_panel(atlas, 'humidity_gauge', 150, id='live-humidity-gauge')
+    """
+    x, y, crop_width, crop_height = atlas["panels"][name]
+    # Percentages keep the offsets right at any size: p% aligns the point p% across the image with the
+    # point p% across the box, and the image is scaled so that the crop spans the box
+    position_x = x / (atlas["width"] - crop_width) * 100 if atlas["width"] > crop_width else 0
+    position_y = y / (atlas["height"] - crop_height) * 100 if atlas["height"] > crop_height else 0
+    return Div(role="img", aria_label=name.replace("_", " "), cls="chart-atlas",
+               style=f"width: min({width}, {round(height * crop_width / crop_height)}px); "
+                     f"aspect-ratio: {crop_width} / {crop_height}; "
+                     f"background-size: {atlas['width'] / crop_width * 100:.4f}% auto; "
+                     f"background-position: {position_x:.4f}% {position_y:.4f}%;",
+               **attributes)
@@ -0,0 +1,184 @@
+import asyncio
+import json
+import logging
+from typing import AsyncGenerator, Dict, Optional, Set
+
+from starlette.exceptions import HTTPException
+
+from config import CHART_RENDERER, LIVE_HEARTBEAT_INTERVAL, LIVE_MAX_CHANNELS, LIVE_POLL_INTERVAL, LIVE_RETRY_AFTER
+from getdata import get_weather_now
+from negative_cache import NegativeCache, unknown_locations
+from processingdata import processing_data_now
+from units import CANONICAL_UNITS, convert_temperature
+
+logger = logging.getLogger(__name__)
+
+
+def format_event(event: str, data: dict) -> str:
+    """
+    Formats one Server-Sent Event.
+
+    Args:
+        event (str): The event name.
+        data (dict): The JSON serializable event payload.
+
+    Returns:
+        str: The event in the text/event-stream format.
+
+    Usage Example:
+        >>> format_event('humidity', {'humidity': 64})
+        'event: humidity\\ndata: {"humidity":64}\\n\\n'
+    """
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class _CityChannel:
+    """
+    The subscribers of one city in one unit system and the poller that feeds them.
+    """
+
+    def __init__(self, city_name: str, units: str = CANONICAL_UNITS) -> None:
+        self.city_name = city_name
+        self.units = units
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.values: Dict[str, object] = {}  # The values the latest panels were rendered from
+        self.events: Dict[str, str] = {}  # The latest event of each panel, replayed to new subscribers
+        self.poller: Optional[asyncio.Task] = None
+
+    def publish(self, event: str, message: str) -> None:
+        self.events[event] = message
+        for queue in self.subscribers:
+            if queue.full():
+                queue.get_nowait()  # A slow client only needs the latest state of each panel
+            queue.put_nowait(message)
+
+
+class LiveUpdates:
+    """
+    Broadcasts current conditions of each city to every subscribed dashboard.
+
+    One poller per city with at least one subscriber fetches the current weather
+    every `poll_interval` seconds, re-renders only the panels whose inputs changed
+    (temperature progress bar, humidity gauge, weather icon), and pushes them to
+    all subscribers as Server-Sent Events. The poller stops with the last subscriber.
+    Each unit system of a city has its own channel; their polls share one snapshot
+    cache entry, because the data is always fetched in metric units. Locations in the
+    negative cache get no channel, and at most `max_channels` channels are open at once.
+
+    Args:
+        poll_interval (float): Seconds between upstream polls of a city.
+        heartbeat_interval (float): Seconds between keep-alive comments on idle streams.
+        max_channels (int): The channels (cities and unit systems) polled at once.
+
+    Usage Example:
+        >>> live_updates = LiveUpdates()
+        >>> events = live_updates.stream('Guangzhou')
+        >>> StreamingResponse(events, media_type='text/event-stream', background=BackgroundTask(events.aclose))
+    """
+
+    def __init__(self, poll_interval: float = LIVE_POLL_INTERVAL,
+                 heartbeat_interval: float = LIVE_HEARTBEAT_INTERVAL, max_channels: int = LIVE_MAX_CHANNELS) -> None:
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.max_channels = max_channels
+        self._channels: Dict[str, _CityChannel] = {}
+
+    def subscriber_count(self, city_name: str, units: str = CANONICAL_UNITS) -> int:
+        channel = self._channels.get(self._channel_key(city_name, units))
+        return len(channel.subscribers) if channel else 0
+
+    @staticmethod
+    def _channel_key(city_name: str, units: str) -> str:
+        return f"{NegativeCache.normalize(city_name)}|{units}"
+
+    async def _poll(self, channel: _CityChannel) -> None:
+        while True:
+            try:
+                await self._refresh(channel)
+            except Exception as error:
+                # Upstream failures are expected here and retried with the next poll
+                logger.warning("Live update poll failed for %s: %s", channel.city_name, error)
+            await asyncio.sleep(self.poll_interval)
+
+    async def _refresh(self, channel: _CityChannel) -> None:
+        data_now = await asyncio.to_thread(get_weather_now, channel.city_name)
+        temperature, humidity, description, city, icon_code, icon_url = processing_data_now(data_now)
+        temperature = convert_temperature(temperature, channel.units)
+
+        if channel.values.get("temperature") != temperature:
+            event = {"temperature": temperature}
+            if CHART_RENDERER != "client":
+                # Imported on first poll so that starting the dashboard does not load matplotlib
+                from visualization import create_temperature_progressbar
+                event["progressbar"] = await asyncio.to_thread(create_temperature_progressbar, temperature, units=channel.units)
+            channel.values["temperature"] = temperature
+            channel.publish("temperature", format_event("temperature", event))
+
+        if channel.values.get("humidity") != humidity:
+            event = {"humidity": humidity}
+            if CHART_RENDERER != "client":
+                from visualization import create_humidity_gauge
+                event["gauge"] = await asyncio.to_thread(create_humidity_gauge, humidity)
+            channel.values["humidity"] = humidity
+            channel.publish("humidity", format_event("humidity", event))
+
+        if channel.values.get("icon") != (icon_code, description):
+            channel.values["icon"] = (icon_code, description)
+            channel.publish("icon", format_event(
+                "icon", {"icon_code": icon_code, "icon_url": icon_url, "description": description}))
+
+    def stream(self, city_name: str, units: str = CANONICAL_UNITS) -> AsyncGenerator[str, None]:
+        """
+        Subscribes to the live updates of a city.
+
+        The subscription starts with the first event read and ends when the generator is
+        closed; close it when the client disconnects (see the /live route of main_app.py), so
+        that the poller of a city stops with its last subscriber.
+
+        Args:
+            city_name (str): The name of the city.
+            units (str): The unit system of the pushed temperatures.
+
+        Returns:
+            AsyncGenerator: Server-Sent Events, starting with the latest state of every panel.
+
+        Raises:
+            HTTPException: 400 if OpenWeatherMap recently rejected the location, 503 if `max_channels`
+                channels are open and the city has none yet.
+        """
+        if city_name in unknown_locations:
+            raise HTTPException(status_code=400, detail="OpenWeatherMap API error")
+        key = self._channel_key(city_name, units)
+        if key not in self._channels and len(self._channels) >= self.max_channels:
+            raise HTTPException(status_code=503, detail="Too many cities are followed live, please retry shortly",
+                                headers={"Retry-After": str(LIVE_RETRY_AFTER)})
+        return self._subscribe(key, city_name, units)
+
+    async def _subscribe(self, key: str, city_name: str, units: str) -> AsyncGenerator[str, None]:
+        channel = self._channels.get(key)
+        if channel is None:
+            channel = self._channels[key] = _CityChannel(city_name, units)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=8)
+        for message in channel.events.values():
+            queue.put_nowait(message)
+        channel.subscribers.add(queue)
+        if channel.poller is None:
+            channel.poller = asyncio.create_task(self._poll(channel))
+
+        try:
+            yield "retry: 5000\n\n"  # Reconnect after five seconds if the connection drops
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), timeout=self.heartbeat_interval)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+        finally:
+            channel.subscribers.discard(queue)
+            if not channel.subscribers:
+                if channel.poller is not None:
+                    channel.poller.cancel()
+                self._channels.pop(key, None)
+
+
+# Broadcaster shared by every dashboard connection of this process
+live_updates = LiveUpdates()
@@ -1,29 +1,61 @@
-from fasthtml.common import Strong, fast_app, serve, Titled, Div, P, Img, H1, H2, H3, A, Form, Label, Input, Button, Script, Ul, Li  
-# Explicit import to satisfy mypy
-import httpx
-from fastapi import FastAPI, HTTPException, Query
-import matplotlib.pyplot as plt
-import base64
-from io import BytesIO
-import numpy as np
-from datetime import datetime, timedelta
-import logging
-from urllib.parse import unquote
-import requests
-from flask import Flask, jsonify, abort, request, url_for
-
-
-from getdata import get_weather_now, get_weather_today, get_weather_five_days
-from processingdata import processing_data_now, processing_data_today, processing_data_five_days
-from visualization import create_temperature_progressbar, create_humidity_gauge, create_wind_rose, create_temperature_chart, create_precipitation_chances_pie_charts, create_weather_forecast_table
-from autolocation_process import get_city_name_auto
-from get_icon import get_weather_icon
-from restful_api import create_api, generate_api_url
-
-app, rt = fast_app()
-
-# FastHTML routes 
-@rt("/")
+from fasthtml.common import Strong, fast_app, serve, Titled, Div, P, Img, H1, H2, H3, A, Form, Label, Input, Button, Script, Ul, Li, Select, Option  
+from starlette.background import BackgroundTask
+from starlette.exceptions import HTTPException
+from starlette.responses import FileResponse, HTMLResponse, JSONResponse, Response, StreamingResponse
+import json
+import os
+import time
+from typing import Any, Callable, List, Optional, Tuple
+from urllib.parse import quote
+
+# Modules needed to answer any request are imported here. Chart rendering (matplotlib),
+# the history stores (numpy), the RESTful API (Flask) and auto-location (requests) are
+# imported by the routes that use them, so the app starts without loading them.
+from getdata import STALE_KEY, SnapshotCacheProvider, get_weather_now, get_weather_today, get_weather_five_days
+from processingdata import processing_data_now, processing_data_today, five_day_aggregator
+from live_updates import live_updates
+from metrics import ASGIMetricsMiddleware, PROMETHEUS_CONTENT_TYPE, registry, stage_seconds
+from profiling import PROFILE_HEADER, ProfilingMiddleware, request_profiler
+from warmup import chart_warm_up
+from units import UNIT_SYSTEMS, convert_temperature, normalize_units, unit_symbol
+from admission import admission_shed, dashboard_gate
+from prerender import CHART_NAME, configured_cities, prerender_store
+from config import CHART_RENDERER, DASHBOARD_OVERLOAD_RESPONSE, DASHBOARD_RETRY_AFTER, DEFAULT_UNITS, FORECAST_TABLE_RENDERER, PRERENDER_INTERVAL, WARM_UP_CHARTS
+
+async def warm_up_charts():
+    """
+    Start rendering every chart on synthetic data in the background; /ready answers 503 until it is done.
+    """
+    # Client-rendered dashboards draw their charts in the browser, leaving nothing to warm up
+    if WARM_UP_CHARTS and CHART_RENDERER != "client":
+        chart_warm_up.start()
+    else:
+        chart_warm_up.skip()
+
+async def start_prerender():
+    """
+    Prerender the PRERENDER_CITIES dashboards every PRERENDER_INTERVAL seconds, when both are set.
+    """
+    if PRERENDER_INTERVAL > 0 and configured_cities():
+        from prerender import schedule
+        schedule(PRERENDER_INTERVAL, configured_cities())
+
+# The snapshots of degraded pages: any stored snapshot, marked stale past WEATHER_CACHE_TTL, and no upstream request
+_stored_snapshots = SnapshotCacheProvider(max_age=float("inf"))
+
+# FastHTML routes, registered on the app by create_app
+_routes: List[Tuple[str, Callable]] = []
+
+def route(path: str) -> Callable[[Callable], Callable]:
+    """
+    Declare a route of the dashboard; create_app registers it with FastHTML's `rt`.
+    """
+    def register(endpoint: Callable) -> Callable:
+        _routes.append((path, endpoint))
+        return endpoint
+    return register
+
+@route("/")
 def get():
     """
     Render the home page with a search form for weather queries.
@@ -36,6 +68,9 @@ def get():
     search_form = Form(action="/weather", method="get")(
         Label("Location Input:"),
         Input(type="text", name="city_name", id="locationInput"),
+        Label("Units:"),
+        Select(name="units")(*(Option(value=name, selected=(name == DEFAULT_UNITS))(f"{name.capitalize()} ({unit_symbol('temperature', name)})")
+                               for name in UNIT_SYSTEMS)),
         Input(type="submit", value="Get Weather"),
         Button(type="button", onclick="getLocation()")("Auto Locate"),
         Script("""
@@ -80,8 +115,8 @@ def get():
         )
     )
 
-@rt("/get_city_name_auto")
-def get_city_name_auto_view(coordinates: str = Query(...)):
+@route("/get_city_name_auto")
+def get_city_name_auto_view(coordinates: str):
     """
     Get the city name based on geographic coordinates.
     
@@ -91,62 +126,200 @@ def get_city_name_auto_view(coordinates: str = Query(...)):
     Returns:
         str: The name of the city corresponding to the given coordinates.
     """
+    from autolocation_process import get_city_name_auto
     
     city_name = get_city_name_auto(coordinates)
     return city_name
 
-@rt("/weather")
-def weather(city_name: str = Query(...)):
+@route("/weather")
+@request_profiler.profiled("weather")
+def weather(city_name: str, units: str = DEFAULT_UNITS):
     
     """
     Retrieve and display weather data for a specified city.
+
+    A page prerendered by prerender.py within PRERENDER_MAX_AGE seconds is served as it is.
+    Other dashboards are built by at most DASHBOARD_MAX_CONCURRENCY requests at once (see admission.py).
+    A request that cannot get a slot in time gets the degraded page, built only from the stored
+    OpenWeatherMap snapshots and the charts already in the chart cache, without any upstream
+    request or history record; without a stored snapshot of the city, or with
+    DASHBOARD_OVERLOAD_RESPONSE=reject, it gets a 503 response with a Retry-After header.
     
     Args:
         city_name (str): The name of the city for which to retrieve weather data.
+        units (str): The unit system to display, "metric", "imperial" or "standard". The data is
+            fetched in metric units whatever is displayed, so every view of a city shares one fetch.
         
     Returns:
         Titled: A titled HTML page displaying various weather-related charts and tables.
+
+    Raises:
+        HTTPException: 400 if the unit system is unknown, 503 if the dashboard is overloaded and rejects requests.
     """
-    # Current data
-    weather_data_now = get_weather_now(city_name)
-    temperature, humidity, weather_description, city, icon_code, icon_url = processing_data_now(weather_data_now)
+    units = _validated_units(units)
+    prerendered = prerender_store.load(city_name, units)
+    if prerendered is not None:
+        return HTMLResponse(prerendered)
+    if dashboard_gate.enter():
+        try:
+            return _weather_page(city_name, units, degraded=False)
+        finally:
+            dashboard_gate.leave()
+    if DASHBOARD_OVERLOAD_RESPONSE != "reject":
+        try:
+            page = _weather_page(city_name, units, degraded=True)
+        except LookupError:
+            pass  # No stored snapshot of the city to degrade to
+        else:
+            admission_shed.inc(route="weather", response="degraded")
+            return page
+    admission_shed.inc(route="weather", response="rejected")
+    raise HTTPException(status_code=503, detail="The dashboard is overloaded, please retry shortly",
+                        headers={"Retry-After": str(DASHBOARD_RETRY_AFTER)})
+
+def _render_chart(create_chart, degraded: bool, *args, **kwargs) -> Optional[Any]:
+    """
+    Renders a chart (or the chart atlas), or on a degraded page only looks it up in the chart cache (None when it is not there).
+    """
+    return create_chart.cached(*args, **kwargs) if degraded else create_chart(*args, **kwargs)
+
+def _chart_img(image: Optional[str], **attributes):
+    """
+    Returns the Img of a rendered chart, or a note in its place when the chart was skipped on a degraded page.
+    """
+    if image is None:
+        return P("Chart skipped while the dashboard is busy; reload the page in a moment.",
+                 **{name: value for name, value in attributes.items() if name == "id"},
+                 style="color: #888; font-size: 14px;")
+    return Img(src=f"data:image/png;base64,{image}", **attributes)
+
+def _atlas_panel(atlas: Optional[dict], name: str, height: int, **attributes):
+    """
+    Returns a panel of the chart atlas as a CSS sprite, or the note of a skipped chart when a degraded page found no atlas.
+    """
+    if atlas is None:
+        return _chart_img(None, **attributes)
+    from html_widgets import chart_atlas_panel
+    return chart_atlas_panel(atlas, name, height, **attributes)
+
+def _weather_page(city_name: str, units: str, degraded: bool):
+    """
+    Builds the dashboard page of `weather`; a degraded page reads only the stored snapshots, records
+    nothing and renders no chart that is not already cached.
 
-    # Create progress bars and humidity gauges
-    temp_progressbar = create_temperature_progressbar(temperature)
-    humidity_gauge = create_humidity_gauge(humidity)
+    With CHART_RENDERER=client the page carries the processed series as JSON and canvases that
+    static/weather_charts.js draws on, and nothing is rendered (or imported) with matplotlib.
+    """
+    from history_store import history_store
+    from trend_archive import trend_archive
+    from restful_api import generate_api_url
     
-    # Today data
-    weather_data_today = get_weather_today(city_name)
-    wind_speeds, wind_directions = processing_data_today(weather_data_today)
+    temperature_symbol = unit_symbol('temperature', units)
     
-    # Create wind rose
-    wind_rose = create_wind_rose(wind_speeds, wind_directions)
+    # A degraded page adds no upstream request: it only reads the stored snapshots, and raises LookupError without them
+    if degraded:
+        weather_data_now = _stored_snapshots.current(city_name)
+        weather_data_today = _stored_snapshots.forecast(city_name, 8)
+        weather_data_five_days = _stored_snapshots.forecast(city_name, 40)
+    else:
+        weather_data_now = get_weather_now(city_name)
+        weather_data_today = get_weather_today(city_name)
+        weather_data_five_days = get_weather_five_days(city_name)
+
+    # Current data
+    with stage_seconds.time(stage="processing", dataset="now"):
+        temperature, humidity, weather_description, city, icon_code, icon_url = processing_data_now(weather_data_now)
+        display_temperature = convert_temperature(temperature, units)
+    
+    # Today data
+    with stage_seconds.time(stage="processing", dataset="today"):
+        wind_speeds, wind_directions = processing_data_today(weather_data_today)
 
     # Five days forecast data
-    weather_data_five_days = get_weather_five_days(city_name)    
-    daily_highs, daily_lows, daily_averages, dates, icons, conditions_five_days, precipitation_chances = processing_data_five_days(weather_data_five_days)
+    with stage_seconds.time(stage="processing", dataset="five_days"):
+        daily_highs, daily_lows, daily_averages, dates, icons, conditions_five_days, precipitation_chances = five_day_aggregator.process(city, weather_data_five_days)
+    
+    # Record the observation and the forecast run for the history API and the trend archive; degraded pages saw nothing new
+    if not degraded:
+        with stage_seconds.time(stage="recording"):
+            history_store.record_observation(city, weather_data_now['dt'], temperature, humidity)
+            trend_archive.append(city, weather_data_now['dt'], temperature, humidity)
+            history_store.record_forecast(city, weather_data_five_days['list'][0]['dt'], daily_highs, daily_lows, daily_averages, precipitation_chances)
     
-    # Create temperature chart
-    temperature_chart = create_temperature_chart(daily_highs, daily_lows, daily_averages, dates)
+    with stage_seconds.time(stage="processing", dataset="units"):
+        display_highs, display_lows, display_averages = (convert_temperature(values, units)
+                                                         for values in (daily_highs, daily_lows, daily_averages))
     
-    # Create precipitation chances chart
-    precipitation_chances_chart = create_precipitation_chances_pie_charts(precipitation_chances, dates)
+    # Create the charts, as canvases drawn in the browser or as matplotlib images (see CHART_RENDERER)
+    if CHART_RENDERER == "client":
+        from html_widgets import chart_canvas, create_chart_data, create_chart_scripts
+        chart_data = create_chart_data(display_temperature, humidity, units, wind_speeds, wind_directions,
+                                       display_highs, display_lows, display_averages, precipitation_chances, dates)
+        temp_progressbar = chart_canvas("chart-progressbar", 400, 80, style="width:70%; height: 80px;")
+        humidity_gauge = chart_canvas("chart-humidity", 300, 150, style="width:100%; height:150px;")
+        wind_rose = chart_canvas("chart-wind-rose", 300, 210, style="width: 100%; height: 210px;")
+        temperature_chart = chart_canvas("chart-temperature", 560, 250, style="width: 100%; height: 250px;")
+        precipitation_chances_chart = chart_canvas("chart-precipitation", 560, 250, style="width: 100%; height: 250px;")
+        chart_scripts = create_chart_scripts(chart_data)
+    elif CHART_RENDERER == "atlas":
+        from chart_atlas import create_chart_atlas
+        from html_widgets import chart_atlas_style
+        table_inputs = (icons, conditions_five_days) if FORECAST_TABLE_RENDERER == "image" else (None, None)
+        atlas = _render_chart(create_chart_atlas, degraded, display_temperature, humidity, wind_speeds, wind_directions,
+                              display_highs, display_lows, display_averages, precipitation_chances, dates, *table_inputs, units=units)
+        temp_progressbar = _atlas_panel(atlas, "temperature_progressbar", 80, width="70%", id="live-temperature-bar")
+        humidity_gauge = _atlas_panel(atlas, "humidity_gauge", 150, id="live-humidity-gauge")
+        wind_rose = _atlas_panel(atlas, "wind_rose", 210)
+        temperature_chart = _atlas_panel(atlas, "temperature_chart", 250)
+        precipitation_chances_chart = _atlas_panel(atlas, "precipitation_pies", 250)
+        chart_scripts = (chart_atlas_style(atlas),) if atlas is not None else ()
+    else:
+        from visualization import create_temperature_progressbar, create_humidity_gauge, create_wind_rose, create_temperature_chart, create_precipitation_chances_pie_charts
+        temp_progressbar = _chart_img(_render_chart(create_temperature_progressbar, degraded, display_temperature, units=units),
+                                      id="live-temperature-bar", style="width:70%; height: 80px; object-fit: cover;")
+        humidity_gauge = _chart_img(_render_chart(create_humidity_gauge, degraded, humidity),
+                                    id="live-humidity-gauge", style="width:100%; height:150px; object-fit: contain;")
+        wind_rose = _chart_img(_render_chart(create_wind_rose, degraded, wind_speeds, wind_directions),
+                               style="width: 100%; height: 210px; object-fit: contain;")
+        temperature_chart = _chart_img(_render_chart(create_temperature_chart, degraded, display_highs, display_lows, display_averages, dates, units=units),
+                                       style="width: 100%; height: 250px; object-fit: contain;")
+        precipitation_chances_chart = _chart_img(_render_chart(create_precipitation_chances_pie_charts, degraded, precipitation_chances, dates),
+                                                 style="width: 100%; height: 250px; object-fit: contain;")
+        chart_scripts = ()
     
-    # Create weather forecast table
-    weather_forecast_table = create_weather_forecast_table(icons, conditions_five_days, dates)
+    # Create weather forecast table, as HTML or as an image (see FORECAST_TABLE_RENDERER); client-rendered pages use HTML
+    if FORECAST_TABLE_RENDERER == "html" or CHART_RENDERER == "client":
+        from html_widgets import create_weather_forecast_table_html
+        weather_forecast_table = create_weather_forecast_table_html(icons, conditions_five_days, dates)
+    elif CHART_RENDERER == "atlas":
+        weather_forecast_table = _atlas_panel(atlas, "forecast_table", 250)
+    else:
+        from visualization import create_weather_forecast_table
+        weather_forecast_table = _chart_img(_render_chart(create_weather_forecast_table, degraded, icons, conditions_five_days, dates),
+                                            style="width: 100%; height: 250px; object-fit: contain;")
     
     # Extract url information
     now_url, today_url, five_days_url = generate_api_url(city)
+    
+    # Snapshots served past their age, because OpenWeatherMap is failing or a cache tier answered first
+    stale_since = [data[STALE_KEY] for data in (weather_data_now, weather_data_today, weather_data_five_days) if STALE_KEY in data]
+    stale_notice = [P(f"OpenWeatherMap has not refreshed this city yet; showing data fetched at {time.strftime('%Y-%m-%d %H:%M', time.localtime(min(stale_since)))}.",
+                      style="color: #b26a00; background-color: #fff4e5; padding: 10px; border-radius: 5px;")] if stale_since else []
+    busy_notice = [P("The dashboard is busy; charts that were not rendered recently are skipped.",
+                     style="color: #b26a00; background-color: #fff4e5; padding: 10px; border-radius: 5px;")] if degraded and CHART_RENDERER != "client" else []
 
+    html_build_started = time.perf_counter()
     weather_html = Div(
+        *stale_notice,
+        *busy_notice,
         Div(
             # The first row of the dashboard
             Div(
                 H1(f"Current Weather"),
                 Div(
-                    Img(src=icon_url, alt=weather_description, 
+                    Img(src=icon_url, alt=weather_description, id="live-icon",
                         style="width:100px; height:100px; margin-right: 20px;"),
-                    H2(f"Condition: {weather_description.capitalize()}", 
+                    H2(f"Condition: {weather_description.capitalize()}", id="live-condition",
                       style="font-size: 20px; color: #666; margin: 0;"),
                     style="display: flex; align-items: center; margin-bottom: 20px;"
                 ),
@@ -154,15 +327,15 @@ def weather(city_name: str = Query(...)):
             ),
             Div(
                 H2("Temperature", style="font-size: 18px; color: #333; margin-bottom: 10px;"),
-                P(f"{temperature}°C", style="font-size: 36px; margin: 0 0 10px 0; color: #2196F3;"),
-                Img(src=f"data:image/png;base64,{temp_progressbar}", 
-                    style="width:70%; height: 80px; object-fit: cover;"),
+                P(f"{display_temperature}{temperature_symbol}", id="live-temperature", style="font-size: 36px; margin: 0 0 10px 0; color: #2196F3;"),
+                temp_progressbar,
+                Div(*(A(href=f"/weather?city_name={quote(city_name)}&units={name}", style="font-size: 14px; margin-right: 10px;")(unit_symbol('temperature', name))
+                      for name in UNIT_SYSTEMS if name != units)),
                 style="grid-column: 2; padding-right: 20px;"
             ),
             Div(
                 H2("Humidity", style="font-size: 18px; color: #333; margin-bottom: 10px;"),
-                Img(src=f"data:image/png;base64,{humidity_gauge}", 
-                    style="width:100%; height:150px; object-fit: contain;"),
+                humidity_gauge,
                 style="grid-column: 3;"
             ),
             style="display: grid; grid-template-columns: 1fr 1fr 1fr; gap: 20px;"
@@ -171,14 +344,12 @@ def weather(city_name: str = Query(...)):
             # The second row of the dashboard
             Div(
                 H2("Wind Rose Today", style="margin-bottom: 15px;"),
-                Img(src=f"data:image/png;base64,{wind_rose}",
-                    style="width: 100%; height: 210px; object-fit: contain;"),
+                wind_rose,
                 style="grid-column: 1;"
             ),
             Div(
                 H2("5 Days Weather Forecast", style="margin-bottom: 15px;"),
-                Img(src=f"data:image/png;base64,{weather_forecast_table}",
-                    style="width: 100%; height: 250px; object-fit: contain;"),
+                weather_forecast_table,
                 style="grid-column: 2; padding-right: 20px;"
             ),
             style="display: grid; grid-template-columns: 1fr 1fr; gap: 20px; margin-top: 20px;"
@@ -187,14 +358,13 @@ def weather(city_name: str = Query(...)):
             # The third row of the dashboard
             Div(
                 H2("Temperature Forecast", style="margin-bottom: 15px;"),
-                Img(src=f"data:image/png;base64,{temperature_chart}",
-                    style="width: 100%; height: 250px; object-fit: contain;"),
+                temperature_chart,
+                A(href=f"/trend?city_name={quote(city)}&units={units}", style="font-size: 14px;")("View long-range temperature trend"),
                 style="grid-column: 1;"
             ),
             Div(
                 H2("Precipitation Chances", style="margin-bottom: 15px;"),
-                Img(src=f"data:image/png;base64,{precipitation_chances_chart}",
-                    style="width: 100%; height: 250px; object-fit: contain;"),
+                precipitation_chances_chart,
                 style="grid-column: 2; padding-right: 20px;"
             ),
             style="display: grid; grid-template-columns: 1fr 1fr; gap: 20px; margin-top: 20px;"
@@ -231,9 +401,258 @@ def weather(city_name: str = Query(...)):
             ),
             style="text-align:center;"
         ),
+        *chart_scripts,
+        # Replace the current-conditions panels as the server pushes new readings; client-rendered
+        # pages get no images in the events and redraw their canvases instead
+        Script(f"""
+            function showChart(id, png) {{
+                var element = document.getElementById(id);
+                if (element.tagName !== 'IMG') {{
+                    // A sprite of the chart atlas, or the placeholder of a skipped chart
+                    var image = document.createElement('img');
+                    image.id = id;
+                    image.style.cssText = element.style.cssText;
+                    image.style.background = 'none';
+                    image.style.maxWidth = '100%';
+                    element.replaceWith(image);
+                    element = image;
+                }}
+                element.src = 'data:image/png;base64,' + png;
+            }}
+            var source = new EventSource('/live?city_name=' + encodeURIComponent({_js_string(city_name)}) + '&units={units}');
+            source.addEventListener('temperature', function(event) {{
+                var data = JSON.parse(event.data);
+                document.getElementById('live-temperature').textContent = data.temperature + {_js_string(temperature_symbol)};
+                if (data.progressbar) {{
+                    showChart('live-temperature-bar', data.progressbar);
+                }} else if (window.WeatherCharts && WeatherCharts.data) {{
+                    WeatherCharts.progressbar(document.getElementById('chart-progressbar'), data.temperature, WeatherCharts.data.temperature_scale);
+                }}
+            }});
+            source.addEventListener('humidity', function(event) {{
+                var data = JSON.parse(event.data);
+                if (data.gauge) {{
+                    showChart('live-humidity-gauge', data.gauge);
+                }} else if (window.WeatherCharts) {{
+                    WeatherCharts.gauge(document.getElementById('chart-humidity'), data.humidity);
+                }}
+            }});
+            source.addEventListener('icon', function(event) {{
+                var data = JSON.parse(event.data);
+                var icon = document.getElementById('live-icon');
+                icon.src = data.icon_url;
+                icon.alt = data.description;
+                document.getElementById('live-condition').textContent =
+                    'Condition: ' + data.description.charAt(0).toUpperCase() + data.description.slice(1);
+            }});
+        """),
         style="max-width: 1200px; margin: 0 auto; padding: 20px; display: flex; flex-direction: column;"
     )
+    page = Titled(f"Weather in {city}", weather_html)
+    stage_seconds.observe(time.perf_counter() - html_build_started, stage="html_build")
     
-    return Titled(f"Weather in {city}", weather_html)
+    return page
+
+def weather_document(app, city_name: str, units: str) -> str:
+    """
+    Render the complete HTML document /weather serves for a city, outside of any request, for prerender.py.
+
+    Args:
+        app (FastHTML): The app built by create_app, whose page headers and footers wrap the dashboard.
+        city_name (str): The name of the city.
+        units (str): The unit system to display.
+
+    Returns:
+        str: The HTML document.
+    """
+    from fasthtml.common import Body, Head, Html, to_xml
+
+    heads: List[Any] = []
+    body: List[Any] = []
+    for part in _weather_page(city_name, _validated_units(units), degraded=False):
+        (heads if getattr(part, "tag", "") in ("title", "meta", "link", "style", "base") else body).append(part)
+    return to_xml(Html(Head(*heads, *app.hdrs), Body(*body, *app.ftrs, **app.bodykw), **app.htmlkw))
+
+@route("/prerendered/{name}")
+def prerendered_chart(name: str):
+    """
+    Serve a chart of a prerendered page; chart files are named after their content and never change.
+    """
+    path = prerender_store.chart_path(name)
+    if not CHART_NAME.fullmatch(name) or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Unknown chart")
+    return FileResponse(path, media_type="image/png", headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
+@route("/live")
+async def live(city_name: str, units: str = DEFAULT_UNITS):
+    """
+    Stream the current conditions of a city as Server-Sent Events.
+    
+    All open dashboards of a city share one upstream poll; only the panels whose
+    readings changed (temperature, humidity gauge, weather icon) are re-rendered and pushed.
+    
+    Args:
+        city_name (str): The name of the city.
+        units (str): The unit system of the pushed temperatures.
+        
+    Returns:
+        StreamingResponse: A text/event-stream response that stays open until the client disconnects.
+
+    Raises:
+        HTTPException: 400 if OpenWeatherMap recently rejected the city, 503 if LIVE_MAX_CHANNELS cities are followed.
+    """
+    events = live_updates.stream(city_name, _validated_units(units))
+    # Closing the stream unsubscribes at once when the client disconnects, instead of when the generator is collected
+    return StreamingResponse(events, media_type="text/event-stream", background=BackgroundTask(events.aclose),
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@route("/trend")
+@request_profiler.profiled("trend")
+def trend(city_name: str, days: int = 365, units: str = DEFAULT_UNITS):
+    """
+    Display the long-range temperature trend of a city from the observation archive.
+    
+    Args:
+        city_name (str): The name of the city.
+        days (int): How many days of history to display, defaulting to one year.
+        units (str): The unit system of the temperatures.
+        
+    Returns:
+        Titled: A titled HTML page displaying the temperature trend chart.
+
+    Raises:
+        HTTPException: 400 if the city name is not a valid archive directory name, such as "..".
+    """
+    from visualization import create_temperature_trend_chart
+    from trend_archive import trend_archive
+    
+    units = _validated_units(units)
+    end = int(time.time()) + 1
+    try:
+        times, values = trend_archive.read(city_name, end - days * 86400, end)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid city name")
+    if len(times) == 0:
+        content = P("No observations have been archived for this city yet. Open its dashboard to start recording.")
+    else:
+        trend_chart = create_temperature_trend_chart(times, values['temperature'], units=units)
+        content = Img(src=f"data:image/png;base64,{trend_chart}", style="width: 100%; object-fit: contain;")
+    
+    return Titled(f"Temperature Trend in {city_name} (last {days} days)",
+        Div(
+            content,
+            A(href="/", style="display:inline-block; margin-top:20px;")("Return to Home"),
+            style="max-width: 1200px; margin: 0 auto; padding: 20px;"
+        )
+    )
+
+@route("/ready")
+def ready():
+    """
+    Report whether this worker has finished its chart warm-up and can take traffic.
+    
+    Returns:
+        JSONResponse: The warm-up status with the first-render and steady-state time of each chart,
+        with status 200 once warm and 503 before.
+    """
+    status = chart_warm_up.status()
+    return JSONResponse(status, status_code=200 if status['ready'] else 503)
+
+@route("/metrics")
+def prometheus_metrics():
+    """
+    Expose the dashboard latency metrics in the Prometheus text format.
+    
+    Covers upstream fetches, cache lookups, data processing, chart rendering,
+    PNG and base64 encoding, HTML building and whole requests.
+    
+    Returns:
+        Response: The metrics as text/plain in the Prometheus exposition format.
+    """
+    return Response(registry.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+@route("/profiles")
+def profiles(request, token: str = ""):
+    """
+    List the recent request profiles with their total times.
+    
+    Only available when PROFILE_ADMIN_TOKEN is configured, and the token must be sent in the
+    X-Profile-Token header or the token query parameter; with PROFILE_SAMPLE_RATE alone the
+    captures are saved but not served.
+    
+    Args:
+        token (str): The admin token, for browsers that cannot set the header.
+        
+    Returns:
+        Titled: A titled HTML page listing the captures, newest first, with download links.
+    """
+    if not _profiles_allowed(request, token):
+        return Response("Not Found", status_code=404)
+    captures = request_profiler.captures()
+    rows = [Li(A(href=f"/profiles/download?name={capture['name']}&token={quote(token)}")(capture['name']),
+               f" {capture['label']} ({capture['detail']}): {capture['total_seconds'] * 1000:.1f} ms")
+            for capture in captures]
+    return Titled("Request Profiles",
+        Div(
+            P(f"{len(captures)} captures in {request_profiler.directory}. "
+              "Open a download with `python -m pstats`, snakeviz or flameprof."),
+            Ul(*rows),
+            style="max-width: 1200px; margin: 0 auto; padding: 20px;"
+        )
+    )
+
+@route("/profiles/download")
+def profiles_download(request, name: str = "", token: str = ""):
+    """
+    Download the pstats file of one request profile.
+    
+    Args:
+        name (str): The capture name listed on the profiles page.
+        token (str): The admin token, as for the profiles page.
+        
+    Returns:
+        FileResponse: The pstats file, or a 404 response.
+    """
+    path = request_profiler.artifact_path(name) if _profiles_allowed(request, token) else None
+    if path is None:
+        return Response("Not Found", status_code=404)
+    return FileResponse(path, media_type="application/octet-stream", filename=f"{name}.pstats")
+
+def _js_string(value: str) -> str:
+    # A JavaScript string literal that cannot close the inline script it is placed in
+    return json.dumps(value).replace("</", "<\\/")
+
+def _validated_units(units: str) -> str:
+    try:
+        return normalize_units(units)
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+
+def _profiles_allowed(request, token: str) -> bool:
+    # Without an admin token the captures are never served, even when requests are sampled
+    if not request_profiler.enabled or not request_profiler.admin_token:
+        return False
+    return request_profiler.is_admin(request.headers.get(PROFILE_HEADER) or token)
+
+def create_app():
+    """
+    Build the dashboard app: the FastHTML app with every route, its startup hooks and middleware.
+    
+    Importing this module builds nothing; servers call this factory, as wsgi.create_app does
+    for the RESTful API, so every worker and test gets its own app:
+    
+        uvicorn --factory main_app:create_app
+    
+    Returns:
+        FastHTML: The ASGI application.
+    """
+    app, rt = fast_app(on_startup=[warm_up_charts, start_prerender])
+    app.add_middleware(ASGIMetricsMiddleware, application="dashboard")
+    if request_profiler.enabled:
+        app.add_middleware(ProfilingMiddleware, profiler=request_profiler)
+    for path, endpoint in _routes:
+        rt(path)(endpoint)
+    return app
 
-serve() # run the app
+if __name__ == "__main__":
+    serve(app="create_app", factory=True) # run the app
@@ -0,0 +1,257 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Tuple
+
+# Upper bounds in seconds of the latency histogram buckets, from 1 ms to 10 s
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: LabelKey, extra: str = "") -> str:
+    parts = ['%s="%s"' % (name, _escape(value)) for name, value in key]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    """
+    A monotonically increasing count, kept separately for each combination of labels.
+
+    Usage Example:
+        >>> upstream_errors = Counter('weather_upstream_errors_total', 'Failed upstream requests.')
+        >>> upstream_errors.inc(endpoint='weather', status=500)
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str) -> None:
+        self.name = name
+        self.documentation = documentation
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: object) -> None:
+        """
+        Adds to the count of the given labels.
+
+        Args:
+            amount (float): The non-negative amount to add.
+            **labels: The label values, for example endpoint='weather'.
+        """
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: object) -> float:
+        return self._values.get(_label_key(labels), 0)
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{_format_labels(key)} {value:g}" for key, value in sorted(values)]
+
+
+class Gauge(Counter):
+    """
+    A value that can go up and down, kept separately for each combination of labels.
+
+    Usage Example:
+        >>> queue_depth = Gauge('weather_admission_queue_depth', 'Requests waiting for a render slot.')
+        >>> queue_depth.set(3)
+    """
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels: object) -> None:
+        """
+        Replaces the value of the given labels.
+        """
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1, **labels: object) -> None:
+        """
+        Subtracts from the value of the given labels.
+        """
+        self.inc(-amount, **labels)
+
+
+class Histogram:
+    """
+    A distribution of observed values (latencies in seconds by default) in cumulative buckets.
+
+    Usage Example:
+        >>> render_seconds = Histogram('weather_chart_render_seconds', 'Chart render time.')
+        >>> with render_seconds.time(chart='wind_rose'):
+        ...     create_wind_rose(wind_speeds, wind_directions)
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self._series: Dict[LabelKey, List[float]] = {}  # Bucket counts, then sum, then count
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: object) -> None:
+        """
+        Records one value for the given labels.
+        """
+        key = _label_key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels: object) -> Iterator[None]:
+        """
+        Records the duration of the enclosed block in seconds, even when it raises.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: object) -> float:
+        series = self._series.get(_label_key(labels))
+        return series[-1] if series else 0
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            snapshot = [(key, list(series)) for key, series in self._series.items()]
+        lines = []
+        for key, series in sorted(snapshot):
+            cumulative = 0.0
+            for bound, bucket_count in zip(self.buckets, series):
+                cumulative += bucket_count
+                le = 'le="%g"' % bound
+                lines.append(f"{self.name}_bucket{_format_labels(key, le)} {cumulative:g}")
+            infinity = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_format_labels(key, infinity)} {series[-1]:g}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {series[-1]:g}")
+        return lines
+
+
+class Registry:
+    """
+    The set of metrics exposed on the /metrics routes.
+    """
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric_class: type, name: str, documentation: str, **options: object) -> object:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = metric_class(name, documentation, **options)
+            return metric
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        return self._register(Counter, name, documentation)  # type: ignore[return-value]
+
+    def gauge(self, name: str, documentation: str) -> Gauge:
+        return self._register(Gauge, name, documentation)  # type: ignore[return-value]
+
+    def histogram(self, name: str, documentation: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, documentation, buckets=buckets)  # type: ignore[return-value]
+
+    def render(self) -> str:
+        """
+        Renders every metric in the Prometheus text exposition format.
+
+        Returns:
+            str: The exposition text.
+        """
+        lines = []
+        for name, metric in sorted(self._metrics.items()):
+            lines.append(f"# HELP {name} {metric.documentation}")  # type: ignore[attr-defined]
+            lines.append(f"# TYPE {name} {metric.kind}")  # type: ignore[attr-defined]
+            lines.extend(metric.collect())  # type: ignore[attr-defined]
+        return "\n".join(lines) + "\n"
+
+
+# Content type of the Prometheus text exposition format
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+registry = Registry()
+
+# Metrics shared by the dashboard and the RESTful API
+stage_seconds = registry.histogram(
+    "weather_stage_seconds", "Time spent in each stage of the dashboard pipeline.")
+upstream_request_seconds = registry.histogram(
+    "weather_upstream_request_seconds", "Latency of requests to OpenWeatherMap by endpoint.")
+upstream_errors = registry.counter(
+    "weather_upstream_errors_total", "OpenWeatherMap requests that failed, by endpoint and status.")
+cache_requests = registry.counter(
+    "weather_cache_requests_total", "Cache lookups by cache and result (hit or miss).")
+chart_render_seconds = registry.histogram(
+    "weather_chart_render_seconds", "Time to render each chart, including encoding.")
+rendered_bytes = registry.counter(
+    "weather_rendered_bytes_total", "Bytes of PNG images rendered, by chart.")
+http_request_seconds = registry.histogram(
+    "weather_http_request_seconds", "Latency of HTTP requests by application, route and status.")
+
+
+class ASGIMetricsMiddleware:
+    """
+    ASGI middleware recording the latency of every HTTP request in weather_http_request_seconds.
+
+    Streaming responses (such as Server-Sent Events) are recorded when they end.
+
+    Args:
+        app: The ASGI application to wrap.
+        application (str): The value of the `app` label, for example "dashboard".
+
+    Usage Example:
+        >>> app.add_middleware(ASGIMetricsMiddleware, application='dashboard')
+    """
+
+    def __init__(self, app, application: str) -> None:
+        self.app = app
+        self.application = application
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Routes with path parameters are labelled by their template, and unknown paths share one
+            # label, so neither chart names nor scanners can grow the series without bound
+            route = getattr(scope.get("route"), "path", scope["path"]) if status != 404 else "unmatched"
+            http_request_seconds.observe(time.perf_counter() - start, app=self.application, route=route, status=status)
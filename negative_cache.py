@@ -0,0 +1,151 @@
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from config import NEGATIVE_CACHE_SIZE, NEGATIVE_CACHE_TTL
+
+
+class BloomFilter:
+    """
+    A fixed-size probabilistic set of strings.
+
+    Membership tests never give false negatives, and give false positives at
+    roughly the configured error rate once `capacity` keys have been added.
+    Keys cannot be removed; call `clear()` and re-add to rebuild the filter.
+
+    Usage Example:
+        >>> bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        >>> bloom.add('atlantis')
+        >>> 'atlantis' in bloom
+        True
+    """
+
+    def __init__(self, capacity: int = 4096, error_rate: float = 0.01) -> None:
+        self.capacity = capacity
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str) -> list:
+        # Double hashing: derive all bit positions from one 128-bit digest
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, key: str) -> None:
+        """
+        Adds a key to the filter.
+
+        Args:
+            key (str): The key to add.
+        """
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def clear(self) -> None:
+        """
+        Removes every key from the filter.
+        """
+        self.bits = bytearray(len(self.bits))
+        self.count = 0
+
+
+class NegativeCache:
+    """
+    A bounded, short-lived record of lookups that are known to fail.
+
+    A Bloom filter answers the common "never failed" case without touching the
+    entry table; only filter hits are confirmed against the table, which holds
+    the expiry time of each key and evicts the oldest entries beyond `maxsize`.
+
+    Args:
+        maxsize (int): The maximum number of remembered keys.
+        ttl (float): How many seconds a failed key is remembered.
+
+    Usage Example:
+        >>> cache = NegativeCache(maxsize=100, ttl=60)
+        >>> cache.add('Atlantis')
+        >>> 'atlantis' in cache
+        True
+    """
+
+    def __init__(self, maxsize: int = NEGATIVE_CACHE_SIZE, ttl: float = NEGATIVE_CACHE_TTL) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        self._bloom = BloomFilter(capacity=maxsize * 2)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(key: str) -> str:
+        """
+        Normalizes a location so that trivially different spellings share an entry.
+
+        Args:
+            key (str): The location as typed by the user.
+
+        Returns:
+            str: The normalized key.
+
+        Usage Example:
+            >>> NegativeCache.normalize('  New York ')
+            'new york'
+        """
+        return " ".join(key.split()).lower()
+
+    def add(self, key: str) -> None:
+        """
+        Remembers a key as failing for the next `ttl` seconds.
+
+        Args:
+            key (str): The location that failed to resolve.
+        """
+        key = self.normalize(key)
+        with self._lock:
+            self._entries[key] = time.monotonic() + self.ttl
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            if self._bloom.count >= self._bloom.capacity:
+                # The filter is saturated with keys that have since expired or been evicted
+                self._bloom.clear()
+                for live_key in self._entries:
+                    self._bloom.add(live_key)
+            else:
+                self._bloom.add(key)
+
+    def __contains__(self, key: str) -> bool:
+        key = self.normalize(key)
+        if key not in self._bloom:
+            return False
+        with self._lock:
+            expires_at = self._entries.get(key)
+            if expires_at is None:
+                return False
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return False
+            return True
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        """
+        Forgets every remembered key.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._bloom.clear()
+
+
+# Locations OpenWeatherMap recently rejected, shared by every fetch function
+unknown_locations = NegativeCache()
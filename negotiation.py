@@ -0,0 +1,204 @@
+import functools
+import gzip
+import hashlib
+from typing import Any, Callable, List, Optional, Tuple
+
+from flask import Response, current_app, request
+
+from shared_cache import ProcessCache
+from metrics import cache_requests
+from config import RESPONSE_CACHE_SIZE, RESPONSE_COMPRESSION_MIN_BYTES
+
+# Media types the API can answer with, in order of preference when the client accepts several
+JSON = "application/json"
+COLUMNAR_JSON = "application/vnd.weatherdashboard.columnar+json"
+MSGPACK = "application/msgpack"
+MSGPACK_LEGACY = "application/x-msgpack"
+
+# Seconds an encoded body is kept; the cache keys of changing resources include their version
+RESPONSE_CACHE_TTL = 3600.0
+
+# Encoded and compressed bodies of the cacheable responses, by resource, media type and encoding
+response_cache = ProcessCache(maxsize=RESPONSE_CACHE_SIZE)
+
+
+@functools.lru_cache(maxsize=None)
+def _import_msgpack():
+    try:
+        import msgpack
+    except ImportError:
+        return None
+    return msgpack
+
+
+@functools.lru_cache(maxsize=None)
+def _import_brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def to_columnar(value: Any) -> Any:
+    """
+    Converts every list of objects sharing the same keys into one object of value lists.
+
+    Args:
+        value: A JSON serializable value.
+
+    Returns:
+        The same value with its lists of records stored column by column.
+
+    Usage Example:
+        >>> to_columnar([{'title': 'Now Data', 'id': 1}, {'title': 'Today Data', 'id': 2}])
+        {'title': ['Now Data', 'Today Data'], 'id': [1, 2]}
+    """
+    if isinstance(value, dict):
+        return {key: to_columnar(item) for key, item in value.items()}
+    if isinstance(value, list):
+        items = [to_columnar(item) for item in value]
+        if items and all(isinstance(item, dict) for item in items):
+            keys = list(items[0])
+            if all(item.keys() == items[0].keys() for item in items):
+                return {key: [item[key] for item in items] for key in keys}
+        return items
+    return value
+
+
+def available_media_types() -> List[str]:
+    """
+    Returns the media types the API can produce, JSON first; MessagePack needs the msgpack package.
+    """
+    media_types = [JSON, COLUMNAR_JSON]
+    if _import_msgpack() is not None:
+        media_types += [MSGPACK, MSGPACK_LEGACY]
+    return media_types
+
+
+def available_encodings() -> List[str]:
+    """
+    Returns the content codings the API can produce, most compact first; Brotli needs the brotli package.
+    """
+    return ["br", "gzip"] if _import_brotli() is not None else ["gzip"]
+
+
+def encode_body(payload: Any, media_type: str) -> bytes:
+    """
+    Serializes a payload in one of the available media types.
+
+    Args:
+        payload: The JSON serializable response data.
+        media_type (str): One of the media types of `available_media_types`.
+
+    Returns:
+        bytes: The serialized payload.
+    """
+    if media_type in (MSGPACK, MSGPACK_LEGACY):
+        return _import_msgpack().packb(payload, use_bin_type=True, default=str)
+    if media_type == COLUMNAR_JSON:
+        payload = to_columnar(payload)
+    # Flask's own serializer with the separators of jsonify, so the default JSON is unchanged
+    return current_app.json.dumps(payload, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+def compress_body(body: bytes, encoding: Optional[str], best: bool = False) -> bytes:
+    """
+    Compresses a body with "br" or "gzip"; None leaves it unchanged.
+
+    Args:
+        body (bytes): The serialized payload.
+        encoding (str, optional): The content coding.
+        best (bool): Use the slowest, smallest setting, for bodies that are cached and sent many times.
+    """
+    if encoding == "br":
+        return _import_brotli().compress(body, quality=11 if best else 5)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=9 if best else 6, mtime=0)
+    return body
+
+
+def negotiate() -> Tuple[str, Optional[str]]:
+    """
+    Chooses the media type and the content coding of the current request from its Accept headers.
+
+    Clients that accept none of the available media types get JSON, as before negotiation existed.
+
+    Returns:
+        tuple: The media type and the content coding, or None for an uncompressed body.
+    """
+    media_type = request.accept_mimetypes.best_match(available_media_types(), default=JSON) or JSON
+    return media_type, request.accept_encodings.best_match(available_encodings())
+
+
+def _make_response(body: bytes, media_type: str, encoding: Optional[str], etag: str, status: int) -> Response:
+    response = Response(body, status=status, content_type=media_type)
+    response.vary.update(("Accept", "Accept-Encoding"))
+    if encoding is not None:
+        response.content_encoding = encoding
+    response.set_etag(etag)
+    return response
+
+
+def _build(payload: Any, best: bool) -> Tuple[bytes, str, Optional[str], str]:
+    media_type, encoding = negotiate()
+    body = encode_body(payload, media_type)
+    if len(body) < RESPONSE_COMPRESSION_MIN_BYTES:
+        encoding = None  # Compression would not pay for itself
+    body = compress_body(body, encoding, best)
+    etag = hashlib.blake2b(body, digest_size=12).hexdigest()
+    return body, media_type, encoding, etag
+
+
+def respond(payload: Any, status: int = 200) -> Response:
+    """
+    Answers with a payload in the media type and content coding the client prefers.
+
+    Replaces jsonify in the API routes: JSON stays the default, the columnar JSON layout and
+    MessagePack are chosen through the Accept header, and bodies are compressed with Brotli or
+    gzip according to Accept-Encoding.
+
+    Args:
+        payload: The JSON serializable response data.
+        status (int): The HTTP status code.
+
+    Returns:
+        Response: The encoded response, with an ETag so pollers can revalidate with If-None-Match.
+
+    Usage Example:
+        >>> return respond({'weatherdata': weatherdata}, 201)
+    """
+    body, media_type, encoding, etag = _build(payload, best=False)
+    response = _make_response(body, media_type, encoding, etag, status)
+    response.make_conditional(request)
+    return response
+
+
+def respond_cached(cache_key: str, build: Callable[[], Any]) -> Response:
+    """
+    Answers like `respond`, reusing the encoded and compressed body of earlier requests.
+
+    The body is compressed at the highest setting once per resource version, media type and
+    coding, so frequent pollers of an unchanged resource cost a cache lookup.
+
+    Args:
+        cache_key (str): Identifies the resource and its version; it must change when the payload changes.
+        build (callable): Returns the payload; only called when the body is not cached.
+
+    Returns:
+        Response: The encoded response, or 304 Not Modified when the client's ETag still matches.
+
+    Usage Example:
+        >>> return respond_cached(f'weatherdatas|{version}', lambda: {'weatherdatas': weatherdatas})
+    """
+    media_type, encoding = negotiate()
+    key = f"{cache_key}|{media_type}|{encoding}"
+    cached = response_cache.get(key)
+    cache_requests.inc(cache="response", result="hit" if cached is not None else "miss")
+    if cached is None:
+        cached = _build(build(), best=True)
+        response_cache.set(key, cached, ttl=RESPONSE_CACHE_TTL)
+    body, media_type, encoding, etag = cached
+    response = _make_response(body, media_type, encoding, etag, 200)
+    response.make_conditional(request)
+    return response
@@ -0,0 +1,374 @@
+"""
+A local stand-in for the OpenWeatherMap endpoints used by this project.
+
+It implements /data/2.5/weather, /data/2.5/forecast, /geo/1.0/reverse and
+/img/wn/{icon}.png. Responses are replayed from a recording directory when one
+matches, and otherwise synthesized (deterministically per city). Latency,
+server errors and rate limiting can be injected to load-test the application
+offline.
+
+Usage:
+    python owm_standin.py --port 8081 --latency-ms 80 --jitter-ms 40 --error-rate 0.02
+    python owm_standin.py --port 8081 --record recordings/   # Proxy to the real service and record
+    python owm_standin.py --port 8081 --replay recordings/   # Replay recorded responses
+
+Then start the application against it:
+    OWM_API_BASE_URL=http://localhost:8081 OWM_ICON_BASE_URL=http://localhost:8081 python main_app.py
+
+The fault settings can be changed while the server runs:
+    curl -X POST localhost:8081/__standin__/config -d '{"error_rate": 0.5}'
+    curl localhost:8081/__standin__/stats
+"""
+import argparse
+import base64
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+import zlib
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+ICON_CODES = ["01d", "01n", "02d", "02n", "03d", "03n", "04d", "04n", "09d", "09n",
+              "10d", "10n", "11d", "11n", "13d", "13n", "50d", "50n"]
+ICON_DESCRIPTIONS = {"01": "clear sky", "02": "few clouds", "03": "scattered clouds", "04": "overcast clouds",
+                     "09": "shower rain", "10": "light rain", "11": "thunderstorm", "13": "snow", "50": "mist"}
+REAL_BASE_URLS = {"/img/": "https://openweathermap.org", "": "https://api.openweathermap.org"}
+
+
+@dataclass
+class Faults:
+    """
+    The faults injected into every response.
+
+    Attributes:
+        latency_ms (float): Added delay of every response.
+        jitter_ms (float): Maximum random delay added on top of the latency.
+        error_rate (float): Fraction of requests answered with HTTP 500.
+        rate_limit (float): Requests per second allowed before answering HTTP 429, 0 disables the limit.
+        unknown_cities (list): City names answered with HTTP 404, like a misspelled city.
+    """
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+    rate_limit: float = 0.0
+    unknown_cities: List[str] = field(default_factory=list)
+
+
+def request_key(path: str, query: Dict[str, str]) -> str:
+    """
+    Identifies a request for recording and replay, ignoring the API key and the case of the city.
+
+    Usage Example:
+        >>> request_key('/data/2.5/weather', {'q': 'Guangzhou', 'appid': 'xxx', 'units': 'metric'})
+        '/data/2.5/weather?q=guangzhou&units=metric'
+    """
+    normalized = {name: (value.strip().lower() if name == "q" else value)
+                  for name, value in query.items() if name != "appid"}
+    return f"{path}?{urlencode(sorted(normalized.items()))}"
+
+
+def png_icon(icon_code: str, size: int = 50) -> bytes:
+    """
+    Draws a plain weather icon: a colored disc whose hue depends on the icon code.
+
+    Args:
+        icon_code (str): The OpenWeatherMap icon code.
+        size (int): The width and height in pixels.
+
+    Returns:
+        bytes: The PNG encoded image.
+    """
+    hue = int(hashlib.md5(icon_code.encode()).hexdigest()[:2], 16)
+    color = bytes([hue, 160, 255 - hue, 255])
+    center, radius = (size - 1) / 2, size * 0.4
+    rows = b"".join(
+        b"\x00" + b"".join(color if math.hypot(x - center, y - center) <= radius else b"\x00\x00\x00\x00"
+                           for x in range(size))
+        for y in range(size)
+    )
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return len(data).to_bytes(4, "big") + kind + data + zlib.crc32(kind + data).to_bytes(4, "big")
+
+    header = size.to_bytes(4, "big") * 2 + bytes([8, 6, 0, 0, 0])  # 8-bit RGBA
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(rows)) + chunk(b"IEND", b"")
+
+
+class WeatherSynthesizer:
+    """
+    Generates plausible OpenWeatherMap payloads for any city name.
+
+    Every city gets its own seeded climate, so repeated requests for the same city
+    and time slot return the same values.
+    """
+
+    def _random(self, *parts: object) -> random.Random:
+        return random.Random(hashlib.sha1("|".join(map(str, parts)).encode()).hexdigest())
+
+    def _city_id(self, city: str) -> int:
+        return int(hashlib.sha1(city.lower().encode()).hexdigest()[:6], 16)
+
+    def _conditions(self, city: str, timestamp: int) -> Dict:
+        climate = self._random(city.lower())
+        base_temperature = climate.uniform(-5, 30)
+        slot = self._random(city.lower(), timestamp // 10800)
+        hour = datetime.fromtimestamp(timestamp, tz=timezone.utc).hour
+        temperature = round(base_temperature + 5 * math.sin((hour - 9) / 24 * 2 * math.pi) + slot.uniform(-1.5, 1.5), 2)
+        icon = slot.choice(ICON_CODES[::2])[:2] + ("d" if 6 <= hour < 18 else "n")
+        return {
+            "main": {"temp": temperature, "feels_like": round(temperature - slot.uniform(0, 2), 2),
+                     "temp_min": round(temperature - slot.uniform(0, 1), 2),
+                     "temp_max": round(temperature + slot.uniform(0, 1), 2),
+                     "pressure": slot.randint(995, 1030), "humidity": slot.randint(20, 100),
+                     "sea_level": 1013, "grnd_level": 1010},
+            "weather": [{"id": 800, "main": ICON_DESCRIPTIONS[icon[:2]].title(),
+                         "description": ICON_DESCRIPTIONS[icon[:2]], "icon": icon}],
+            "clouds": {"all": slot.randint(0, 100)},
+            "wind": {"speed": round(slot.uniform(0, 12), 2), "deg": slot.randint(0, 359),
+                     "gust": round(slot.uniform(0, 15), 2)},
+            "visibility": 10000,
+        }
+
+    def current(self, city: str) -> Dict:
+        now = int(time.time())
+        climate = self._random(city.lower())
+        return dict(self._conditions(city, now), coord={"lon": round(climate.uniform(-180, 180), 4),
+                                                        "lat": round(climate.uniform(-60, 70), 4)},
+                    base="stations", dt=now, sys={"country": "XX", "sunrise": now - 21600, "sunset": now + 21600},
+                    timezone=0, id=self._city_id(city), name=city.strip().title(), cod=200)
+
+    def forecast(self, city: str, count: int) -> Dict:
+        first_slot = (int(time.time()) // 10800 + 1) * 10800
+        slots = []
+        for index in range(count):
+            timestamp = first_slot + index * 10800
+            conditions = self._conditions(city, timestamp)
+            slot = self._random(city.lower(), timestamp // 10800, "pop")
+            slots.append(dict(conditions, dt=timestamp, pop=round(slot.choice([0, 0, 0, 0.1, 0.3, 0.6, 0.9]), 2),
+                              sys={"pod": conditions["weather"][0]["icon"][-1]},
+                              dt_txt=datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S")))
+        return {"cod": "200", "message": 0, "cnt": count, "list": slots,
+                "city": {"id": self._city_id(city), "name": city.strip().title(), "country": "XX"}}
+
+    def reverse(self, lat: float, lon: float) -> List[Dict]:
+        return [{"name": f"Standin City {lat:.1f} {lon:.1f}", "lat": lat, "lon": lon, "country": "XX"}]
+
+
+class StandinState:
+    """
+    Shared state of the stand-in server: faults, recordings, rate limiter and counters.
+    """
+
+    def __init__(self, faults: Faults, replay_dir: Optional[str] = None, record_dir: Optional[str] = None) -> None:
+        self.faults = faults
+        self.replay_dir = replay_dir
+        self.record_dir = record_dir
+        self.synthesizer = WeatherSynthesizer()
+        self.lock = threading.Lock()
+        self.stats: Dict[str, int] = {"requests": 0, "replayed": 0, "recorded": 0, "synthesized": 0,
+                                      "errors_injected": 0, "rate_limited": 0, "not_found": 0}
+        self._window_start = time.monotonic()
+        self._window_count = 0
+
+    def count(self, name: str) -> None:
+        with self.lock:
+            self.stats[name] += 1
+
+    def rate_limited(self) -> bool:
+        if self.faults.rate_limit <= 0:
+            return False
+        with self.lock:
+            now = time.monotonic()
+            if now - self._window_start >= 1.0:
+                self._window_start, self._window_count = now, 0
+            self._window_count += 1
+            return self._window_count > self.faults.rate_limit
+
+    def _recording_path(self, directory: str, key: str) -> str:
+        return os.path.join(directory, hashlib.sha1(key.encode()).hexdigest() + ".json")
+
+    def replay(self, key: str) -> Optional[Tuple[int, str, bytes]]:
+        directory = self.replay_dir or self.record_dir  # While recording, requests seen before are replayed
+        if not directory:
+            return None
+        try:
+            with open(self._recording_path(directory, key), encoding="utf-8") as file:
+                recording = json.load(file)
+        except FileNotFoundError:
+            return None
+        return recording["status"], recording["content_type"], base64.b64decode(recording["body"])
+
+    def record(self, key: str, path: str, query: Dict[str, str]) -> Tuple[int, str, bytes]:
+        assert self.record_dir is not None
+        base_url = REAL_BASE_URLS["/img/"] if path.startswith("/img/") else REAL_BASE_URLS[""]
+        try:
+            with urlopen(f"{base_url}{path}?{urlencode(query)}", timeout=30) as response:
+                status, content_type, body = response.status, response.headers.get("Content-Type", ""), response.read()
+        except HTTPError as error:  # Error responses are recorded and replayed like any other
+            status, content_type, body = error.code, error.headers.get("Content-Type", ""), error.read()
+        os.makedirs(self.record_dir, exist_ok=True)
+        with open(self._recording_path(self.record_dir, key), "w", encoding="utf-8") as file:
+            json.dump({"key": key, "status": status, "content_type": content_type,
+                       "body": base64.b64encode(body).decode()}, file)
+        return status, content_type, body
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    """
+    Answers the OpenWeatherMap endpoints and the /__standin__ control endpoints.
+    """
+
+    state: StandinState  # Set on the subclass created by make_server
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass  # Keep load tests quiet
+
+    def _send(self, status: int, content_type: str, body: bytes, headers: Optional[Dict[str, str]] = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, payload: object, headers: Optional[Dict[str, str]] = None) -> None:
+        self._send(status, "application/json; charset=utf-8", json.dumps(payload).encode(), headers)
+
+    def do_POST(self) -> None:
+        if urlsplit(self.path).path != "/__standin__/config":
+            self._send_json(404, {"cod": "404", "message": "Internal error"})
+            return
+        update = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        with self.state.lock:
+            for name, value in update.items():
+                if hasattr(self.state.faults, name):
+                    setattr(self.state.faults, name, value)
+        self._send_json(200, asdict(self.state.faults))
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        query = dict(parse_qsl(url.query))
+        if url.path == "/__standin__/config":
+            self._send_json(200, asdict(self.state.faults))
+            return
+        if url.path == "/__standin__/stats":
+            self._send_json(200, self.state.stats)
+            return
+
+        state, faults = self.state, self.state.faults
+        state.count("requests")
+        time.sleep((faults.latency_ms + random.uniform(0, faults.jitter_ms)) / 1000)
+        if state.rate_limited():
+            state.count("rate_limited")
+            self._send_json(429, {"cod": 429, "message": "Your account is temporary blocked due to exceeding of requests limitation"},
+                            {"Retry-After": "1"})
+            return
+        if random.random() < faults.error_rate:
+            state.count("errors_injected")
+            self._send_json(500, {"cod": 500, "message": "Internal error"})
+            return
+
+        key = request_key(url.path, query)
+        replayed = state.replay(key)
+        if replayed is not None:
+            state.count("replayed")
+            self._send(*replayed)
+            return
+        if state.record_dir:
+            state.count("recorded")
+            self._send(*state.record(key, url.path, query))
+            return
+        self._synthesize(url.path, query)
+
+    def _synthesize(self, path: str, query: Dict[str, str]) -> None:
+        state, synthesizer = self.state, self.state.synthesizer
+        if path.startswith("/img/wn/") and path.endswith(".png"):
+            state.count("synthesized")
+            self._send(200, "image/png", png_icon(path.rsplit("/", 1)[-1].split("@")[0].split(".")[0]))
+            return
+        if path == "/geo/1.0/reverse":
+            state.count("synthesized")
+            self._send_json(200, synthesizer.reverse(float(query.get("lat", 0)), float(query.get("lon", 0))))
+            return
+        if path in ("/data/2.5/weather", "/data/2.5/forecast"):
+            city = query.get("q", "").strip()
+            if not city:
+                self._send_json(400, {"cod": "400", "message": "Nothing to geocode"})
+                return
+            if city.lower() in (name.lower() for name in state.faults.unknown_cities):
+                state.count("not_found")
+                self._send_json(404, {"cod": "404", "message": "city not found"})
+                return
+            state.count("synthesized")
+            if path == "/data/2.5/weather":
+                self._send_json(200, synthesizer.current(city))
+            else:
+                self._send_json(200, synthesizer.forecast(city, int(query.get("cnt", 40))))
+            return
+        self._send_json(404, {"cod": "404", "message": "Internal error"})
+
+
+def make_server(host: str = "127.0.0.1", port: int = 8081, faults: Optional[Faults] = None,
+                replay_dir: Optional[str] = None, record_dir: Optional[str] = None) -> ThreadingHTTPServer:
+    """
+    Creates a stand-in server; call serve_forever() on it, for example in a background thread.
+
+    Args:
+        host (str): The bind address.
+        port (int): The port, 0 picks a free one (see server.server_address).
+        faults (Faults, optional): The faults to inject.
+        replay_dir (str, optional): Directory of recorded responses to replay.
+        record_dir (str, optional): Directory to record real OpenWeatherMap responses into.
+
+    Returns:
+        ThreadingHTTPServer: The server, not yet serving.
+
+    Usage Example:
+        >>> server = make_server(port=0, faults=Faults(latency_ms=50))
+        >>> threading.Thread(target=server.serve_forever, daemon=True).start()
+        >>> base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    """
+    state = StandinState(faults or Faults(), replay_dir, record_dir)
+    handler = type("BoundStandinHandler", (StandinHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with HTTP 500")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="requests per second before HTTP 429, 0 disables")
+    parser.add_argument("--unknown-city", action="append", default=[], help="city answered with HTTP 404 (repeatable)")
+    recording = parser.add_mutually_exclusive_group()
+    recording.add_argument("--replay", metavar="DIR", help="replay recorded responses, synthesizing the rest")
+    recording.add_argument("--record", metavar="DIR", help="proxy to OpenWeatherMap and record the responses")
+    args = parser.parse_args()
+
+    faults = Faults(args.latency_ms, args.jitter_ms, args.error_rate, args.rate_limit, args.unknown_city)
+    server = make_server(args.host, args.port, faults, args.replay, args.record)
+    print(f"OpenWeatherMap stand-in listening on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+import copy
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Optional, Tuple
+
+from cache_policy import make_store
+from config import WEATHER_CACHE_DB, WEATHER_CACHE_MEMORY_SIZE, WEATHER_CACHE_REVALIDATE
+
+
+class PersistentCache:
+    """
+    A key-value store of JSON snapshots and their fetch timestamps that survives restarts.
+
+    The most used snapshots (see CACHE_EVICTION_POLICY) are kept in an in-process dictionary backed by a SQLite database in
+    WAL mode, so the dashboard and the RESTful API processes on the same host read
+    each other's snapshots, and readers never block the writer. Nothing is loaded
+    at startup: the database is opened on first use, and each snapshot is read from
+    disk the first time it is requested. A snapshot in memory is served without a query
+    for `revalidate_after` seconds after it was last read from or checked against the
+    database; after that, or when it is too old for the caller, `get` looks for a newer
+    one stored by another process.
+
+    Args:
+        path (str): The SQLite database path. An empty string keeps snapshots in memory only.
+        maxsize (int): The number of snapshots kept in memory; older ones are read from disk again.
+        revalidate_after (float): Seconds a snapshot in memory is served without checking the database.
+
+    Usage Example:
+        >>> cache = PersistentCache('weather_cache.sqlite3')
+        >>> cache.set('weather|guangzhou', {'name': 'Guangzhou'})
+        >>> cache.get('weather|guangzhou', max_age=600)
+        (1739843673.0, {'name': 'Guangzhou'})
+    """
+
+    def __init__(self, path: str = WEATHER_CACHE_DB, maxsize: int = WEATHER_CACHE_MEMORY_SIZE,
+                 revalidate_after: float = WEATHER_CACHE_REVALIDATE) -> None:
+        self.path = path
+        self.maxsize = maxsize
+        self.revalidate_after = revalidate_after
+        self._memory = make_store(maxsize)  # Key -> (fetched_at, value, monotonic time of the last database check)
+        self._memory_lock = threading.Lock()
+        self._update_lock = threading.Lock()
+        self._local = threading.local()
+
+    def _remember(self, key: str, fetched_at: float, value: Any) -> None:
+        with self._memory_lock:
+            self._memory.put(key, (fetched_at, value, time.monotonic()))
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        # SQLite connections must not be shared between threads, so open one per thread
+        if not self.path:
+            return None
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS snapshots ("
+                "key TEXT PRIMARY KEY, fetched_at REAL NOT NULL, payload TEXT NOT NULL)"
+            )
+            self._local.connection = connection
+        return connection
+
+    def get(self, key: str, max_age: Optional[float] = None, revalidate: bool = False) -> Optional[Tuple[float, Any]]:
+        """
+        Looks up a snapshot.
+
+        Args:
+            key (str): The snapshot key.
+            max_age (float, optional): Ignore snapshots fetched more than this many seconds ago.
+            revalidate (bool): Check the database for a newer snapshot even when the one in memory
+                was checked within `revalidate_after` seconds, for values other processes change.
+
+        Returns:
+            tuple or None: The fetch timestamp and the snapshot, or None if there is no usable snapshot.
+        """
+        with self._memory_lock:
+            entry = self._memory.get(key)
+        connection = self._connection()
+        if connection is not None and (
+                revalidate or entry is None or time.monotonic() - entry[2] > self.revalidate_after
+                or (max_age is not None and time.time() - entry[0] > max_age)):
+            # Another process may have stored a newer snapshot since this one was read
+            row = connection.execute(
+                "SELECT fetched_at, payload FROM snapshots WHERE key = ? AND fetched_at > ?",
+                (key, entry[0] if entry else float("-inf")),
+            ).fetchone()
+            if row is not None:
+                entry = (row[0], json.loads(row[1]))
+            if entry is not None:
+                self._remember(key, entry[0], entry[1])
+        if entry is None:
+            return None
+        if max_age is not None and time.time() - entry[0] > max_age:
+            return None
+        return entry[0], entry[1]
+
+    def set(self, key: str, value: Any, fetched_at: Optional[float] = None) -> None:
+        """
+        Stores a snapshot.
+
+        Args:
+            key (str): The snapshot key.
+            value: Any JSON serializable value.
+            fetched_at (float, optional): The fetch timestamp, defaulting to now.
+        """
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        self._remember(key, fetched_at, value)
+        connection = self._connection()
+        if connection is not None:
+            connection.execute(
+                "INSERT OR REPLACE INTO snapshots (key, fetched_at, payload) VALUES (?, ?, ?)",
+                (key, fetched_at, json.dumps(value, separators=(",", ":"))),
+            )
+
+    def update(self, key: str, change: Callable[[Optional[Any]], Any]) -> Tuple[float, Any]:
+        """
+        Replaces a value with `change(current value)` as one atomic read-modify-write.
+
+        The current value is re-read inside an immediate SQLite transaction, which holds the
+        database's write lock until the new value is stored, so the updates of every thread and
+        worker process sharing the database apply one after the other and none is lost. `change`
+        gets a private copy of the value, or None when the key is missing; when it raises, nothing
+        is stored and the exception propagates.
+
+        Args:
+            key (str): The snapshot key.
+            change (callable): Returns the new JSON serializable value from the current one.
+
+        Returns:
+            tuple: The timestamp and the stored value, a copy the caller may keep.
+
+        Usage Example:
+            >>> cache.update('counter', lambda value: (value or 0) + 1)
+            (1739843673.0, 1)
+        """
+        with self._update_lock:
+            connection = self._connection()
+            if connection is None:
+                with self._memory_lock:
+                    entry = self._memory.get(key)
+                value = change(copy.deepcopy(entry[1]) if entry is not None else None)
+                fetched_at = time.time()
+            else:
+                connection.execute("BEGIN IMMEDIATE")
+                try:
+                    row = connection.execute("SELECT payload FROM snapshots WHERE key = ?", (key,)).fetchone()
+                    value = change(json.loads(row[0]) if row is not None else None)
+                    fetched_at = time.time()
+                    connection.execute(
+                        "INSERT OR REPLACE INTO snapshots (key, fetched_at, payload) VALUES (?, ?, ?)",
+                        (key, fetched_at, json.dumps(value, separators=(",", ":"))),
+                    )
+                except BaseException:
+                    connection.execute("ROLLBACK")
+                    raise
+                connection.execute("COMMIT")
+            self._remember(key, fetched_at, copy.deepcopy(value))
+        return fetched_at, value
+
+    def delete(self, key: str) -> None:
+        """
+        Removes a snapshot.
+
+        Args:
+            key (str): The snapshot key.
+        """
+        with self._memory_lock:
+            self._memory.pop(key)
+        connection = self._connection()
+        if connection is not None:
+            connection.execute("DELETE FROM snapshots WHERE key = ?", (key,))
+
+    def close(self) -> None:
+        """
+        Closes the database connection of the calling thread.
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+
+# Snapshot store shared by the fetch functions and the RESTful API
+weather_cache = PersistentCache()
@@ -0,0 +1,319 @@
+"""
+Offline prerendering of the dashboards of the busiest cities.
+
+Renders the full /weather pipeline for a list of cities across a pool of worker
+processes and writes the pages, with their charts as separate PNG files, to
+PRERENDER_DIR. While a prerendered page is younger than PRERENDER_MAX_AGE seconds,
+/weather serves it without fetching or rendering anything.
+
+Usage:
+    python prerender.py                                  # The cities of PRERENDER_CITIES
+    python prerender.py Guangzhou London "New York" --units metric imperial --workers 4
+    python prerender.py --every 600                      # Run again every 10 minutes
+
+Run it from cron or another scheduler, with --every, or inside the dashboard by setting
+PRERENDER_INTERVAL (see `schedule`: one worker process of the dashboard runs the job).
+"""
+import argparse
+import base64
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import IO, Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import quote
+
+from config import (DEFAULT_UNITS, PRERENDER_CITIES, PRERENDER_DIR, PRERENDER_MAX_AGE, PRERENDER_WORKERS)
+from metrics import cache_requests
+from negative_cache import NegativeCache
+
+try:
+    import fcntl
+except ImportError:  # Windows: the scheduler lock is not taken
+    fcntl = None  # type: ignore[assignment]
+
+logger = logging.getLogger(__name__)
+
+# Charts inlined in a rendered page, moved to files by PrerenderStore.save
+_INLINE_CHART = re.compile(r"data:image/png;base64,([A-Za-z0-9+/]+={0,2})")
+CHART_NAME = re.compile(r"[0-9a-f]{32}")
+
+# URL prefix of the chart files of prerendered pages (see the /prerendered route of main_app.py); the
+# URLs have no .png extension, which FastHTML would route to its static file handler
+CHART_URL_PREFIX = "/prerendered/"
+
+
+class PrerenderStore:
+    """
+    The directory of prerendered pages and their chart files.
+
+    Pages are stored as pages/<city>.<units>.html and charts as charts/<digest>.png. A chart
+    file is named after its content, so it never changes once written, and every file is
+    written to a temporary name and then renamed: a reader sees either the previous page
+    and its charts or the new ones, never a partial write.
+
+    Args:
+        directory (str): The directory; an empty string disables prerendered pages.
+        max_age (float): Seconds a prerendered page is served after it was written.
+
+    Usage Example:
+        >>> store = PrerenderStore('prerendered', max_age=900)
+        >>> store.save('Guangzhou', 'metric', html)
+        >>> store.load('guangzhou', 'metric')
+        b'<!doctype html>...'
+    """
+
+    def __init__(self, directory: str = PRERENDER_DIR, max_age: float = PRERENDER_MAX_AGE) -> None:
+        self.directory = directory
+        self.max_age = max_age
+        self.enabled = bool(directory)
+
+    def page_path(self, city_name: str, units: str) -> str:
+        return os.path.join(self.directory, "pages", f"{quote(NegativeCache.normalize(city_name), safe='')}.{units}.html")
+
+    def chart_path(self, name: str) -> str:
+        return os.path.join(self.directory, "charts", f"{name}.png")
+
+    def load(self, city_name: str, units: str) -> Optional[bytes]:
+        """
+        Returns the prerendered page of a city, or None when there is none younger than `max_age`.
+        """
+        if not self.enabled:
+            return None
+        path = self.page_path(city_name, units)
+        try:
+            if time.time() - os.stat(path).st_mtime > self.max_age:
+                cache_requests.inc(cache="prerender", result="expired")
+                return None
+            with open(path, "rb") as page:
+                html = page.read()
+        except OSError:
+            cache_requests.inc(cache="prerender", result="miss")
+            return None
+        cache_requests.inc(cache="prerender", result="hit")
+        return html
+
+    def _write(self, path: str, data: bytes) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(descriptor, "wb") as output:
+                output.write(data)
+            os.replace(temporary, path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+    def save(self, city_name: str, units: str, html: str) -> int:
+        """
+        Stores a rendered page, moving its inline charts to chart files.
+
+        Args:
+            city_name (str): The city of the page.
+            units (str): The unit system of the page.
+            html (str): The complete page served by /weather.
+
+        Returns:
+            int: The size of the stored page in bytes.
+        """
+        def move_chart(match: re.Match) -> str:
+            png = base64.b64decode(match.group(1))
+            name = hashlib.blake2b(png, digest_size=16).hexdigest()
+            path = self.chart_path(name)
+            if os.path.exists(path):
+                os.utime(path)  # Still in use; see collect_garbage
+            else:
+                self._write(path, png)
+            return f"{CHART_URL_PREFIX}{name}"
+
+        page = _INLINE_CHART.sub(move_chart, html).encode("utf-8")
+        self._write(self.page_path(city_name, units), page)
+        return len(page)
+
+    def collect_garbage(self, grace: Optional[float] = None) -> int:
+        """
+        Deletes the pages and charts that have not been written for `grace` seconds (twice `max_age` by default).
+
+        A chart is rewritten, or touched, whenever a page using it is saved, so the charts of
+        the pages being served are kept while those of replaced pages go after the grace time.
+
+        Returns:
+            int: The number of deleted files.
+        """
+        grace = 2 * self.max_age if grace is None else grace
+        deleted = 0
+        for folder in ("pages", "charts"):
+            path = os.path.join(self.directory, folder)
+            if not os.path.isdir(path):
+                continue
+            for entry in os.scandir(path):
+                if time.time() - entry.stat().st_mtime > grace:
+                    try:
+                        os.unlink(entry.path)
+                        deleted += 1
+                    except OSError:
+                        pass
+        return deleted
+
+
+# Prerendered pages served by /weather
+prerender_store = PrerenderStore()
+
+_app: Any = None  # The dashboard app of a worker process, set by _start_worker
+
+
+def _start_worker() -> None:
+    # Workers build the pages of /weather with the dashboard's own page builder and app headers
+    global _app
+    from main_app import create_app
+
+    _app = create_app()
+
+
+def _render(city_name: str, units: str, directory: str) -> Tuple[str, str, float, Optional[str]]:
+    """
+    Renders and stores one dashboard in a worker; returns the city, units, seconds and an error or None.
+    """
+    from main_app import weather_document
+
+    started = time.perf_counter()
+    try:
+        PrerenderStore(directory).save(city_name, units, weather_document(_app, city_name, units))
+    except Exception as error:
+        return city_name, units, time.perf_counter() - started, f"{type(error).__name__}: {error}"
+    return city_name, units, time.perf_counter() - started, None
+
+
+def run(cities: Sequence[str], units: Sequence[str] = (DEFAULT_UNITS,), workers: int = PRERENDER_WORKERS,
+        directory: str = PRERENDER_DIR) -> Dict[str, float]:
+    """
+    Prerenders the dashboards of cities across a pool of worker processes.
+
+    Args:
+        cities (sequence): The city names.
+        units (sequence): The unit systems to render each city in.
+        workers (int): The worker processes.
+        directory (str): The directory of the prerendered pages.
+
+    Returns:
+        dict: The dashboards rendered and failed, the workers, the elapsed seconds (worker
+            startup included), and the throughput in dashboards per second and in dashboards
+            per second per core used (the workers, up to the number of cores).
+
+    Usage Example:
+        >>> run(['Guangzhou', 'London'], workers=2)
+        {'rendered': 2, 'failed': 0, 'workers': 2, 'seconds': 3.1, 'per_second': 0.65, 'per_second_per_core': 0.32}
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    if not directory:
+        raise ValueError("PRERENDER_DIR is empty; set it to the directory of the prerendered pages")
+    jobs = [(city_name, unit_system) for city_name in cities for unit_system in units]
+    workers = max(1, min(workers, len(jobs) or 1))
+    rendered = failed = 0
+    started = time.perf_counter()
+    # Spawned rather than forked workers: the dashboard process that schedules a run has threads
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_start_worker) as pool:
+        futures = [pool.submit(_render, city_name, unit_system, directory) for city_name, unit_system in jobs]
+        for future in futures:
+            city_name, unit_system, seconds, error = future.result()
+            if error is None:
+                rendered += 1
+                logger.info("Prerendered %s (%s) in %.2f s", city_name, unit_system, seconds)
+            else:
+                failed += 1
+                logger.warning("Prerendering %s (%s) failed: %s", city_name, unit_system, error)
+        elapsed = time.perf_counter() - started
+    PrerenderStore(directory).collect_garbage()
+    per_second = rendered / elapsed if elapsed > 0 else 0.0
+    cores = min(workers, os.cpu_count() or 1)
+    return {"rendered": rendered, "failed": failed, "workers": workers, "seconds": round(elapsed, 3),
+            "per_second": round(per_second, 3), "per_second_per_core": round(per_second / cores, 3)}
+
+
+def _leader_lock(directory: str) -> Optional[IO]:
+    """
+    Takes the scheduler lock of a prerender directory without waiting.
+
+    Returns:
+        file: The open lock file, which holds the lock until it is closed or the process exits,
+            or None when another process holds the lock.
+    """
+    os.makedirs(directory, exist_ok=True)
+    lock_file = open(os.path.join(directory, "schedule.lock"), "a")
+    if fcntl is None:
+        return lock_file  # Windows: every process schedules runs
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+def schedule(interval: float, cities: Sequence[str], units: Sequence[str] = (DEFAULT_UNITS,),
+             workers: int = PRERENDER_WORKERS, directory: str = PRERENDER_DIR) -> threading.Thread:
+    """
+    Runs `run` every `interval` seconds in a daemon thread, for example from the dashboard's startup.
+
+    Every worker process of the dashboard calls this at startup, but only the one holding the
+    scheduler lock of `directory` runs the job; the others keep trying every `interval` seconds
+    and take over when the leader exits.
+
+    Returns:
+        threading.Thread: The started thread.
+    """
+    def loop() -> None:
+        lock_file = None
+        while True:
+            try:
+                if lock_file is None:
+                    lock_file = _leader_lock(directory)
+                if lock_file is not None:
+                    logger.info("Prerender run: %s", run(cities, units, workers, directory))
+            except Exception:
+                logger.exception("Prerender run failed")
+            time.sleep(interval)
+
+    thread = threading.Thread(target=loop, name="prerender", daemon=True)
+    thread.start()
+    return thread
+
+
+def configured_cities() -> List[str]:
+    """
+    Returns the city names of the comma separated PRERENDER_CITIES setting.
+    """
+    return [city_name.strip() for city_name in PRERENDER_CITIES.split(",") if city_name.strip()]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("cities", nargs="*", help="City names; PRERENDER_CITIES when omitted")
+    parser.add_argument("--units", nargs="+", default=[DEFAULT_UNITS], help="Unit systems to render")
+    parser.add_argument("--workers", type=int, default=PRERENDER_WORKERS, help="Worker processes")
+    parser.add_argument("--directory", default=PRERENDER_DIR, help="Directory of the prerendered pages")
+    parser.add_argument("--every", type=float, default=0, help="Run again every this many seconds")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    cities = args.cities or configured_cities()
+    if not cities:
+        parser.error("no cities given and PRERENDER_CITIES is empty")
+    while True:
+        report = run(cities, args.units, args.workers, args.directory)
+        print(f"{report['rendered']} dashboards ({report['failed']} failed) in {report['seconds']:.2f} s with "
+              f"{report['workers']} workers: {report['per_second']:.2f} dashboards/s, "
+              f"{report['per_second_per_core']:.2f} dashboards/s per core")
+        if not args.every:
+            break
+        time.sleep(args.every)
+
+
+if __name__ == "__main__":
+    main()
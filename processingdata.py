@@ -1,4 +1,20 @@
-from datetime import datetime, timedelta
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple
+
+from config import INCREMENTAL_FORECAST_CITIES, OWM_ICON_BASE_URL
+from metrics import cache_requests
+
+def weather_icon_url(icon_code: str) -> str:
+    """
+    Returns the URL of the large (100x100) OpenWeatherMap icon of an icon code, which browsers load and cache themselves.
+
+    Usage Example:
+        >>> weather_icon_url('04d')
+        'https://openweathermap.org/img/wn/04d@2x.png'
+    """
+    return f"{OWM_ICON_BASE_URL}/img/wn/{icon_code}@2x.png"
 
 def processing_data_now(data_now: dict) -> tuple:
     """
@@ -16,7 +32,7 @@ def processing_data_now(data_now: dict) -> tuple:
             - icon_code (str): The OpenWeatherMap icon code representing the current weather.
             - icon_url (str): The URL of the weather icon image.
               Example response:
-              (17.64, 64, 'overcast clouds', 'Guangzhou', '04d', 'http://openweathermap.org/img/wn/04d@2x.png')
+              (17.64, 64, 'overcast clouds', 'Guangzhou', '04d', 'https://openweathermap.org/img/wn/04d@2x.png')
                   
     Usage Example:
         >>> processing_data_now({'coord': {'lon': 113.25, 'lat': 23.1167}, 
@@ -31,7 +47,7 @@ def processing_data_now(data_now: dict) -> tuple:
                                  'id': 1809858, 
                                  'name': 'Guangzhou',
                                  'cod': 200})
-        (17.64, 64, 'overcast clouds', 'Guangzhou', '04d', 'http://openweathermap.org/img/wn/04d@2x.png')
+        (17.64, 64, 'overcast clouds', 'Guangzhou', '04d', 'https://openweathermap.org/img/wn/04d@2x.png')
     """
 
     # Extract the required information from the raw data
@@ -40,7 +56,7 @@ def processing_data_now(data_now: dict) -> tuple:
     description = data_now['weather'][0]['description']
     city = data_now['name']
     icon_code = data_now['weather'][0]['icon']
-    icon_url = f"http://openweathermap.org/img/wn/{icon_code}@2x.png"
+    icon_url = weather_icon_url(icon_code)
 
     return temp, humidity, description, city, icon_code, icon_url
 
@@ -85,6 +101,46 @@ def processing_data_today(data_today: dict) -> tuple:
     return wind_speeds, wind_directions
 
 
+def _aggregate_day(day_slots: list) -> tuple:
+    """
+    Aggregates the 3-hour slots of one day into its high, low, average, icon, condition and precipitation chance.
+    """
+    daily_temps = [entry['main']['temp'] for entry in day_slots]
+    daily_temps_max = [entry['main']['temp_max'] for entry in day_slots]
+    daily_temps_min = [entry['main']['temp_min'] for entry in day_slots]
+
+    # Obtain weather icons, conditions, and precipitation chances
+    icon = day_slots[0]['weather'][0]['icon']
+    condition = day_slots[0]['weather'][0]['description']
+    daily_precipitation = [entry['pop'] for entry in day_slots]  # Average precipitation chance for each day
+
+    return (max(daily_temps_max), min(daily_temps_min), sum(daily_temps) / len(daily_temps),
+            icon, condition, max(daily_precipitation) * 100)  # Convert to percentage
+
+
+def forecast_days(data_five_days: dict, days: int = 5) -> List[Tuple[str, list]]:
+    """
+    Groups the 3-hour forecast slots by the calendar day of their `dt`, in the city's local time.
+
+    Args:
+        data_five_days (dict): The raw five-day forecast; its `city.timezone` is the UTC offset in seconds.
+        days (int): The number of days returned, from the first day with a slot.
+
+    Returns:
+        List[Tuple[str, list]]: The 'YYYY-MM-DD' date and the slots of each day, in order.
+
+    Usage Example:
+        >>> [date for date, slots in forecast_days(get_weather_five_days('Guangzhou'))]
+        ['2025-02-18', '2025-02-19', '2025-02-20', '2025-02-21', '2025-02-22']
+    """
+    offset = data_five_days.get('city', {}).get('timezone', 0)
+    grouped: Dict[int, list] = {}
+    for entry in data_five_days['list']:
+        grouped.setdefault((entry['dt'] + offset) // 86400, []).append(entry)
+    return [(datetime.fromtimestamp(day * 86400, tz=timezone.utc).strftime('%Y-%m-%d'), slots)
+            for day, slots in list(grouped.items())[:days]]
+
+
 def processing_data_five_days(data_five_days: dict) -> tuple:
     
     """
@@ -92,7 +148,8 @@ def processing_data_five_days(data_five_days: dict) -> tuple:
     dates, weather icons, weather conditions, and precipitation chances.
     
     This function processes the forecast data fetched from the OpenWeatherMap API, which includes weather data for
-    every three hours over a five-day period. It calculates the daily high, low, and average temperatures, as well as
+    every three hours over a five-day period, grouped by the calendar day of each slot (see forecast_days), so the
+    first day holds only the hours still ahead. It calculates the daily high, low, and average temperatures, as well as
     the maximum precipitation chance for each day. It also extracts the weather condition descriptions and corresponding
     icons for each day.
     
@@ -104,7 +161,7 @@ def processing_data_five_days(data_five_days: dict) -> tuple:
         - daily_highs (List[float]): List of daily high temperatures.
         - daily_lows (List[float]): List of daily low temperatures.
         - daily_averages (List[float]): List of daily average temperatures.
-        - dates (List[str]): List of dates for the next five days in 'YYYY-MM-DD' format.
+        - dates (List[str]): List of the dates of the five days in 'YYYY-MM-DD' format, in the city's local time.
         - weather_icons (List[str]): List of weather icons corresponding to each day.
         - weather_conditions (List[str]): List of weather condition descriptions for each day.
         - precipitation_chances (List[float]): List of maximum precipitation chances for each day as a percentage.
@@ -129,25 +186,93 @@ def processing_data_five_days(data_five_days: dict) -> tuple:
     weather_conditions = []
     precipitation_chances = []
 
-    # Obtain the current date and calculate the dates for the next 5 days
-    current_date = datetime.now()
-    dates = [(current_date + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(5)]
-
-    # Divide the data into daily sub-lists
-    for i in range(0, len(data_five_days['list']), 8):  # Every 8 data points represent a day
-        daily_temps = [entry['main']['temp'] for entry in data_five_days['list'][i:i+8]]
-        daily_temps_max = [entry['main']['temp_max'] for entry in data_five_days['list'][i:i+8]]
-        daily_temps_min = [entry['main']['temp_min'] for entry in data_five_days['list'][i:i+8]]
-        daily_highs.append(max(daily_temps_max))
-        daily_lows.append(min(daily_temps_min))
-        daily_averages.append(sum(daily_temps) / len(daily_temps))
-
-        # Obtain weather icons, conditions, and precipitation chances
-        weather_icons.append(data_five_days['list'][i]['weather'][0]['icon'])
-        weather_conditions.append(data_five_days['list'][i]['weather'][0]['description'])
-        
-        daily_precipitation = [entry['pop'] for entry in data_five_days['list'][i:i+8]]  # Average precipitation chance for each day
-        precipitation_chances.append(max(daily_precipitation) * 100)  # Convert to percentage
+    # Divide the data into the slots of each calendar day
+    for date, day_slots in forecast_days(data_five_days):
+        high, low, average, icon, condition, chance = _aggregate_day(day_slots)
+        dates.append(date)
+        daily_highs.append(high)
+        daily_lows.append(low)
+        daily_averages.append(average)
+        weather_icons.append(icon)
+        weather_conditions.append(condition)
+        precipitation_chances.append(chance)
 
     return daily_highs, daily_lows, daily_averages, dates, weather_icons, weather_conditions, precipitation_chances
 
+
+class FiveDayAggregator:
+    """
+    Incremental version of processing_data_five_days for forecasts that are refreshed repeatedly.
+
+    The slots are grouped by calendar day as in processing_data_five_days, and each day is
+    compared by its `dt` and values with the same day of the city's previous forecast. The
+    aggregates of an unchanged day are reused, so when the forecast window moves by a slot
+    only the first and last days are recomputed. Charts whose inputs come from unchanged
+    days (for example the precipitation pies when only temperatures changed) get identical
+    inputs and are served from the chart cache instead of being redrawn.
+
+    Args:
+        maxsize (int): The number of cities whose previous forecast is remembered.
+
+    Usage Example:
+        >>> five_day_aggregator.process('Guangzhou', get_weather_five_days('Guangzhou'))
+        ([20.09, 23.97, 25.01, 24.38, 23], [17.9, 18.28, 19.53, 18.14, 17.17], ...)
+    """
+
+    def __init__(self, maxsize: int = INCREMENTAL_FORECAST_CITIES) -> None:
+        self.maxsize = maxsize
+        # City -> (forecast, {date: (slots, day aggregates)}, result)
+        self._latest: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def process(self, city: str, data_five_days: dict) -> tuple:
+        """
+        Processes a five-day forecast like processing_data_five_days, reusing the unchanged days of the city.
+
+        The snapshot cache hands out the same object until a newer forecast is fetched, so an
+        unrefreshed forecast is recognized by identity and its previous result returned as is.
+        The returned lists are shared between callers and must not be modified.
+
+        Args:
+            city (str): The city of the forecast, which keys its previous forecast.
+            data_five_days (dict): The raw five-day forecast.
+
+        Returns:
+            tuple: The same seven lists as processing_data_five_days.
+        """
+        with self._lock:
+            latest = self._latest.get(city)
+        if latest is not None and latest[0] is data_five_days:
+            cache_requests.inc(len(latest[2][0]), cache="forecast_day", result="hit")
+            return latest[2]
+
+        previous: Dict[str, tuple] = latest[1] if latest is not None else {}
+        current: Dict[str, tuple] = {}
+        dates, days = [], []
+        reused = 0
+        for date, day_slots in forecast_days(data_five_days):
+            prior = previous.get(date)
+            if prior is not None and prior[0] == day_slots:  # Same slots, compared by dt and values
+                day = prior[1]
+                reused += 1
+            else:
+                day = _aggregate_day(day_slots)
+            current[date] = (day_slots, day)
+            dates.append(date)
+            days.append(day)
+        cache_requests.inc(reused, cache="forecast_day", result="hit")
+        cache_requests.inc(len(days) - reused, cache="forecast_day", result="miss")
+
+        daily_highs, daily_lows, daily_averages, weather_icons, weather_conditions, precipitation_chances = \
+            (list(column) for column in zip(*days)) if days else ([], [], [], [], [], [])
+        result = (daily_highs, daily_lows, daily_averages, dates, weather_icons, weather_conditions, precipitation_chances)
+        with self._lock:
+            self._latest[city] = (data_five_days, current, result)
+            self._latest.move_to_end(city)
+            while len(self._latest) > self.maxsize:
+                self._latest.popitem(last=False)
+        return result
+
+
+# Aggregates of the latest forecast of each city, shared by the dashboard routes
+five_day_aggregator = FiveDayAggregator()
@@ -0,0 +1,227 @@
+import contextvars
+import cProfile
+import functools
+import hmac
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from config import PROFILE_ADMIN_TOKEN, PROFILE_DIR, PROFILE_KEEP, PROFILE_SAMPLE_RATE
+
+logger = logging.getLogger(__name__)
+
+# Request header that asks for the request to be profiled; its value must equal PROFILE_ADMIN_TOKEN
+PROFILE_HEADER = "X-Profile-Token"
+
+# Set by ProfilingMiddleware for the requests chosen for profiling; read by the wrapped handlers
+_profile_requested: contextvars.ContextVar[bool] = contextvars.ContextVar("profile_requested", default=False)
+
+# Held by the running capture. A process can only run one cProfile profiler at a time (from Python 3.12
+# enabling a second raises ValueError), so requests chosen while a capture runs are not profiled
+_capture_lock = threading.Lock()
+
+
+def _slug(text: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")[:60] or "request"
+
+
+class RequestProfiler:
+    """
+    Captures cProfile statistics of individual requests, chosen by an admin header or at random.
+
+    Each capture is written to `directory` as a pstats file (readable with `python -m pstats`,
+    snakeviz, or flameprof to draw a flamegraph) next to a small JSON file holding its label
+    and total time, which the index page lists. Only the newest `keep` captures are kept.
+
+    Profiling is disabled when neither a sample rate nor an admin token is configured; the
+    hooks are then not installed at all, so requests run exactly as without profiling.
+
+    Args:
+        directory (str): The directory of the captures. An empty string disables profiling.
+        sample_rate (float): The fraction of requests profiled without the admin header.
+        admin_token (str): The value of the X-Profile-Token header that forces profiling.
+        keep (int): The number of most recent captures kept on disk.
+
+    Usage Example:
+        >>> profiler = RequestProfiler('weather_profiles', sample_rate=0.01)
+        >>> with profiler.capture('weather', 'Guangzhou'):
+        ...     weather('Guangzhou')
+    """
+
+    def __init__(self, directory: str = PROFILE_DIR, sample_rate: float = PROFILE_SAMPLE_RATE,
+                 admin_token: str = PROFILE_ADMIN_TOKEN, keep: int = PROFILE_KEEP) -> None:
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.admin_token = admin_token
+        self.keep = keep
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory) and (self.sample_rate > 0 or bool(self.admin_token))
+
+    def is_admin(self, token: Optional[str]) -> bool:
+        """
+        Checks a token against the admin token in constant time.
+        """
+        return bool(self.admin_token) and token is not None and hmac.compare_digest(token, self.admin_token)
+
+    def should_profile(self, token: Optional[str]) -> bool:
+        """
+        Decides whether a request is profiled, given the value of its X-Profile-Token header.
+        """
+        if not self.enabled:
+            return False
+        return self.is_admin(token) or (self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    @contextmanager
+    def capture(self, label: str, detail: str = "") -> Iterator[None]:
+        """
+        Profiles the enclosed block and saves the statistics, even when the block raises.
+
+        One capture runs at a time: while another is running, or when another profiling tool is
+        active, the block runs unprofiled, so profiling never fails a request. From Python 3.12
+        the profiler sees every thread of the process, so a capture may include the work of
+        requests running concurrently.
+
+        Args:
+            label (str): The profiled route, for example "weather".
+            detail (str): Extra information shown on the index page, such as the city name.
+        """
+        if not _capture_lock.acquire(blocking=False):
+            logger.info("Not profiling %s: another capture is running", label)
+            yield
+            return
+        try:
+            profile = cProfile.Profile()
+            captured_at = time.time()
+            start = time.perf_counter()
+            try:
+                profile.enable()
+            except ValueError as error:  # Another profiling tool is active
+                logger.warning("Not profiling %s: %s", label, error)
+                yield
+                return
+            try:
+                yield
+            finally:
+                profile.disable()
+                total_seconds = time.perf_counter() - start
+                try:
+                    self._save(profile, label, detail, captured_at, total_seconds)
+                except OSError:
+                    logger.exception("Could not save the profile of %s", label)
+        finally:
+            _capture_lock.release()
+
+    def _save(self, profile: cProfile.Profile, label: str, detail: str,
+              captured_at: float, total_seconds: float) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = datetime.fromtimestamp(captured_at).strftime("%Y%m%dT%H%M%S")
+        name = f"{stamp}-{uuid.uuid4().hex[:6]}-{_slug(label)}"
+        profile.dump_stats(os.path.join(self.directory, f"{name}.pstats"))
+        meta = {"name": name, "label": label, "detail": detail,
+                "captured_at": captured_at, "total_seconds": total_seconds}
+        with open(os.path.join(self.directory, f"{name}.json"), "w", encoding="utf-8") as file:
+            json.dump(meta, file)
+        self._prune()
+
+    def _prune(self) -> None:
+        names = sorted(entry[:-5] for entry in os.listdir(self.directory) if entry.endswith(".json"))
+        for name in names[:max(len(names) - self.keep, 0)]:
+            for suffix in (".json", ".pstats"):
+                try:
+                    os.remove(os.path.join(self.directory, name + suffix))
+                except FileNotFoundError:
+                    pass
+
+    def captures(self) -> List[Dict[str, Any]]:
+        """
+        Lists the saved captures, newest first.
+
+        Returns:
+            list: One dictionary per capture with its name, label, detail, captured_at and total_seconds.
+        """
+        if not self.directory or not os.path.isdir(self.directory):
+            return []
+        captures = []
+        for entry in sorted(os.listdir(self.directory), reverse=True):
+            if entry.endswith(".json"):
+                try:
+                    with open(os.path.join(self.directory, entry), encoding="utf-8") as file:
+                        captures.append(json.load(file))
+                except (OSError, ValueError):
+                    continue  # Pruned or being written by another process
+        return captures
+
+    def artifact_path(self, name: str) -> Optional[str]:
+        """
+        Returns the path of the pstats file of a capture, or None if there is no such capture.
+        """
+        if not re.fullmatch(r"[0-9T]+-[0-9a-f]+-[a-z0-9-]+", name):
+            return None
+        path = os.path.join(self.directory, f"{name}.pstats")
+        return path if os.path.isfile(path) else None
+
+    def profiled(self, label: str):
+        """
+        Decorator profiling a request handler when ProfilingMiddleware chose the request.
+
+        When profiling is disabled the handler is returned unchanged.
+
+        Args:
+            label (str): The route label of the captures.
+        """
+        def decorator(function):
+            if not self.enabled:
+                return function
+
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not _profile_requested.get():
+                    return function(*args, **kwargs)
+                detail = ", ".join(f"{key}={value}" for key, value in kwargs.items())
+                with self.capture(label, detail):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware choosing which requests the `RequestProfiler.profiled` handlers profile.
+
+    The handlers themselves run the profiler, because synchronous handlers execute in a
+    worker thread that a profiler started here would not see.
+
+    Args:
+        app: The ASGI application to wrap.
+        profiler (RequestProfiler): The profiler deciding by header and sample rate.
+    """
+
+    def __init__(self, app, profiler: RequestProfiler) -> None:
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        header = PROFILE_HEADER.lower().encode()
+        token = next((value.decode("latin-1") for name, value in scope["headers"] if name == header), None)
+        marker = _profile_requested.set(self.profiler.should_profile(token))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _profile_requested.reset(marker)
+
+
+# Profiler shared by the dashboard and the RESTful API of this process
+request_profiler = RequestProfiler()
@@ -0,0 +1,200 @@
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Sequence
+
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+provider_wins = registry.counter(
+    "weather_provider_wins_total", "Responses returned by each provider of a race, by provider and kind.")
+
+# Threads running the racing requests; the losers finish in the background
+_race_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="provider-race")
+
+
+class WeatherProvider:
+    """
+    A source of weather data in the structures the processing layer expects.
+
+    `current` returns the payload of the OpenWeatherMap current weather endpoint and
+    `forecast` the payload of its 3-hour forecast endpoint; other sources convert their
+    data to these structures, so processingdata.py works with any provider.
+
+    Subclasses set `name`, which appears in settings and metrics, and implement both methods.
+    """
+
+    name = "provider"
+
+    def current(self, location: str) -> Dict:
+        """
+        Returns the current weather of a location, shaped like OpenWeatherMap's /data/2.5/weather response.
+        """
+        raise NotImplementedError
+
+    def forecast(self, location: str, slots: int) -> Dict:
+        """
+        Returns the next `slots` 3-hour forecasts of a location, shaped like OpenWeatherMap's /data/2.5/forecast response.
+        """
+        raise NotImplementedError
+
+
+def is_valid_current(data: object) -> bool:
+    """
+    Checks that a current weather payload has everything processing_data_now reads.
+    """
+    try:
+        return (isinstance(data, dict) and isinstance(data["main"]["temp"], (int, float))
+                and "humidity" in data["main"] and bool(data["weather"]) and "icon" in data["weather"][0]
+                and "name" in data and "dt" in data)
+    except (KeyError, TypeError, IndexError):
+        return False
+
+
+def is_valid_forecast(data: object, slots: int) -> bool:
+    """
+    Checks that a forecast payload has `slots` entries with everything the processing functions read.
+    """
+    try:
+        entries = data["list"]  # type: ignore[index]
+        return len(entries) == slots and all(
+            isinstance(entry["main"]["temp"], (int, float)) and "wind" in entry and "pop" in entry
+            and bool(entry["weather"]) and "dt" in entry
+            for entry in entries)
+    except (KeyError, TypeError, IndexError):
+        return False
+
+
+class FakeWeatherProvider(WeatherProvider):
+    """
+    A local provider of synthesized, deterministic weather for any city, for tests and offline development.
+
+    It uses the generator of owm_standin.py without a server. `latency` and `fail` let tests
+    make it slow or broken, for example to exercise RacingProvider.
+
+    Args:
+        latency (float): Seconds every call sleeps before answering.
+        fail (bool): Raise RuntimeError instead of answering.
+
+    Usage Example:
+        >>> FakeWeatherProvider().current('Guangzhou')['name']
+        'Guangzhou'
+    """
+
+    name = "fake"
+
+    def __init__(self, latency: float = 0.0, fail: bool = False) -> None:
+        from owm_standin import WeatherSynthesizer
+
+        self.latency = latency
+        self.fail = fail
+        self.calls = 0
+        self._synthesizer = WeatherSynthesizer()
+
+    def _answer(self, build: Callable[[], Dict]) -> Dict:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.fail:
+            raise RuntimeError("The fake provider is set to fail")
+        return build()
+
+    def current(self, location: str) -> Dict:
+        return self._answer(lambda: self._synthesizer.current(location))
+
+    def forecast(self, location: str, slots: int) -> Dict:
+        return self._answer(lambda: self._synthesizer.forecast(location, slots))
+
+
+class RacingProvider(WeatherProvider):
+    """
+    Asks several providers at once and returns the first valid response.
+
+    A response that raises or fails validation is ignored while another provider can still
+    answer; when none does, the error of the first provider is raised. A LookupError, which a
+    cache tier raises when it has nothing stored, only means that provider had no answer: it is
+    raised only when every provider failed with one, so an upstream error such as the 400 of an
+    unknown city reaches the caller. The slower requests
+    are not cancelled: they finish in the background, so racing a cache tier against
+    OpenWeatherMap answers from the cache at once while the upstream fetch refreshes it.
+
+    Args:
+        providers (sequence): The providers, in order of preference when several have answered.
+
+    Usage Example:
+        >>> provider = RacingProvider([SnapshotCacheProvider(max_age=3600), OpenWeatherMapProvider()])
+        >>> provider.current('Guangzhou')
+    """
+
+    name = "race"
+
+    def __init__(self, providers: Sequence[WeatherProvider]) -> None:
+        if len(providers) < 2:
+            raise ValueError("A race needs at least two providers")
+        self.providers = list(providers)
+
+    def _race(self, kind: str, call: Callable[[WeatherProvider], Dict], valid: Callable[[Dict], bool]) -> Dict:
+        futures: Dict[Future, WeatherProvider] = {_race_pool.submit(call, provider): provider
+                                                  for provider in self.providers}
+        errors: List[Optional[BaseException]] = [None] * len(self.providers)
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            # Among simultaneous answers, prefer the provider listed first
+            for future in sorted(done, key=lambda future: self.providers.index(futures[future])):
+                provider = futures[future]
+                try:
+                    data = future.result()
+                except Exception as error:
+                    errors[self.providers.index(provider)] = error
+                    continue
+                if valid(data):
+                    provider_wins.inc(provider=provider.name, kind=kind)
+                    return data
+                logger.warning("Provider %s returned an invalid %s response", provider.name, kind)
+                errors[self.providers.index(provider)] = ValueError(f"Invalid {kind} response from {provider.name}")
+        failures = [error for error in errors if error is not None]
+        raise next((error for error in failures if not isinstance(error, LookupError)), failures[0])
+
+    def current(self, location: str) -> Dict:
+        return self._race("current", lambda provider: provider.current(location), is_valid_current)
+
+    def forecast(self, location: str, slots: int) -> Dict:
+        return self._race("forecast", lambda provider: provider.forecast(location, slots),
+                          lambda data: is_valid_forecast(data, slots))
+
+
+def make_provider(spec: str) -> WeatherProvider:
+    """
+    Builds the provider named by a WEATHER_PROVIDER setting.
+
+    Args:
+        spec (str): "owm", "fake", "cache", or "race:" followed by comma separated names,
+            for example "race:cache,owm".
+
+    Returns:
+        WeatherProvider: The provider.
+
+    Raises:
+        ValueError: If a name is unknown.
+
+    Usage Example:
+        >>> make_provider('race:owm,fake').providers
+        [<getdata.OpenWeatherMapProvider object at ...>, <providers.FakeWeatherProvider object at ...>]
+    """
+    spec = spec.strip().lower()
+    if spec.startswith("race:"):
+        return RacingProvider([make_provider(name) for name in spec[len("race:"):].split(",") if name.strip()])
+    # The OpenWeatherMap providers live in getdata.py, which builds the configured provider on first use
+    from getdata import OpenWeatherMapProvider, SnapshotCacheProvider
+
+    factories: Dict[str, Callable[[], WeatherProvider]] = {
+        "owm": OpenWeatherMapProvider,
+        "fake": FakeWeatherProvider,
+        "cache": SnapshotCacheProvider,
+    }
+    if spec not in factories:
+        raise ValueError(f"Unknown weather provider {spec!r}; expected one of {', '.join(factories)} or race:a,b")
+    return factories[spec]()
+
@@ -0,0 +1,283 @@
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from email.utils import parsedate_to_datetime
+from typing import Callable, Deque, Dict, List, Optional
+
+import httpx
+
+from config import (CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT, UPSTREAM_HEDGING, UPSTREAM_MAX_RETRIES,
+                    UPSTREAM_RETRY_BACKOFF)
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+circuit_state = registry.gauge(
+    "weather_upstream_circuit_state", "State of the OpenWeatherMap circuit breakers: 0 closed, 1 open, 2 half-open.")
+upstream_attempts = registry.counter(
+    "weather_upstream_attempts_total", "OpenWeatherMap request attempts by endpoint and kind (first, hedge, retry).")
+
+# Status codes worth another attempt; every other status is final
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# Rate limited: the endpoint is up, so the circuit stays closed and the next attempt waits for its Retry-After
+RATE_LIMITED_STATUS_CODE = 429
+
+# Threads sending the attempts, so a caller can stop waiting at its deadline and hedge a slow attempt
+_attempts_pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="upstream")
+
+
+class UpstreamUnavailable(Exception):
+    """
+    Raised when OpenWeatherMap gave no usable answer before the deadline, or its circuit is open.
+    """
+
+
+def retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    """
+    Returns the seconds to wait of a response's Retry-After header, given in seconds or as an HTTP date.
+
+    Returns:
+        float or None: The seconds, or None when the header is missing or invalid.
+
+    Usage Example:
+        >>> retry_after_seconds(httpx.Response(429, headers={'Retry-After': '2'}))
+        2.0
+    """
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class LatencyTracker:
+    """
+    Recent latencies of successful requests to one endpoint, for the hedging delay.
+
+    Args:
+        size (int): The number of latencies kept.
+        min_samples (int): Below this many latencies, percentiles are not trusted.
+    """
+
+    def __init__(self, size: int = 256, min_samples: int = 20) -> None:
+        self.min_samples = min_samples
+        self._latencies: Deque[float] = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def percentile(self, fraction: float, default: float) -> float:
+        """
+        Returns a percentile of the recent latencies, or `default` while there are too few of them.
+        """
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if len(latencies) < self.min_samples:
+            return default
+        return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))]
+
+
+class CircuitBreaker:
+    """
+    Stops calling an endpoint after sustained failures, then lets single probes through.
+
+    After `failure_threshold` consecutive failures the circuit opens and every call is
+    refused for `reset_timeout` seconds. Then one probe call is allowed (half-open): its
+    success closes the circuit, its failure opens it again.
+
+    Args:
+        name (str): The endpoint, used as the metric label.
+        failure_threshold (int): Consecutive failures that open the circuit.
+        reset_timeout (float): Seconds the circuit stays open before a probe.
+
+    Usage Example:
+        >>> breaker = CircuitBreaker('forecast')
+        >>> if breaker.allow():
+        ...     breaker.record_success()
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 0, 1, 2
+
+    def __init__(self, name: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 reset_timeout: float = CIRCUIT_RESET_TIMEOUT) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+        circuit_state.set(self.state, endpoint=name)
+
+    def _set_state(self, state: int) -> None:
+        if state != self.state:
+            logger.warning("OpenWeatherMap %s circuit %s", self.name, ("closed", "opened", "half-open")[state])
+        self.state = state
+        circuit_state.set(state, endpoint=self.name)
+
+    def allow(self) -> bool:
+        """
+        Tells whether a call may be sent now; in the half-open state only the first caller may.
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._set_state(self.HALF_OPEN)
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._set_state(self.CLOSED)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                self._set_state(self.OPEN)
+
+
+class UpstreamPolicy:
+    """
+    Deadline, hedging, jittered retries and circuit breaking of the requests to one endpoint.
+
+    Every call has `deadline` seconds in total, retries and hedges included. An attempt
+    still running after the endpoint's recent p95 latency is hedged with a duplicate request,
+    and the first answer wins. Timeouts, transport errors and the statuses of
+    RETRYABLE_STATUS_CODES are retried after a random ("full jitter") exponential backoff
+    while the deadline allows; a 429 is retried after its Retry-After instead, when given,
+    and does not count against the circuit. Any other exception of an attempt counts as a
+    failure and is raised. Only idempotent requests may use the policy.
+
+    Args:
+        endpoint (str): The endpoint name, used as the metric label.
+        deadline (float): The seconds a call may take in total.
+        max_retries (int): The retries after the first attempt.
+        hedging (bool): Whether slow attempts are hedged.
+
+    Usage Example:
+        >>> policy = UpstreamPolicy('weather', deadline=2.0)
+        >>> response = policy.call(lambda timeout: client.get(url, params=params, timeout=timeout))
+    """
+
+    def __init__(self, endpoint: str, deadline: float, max_retries: int = UPSTREAM_MAX_RETRIES,
+                 hedging: bool = bool(UPSTREAM_HEDGING)) -> None:
+        self.endpoint = endpoint
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.hedging = hedging
+        self.latencies = LatencyTracker()
+        self.breaker = CircuitBreaker(endpoint)
+
+    def hedge_delay(self) -> float:
+        """
+        Returns the seconds an attempt may run before it is hedged: the recent p95 latency.
+        """
+        return max(self.latencies.percentile(0.95, default=self.deadline / 2), 0.01)
+
+    def _timed(self, send: Callable[[float], httpx.Response], timeout: float) -> httpx.Response:
+        start = time.perf_counter()
+        response = send(timeout)
+        if response.status_code not in RETRYABLE_STATUS_CODES:
+            self.latencies.observe(time.perf_counter() - start)
+        return response
+
+    def _attempt(self, send: Callable[[float], httpx.Response], kind: str, deadline_at: float) -> httpx.Response:
+        futures: List[Future] = [_attempts_pool.submit(self._timed, send, deadline_at - time.monotonic())]
+        upstream_attempts.inc(endpoint=self.endpoint, kind=kind)
+        if self.hedging:
+            done, _ = wait(futures, timeout=min(self.hedge_delay(), max(deadline_at - time.monotonic(), 0)))
+            if not done and deadline_at - time.monotonic() > 0:
+                futures.append(_attempts_pool.submit(self._timed, send, deadline_at - time.monotonic()))
+                upstream_attempts.inc(endpoint=self.endpoint, kind="hedge")
+
+        error: Exception = httpx.TimeoutException("Deadline exceeded")
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=max(deadline_at - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+            if not done:
+                break  # The losers finish in the background, bounded by their own timeout
+            for future in done:
+                try:
+                    response = future.result()
+                except httpx.HTTPError as failure:
+                    error = failure
+                    continue
+                if response.status_code not in RETRYABLE_STATUS_CODES or not pending:
+                    return response
+        raise error
+
+    def call(self, send: Callable[[float], httpx.Response]) -> httpx.Response:
+        """
+        Sends a request under the policy.
+
+        Args:
+            send (callable): Sends one attempt, given its timeout in seconds, and returns the response.
+
+        Returns:
+            httpx.Response: The first response with a final status, including 4xx client errors.
+
+        Raises:
+            UpstreamUnavailable: If the circuit is open, or no attempt succeeded before the deadline.
+        """
+        deadline_at = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                raise UpstreamUnavailable(f"The {self.endpoint} circuit is open")
+            retry_after = None
+            try:
+                response = self._attempt(send, "first" if attempt == 0 else "retry", deadline_at)
+            except httpx.HTTPError as error:
+                failure = f"{type(error).__name__}: {error}"
+                self.breaker.record_failure()
+            except Exception:
+                # Settles a half-open probe too, so the circuit cannot stay half-open
+                self.breaker.record_failure()
+                raise
+            else:
+                failure = f"HTTP {response.status_code}"
+                if response.status_code == RATE_LIMITED_STATUS_CODE:
+                    self.breaker.record_success()
+                    retry_after = retry_after_seconds(response)
+                elif response.status_code in RETRYABLE_STATUS_CODES:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                    return response
+
+            attempt += 1
+            backoff = random.uniform(0, UPSTREAM_RETRY_BACKOFF * 2 ** attempt) if retry_after is None else retry_after
+            if attempt > self.max_retries or time.monotonic() + backoff >= deadline_at:
+                raise UpstreamUnavailable(f"{self.endpoint} failed after {attempt} attempts: {failure}")
+            time.sleep(backoff)
+
+
+_policies: Dict[str, UpstreamPolicy] = {}
+_policies_lock = threading.Lock()
+
+
+def upstream_policy(endpoint: str, deadline: float) -> UpstreamPolicy:
+    """
+    Returns the policy of an endpoint, created on first use; its latencies and circuit are shared by all callers.
+    """
+    with _policies_lock:
+        policy = _policies.get(endpoint)
+        if policy is None:
+            policy = _policies[endpoint] = UpstreamPolicy(endpoint, deadline)
+        return policy
@@ -1,9 +1,21 @@
 from getdata import get_weather_now, get_weather_today, get_weather_five_days
 from processingdata import processing_data_now, processing_data_today, processing_data_five_days
-
-from flask import Flask, jsonify, abort, request, url_for
+from negative_cache import NegativeCache
+from persistent_cache import weather_cache
+from metrics import PROMETHEUS_CONTENT_TYPE, http_request_seconds, registry
+from profiling import PROFILE_HEADER, request_profiler
+from bulk_export import FORMATS, export
+from negotiation import respond, respond_cached
+from units import localize, normalize_units
+from config import API_SERVER_NAME, API_URL_SCHEME, EXPORT_MAX_CITIES
+from contextlib import ExitStack
+import copy
+import threading
+import time
+
+from flask import Flask, g, abort, request, url_for
 from flask import Response
-from typing import Callable, Dict, List, Tuple
+from typing import Any, Callable, Dict, List, Optional
 
 def create_api(city_name: str) -> Flask:
     """
@@ -28,12 +40,40 @@ def create_api(city_name: str) -> Flask:
       
       (and then you can check the API through visiting the website http://localhost:5000/weatherdashboard/api/v1.0/weatherdatas) 
     """
+    # The history stores load numpy, so they are imported when an API is built rather than with this module
+    from history_store import history_store, parse_time_range, columns_to_json
+    from trend_archive import trend_archive
+
     app = Flask(__name__)
 
     # Set necessary configuration items
-    app.config['SERVER_NAME'] = 'localhost:5000'
+    app.config['SERVER_NAME'] = API_SERVER_NAME
     app.config['APPLICATION_ROOT'] = '/'
-    app.config['PREFERRED_URL_SCHEME'] = 'http'
+    app.config['PREFERRED_URL_SCHEME'] = API_URL_SCHEME
+
+    @app.before_request
+    def start_request_timer() -> None:
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request_latency(response: Response) -> Response:
+        # Label by URL rule rather than path so every record id shares one series
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        http_request_seconds.observe(time.perf_counter() - g.request_started, app='api', route=route,
+                                     method=request.method, status=response.status_code)
+        return response
+
+    if request_profiler.enabled:
+        @app.before_request
+        def start_profile() -> None:
+            if request_profiler.should_profile(request.headers.get(PROFILE_HEADER)):
+                g.profile = ExitStack()
+                g.profile.enter_context(request_profiler.capture(f"api {request.endpoint}", request.path))
+
+        @app.teardown_request
+        def stop_profile(exception: Optional[BaseException]) -> None:
+            if 'profile' in g:
+                g.profile.close()
 
     # Current data
     weather_data_now = get_weather_now(city_name)
@@ -47,6 +87,11 @@ def create_api(city_name: str) -> Flask:
     weather_data_five_days = get_weather_five_days(city_name)
     daily_highs, daily_lows, daily_averages, dates, icons, conditions_five_days, precipitation_chances = processing_data_five_days(weather_data_five_days)
 
+    # Keep the observation and the forecast run for the history endpoints
+    history_store.record_observation(city, weather_data_now['dt'], temperature, humidity)
+    trend_archive.append(city, weather_data_now['dt'], temperature, humidity)
+    history_store.record_forecast(city, weather_data_five_days['list'][0]['dt'], daily_highs, daily_lows, daily_averages, precipitation_chances)
+
     now_data = {'city': city,
                 'temperature': temperature,
                 'humidity': humidity,
@@ -85,6 +130,75 @@ def create_api(city_name: str) -> Flask:
         }
     ]
 
+    # The records live in the persistent cache as well, so they survive a restart and every
+    # worker process of a production server sees the changes made through the others
+    records_key = f"weatherdatas|{NegativeCache.normalize(city_name)}"
+    records_lock = threading.Lock()
+    records_version = [0.0]  # Timestamp of the stored records this process last read or wrote
+
+    def change_weatherdatas(change: Callable[[list], Any]) -> Any:
+        """
+        Applies a change to the latest stored records and stores them, atomically across all worker processes.
+
+        Args:
+        change (callable): Mutates the list of records it gets, a private copy, and returns the result of the request;
+            it may abort the request, which leaves the records unchanged.
+
+        Returns:
+        The value returned by `change`.
+        """
+        results = []
+
+        def apply(stored_records: Optional[list]) -> list:
+            records = stored_records if stored_records is not None else copy.deepcopy(weatherdatas)
+            results.append(change(records))
+            return records
+
+        with records_lock:
+            records_version[0], weatherdatas[:] = weather_cache.update(records_key, apply)
+        return results[0]
+
+    def sync_weatherdatas() -> None:
+        """
+        Reloads the weather data records if another worker changed them since this one last read or wrote them.
+        """
+        stored_records = weather_cache.get(records_key, revalidate=True)
+        if stored_records is not None and stored_records[0] > records_version[0]:
+            records_version[0] = stored_records[0]
+            weatherdatas[:] = copy.deepcopy(stored_records[1])  # The cached list is shared by every reader
+
+    # Restore the records created through the API before the last restart; the first three are always fresh
+    fresh_records = list(weatherdatas)
+
+    def restore(records: list) -> None:
+        records[:] = fresh_records + [record for record in records if record['id'] > 3]
+
+    change_weatherdatas(restore)
+
+    @app.before_request
+    def load_weatherdatas() -> None:
+        if request.endpoint in ('get_weatherdata', 'get_weatherdatas', 'create_weatherdata',
+                                'update_weatherdata', 'delete_weatherdata'):
+            with records_lock:
+                sync_weatherdatas()
+
+    def requested_units() -> str:
+        """
+        Returns the unit system of the `units` query parameter, answering 400 when it is unknown.
+        """
+        try:
+            return normalize_units(request.args.get('units'))
+        except ValueError as error:
+            abort(400, description=str(error))
+
+    def localize_record(weatherdata: dict, units: str) -> dict:
+        """
+        Converts the temperatures and wind speeds of a record's data from the stored metric units.
+        """
+        if not isinstance(weatherdata.get('data'), dict):
+            return weatherdata
+        return dict(weatherdata, data=localize(weatherdata['data'], units))
+
     @app.route('/weatherdashboard/api/v1.0/weatherdatas/<int:weatherdata_id>', methods=['GET'])
     def get_weatherdata(weatherdata_id: int) -> Callable:
         """
@@ -93,37 +207,46 @@ def create_api(city_name: str) -> Flask:
         Args:
         weatherdata_id (int): The ID of the weather data needed.
 
+        Query parameters:
+        units: "metric", "imperial" or "standard"; defaults to DEFAULT_UNITS.
+
         Returns:
-        jsonify: JSON response containing the requested weather data.
+        Response: Negotiated response (JSON by default) containing the requested weather data.
         """
+        units = requested_units()
         weatherdata = list(filter(lambda t: t['id'] == weatherdata_id, weatherdatas))
         if len(weatherdata) == 0:
             abort(404)
-        return jsonify({'weatherdata': weatherdata[0]})
+        return respond_cached(f"{records_key}|{records_version[0]}|{weatherdata_id}|{units}",
+                              lambda: {'weatherdata': localize_record(weatherdata[0], units), 'units': units})
 
     @app.route('/weatherdashboard/api/v1.0/weatherdatas', methods=['POST'])
-    def create_weatherdata() -> Response :
+    def create_weatherdata() -> Response:
         """
         Creates a new weather data record.
 
         Returns:
-        jsonify: JSON response containing the newly created weather data along with a 201 status code.
+        Response: Negotiated response (JSON by default) containing the newly created weather data along with a 201 status code.
         """
         if not request.json or not 'title' in request.json:
             abort(400)
-       
-        last_id = weatherdatas[-1]['id']
-        
-        if not isinstance(last_id, int):
-            abort(500, description="Invalid type for 'id' in weatherdatas.")
-        
-        weatherdata = {
-            'id': last_id + 1,
-            'title': request.json['title'],
-            'data': request.json.get('data', "")
-        }
-        weatherdatas.append(weatherdata)
-        return jsonify({'weatherdata': weatherdata}, status=201)
+
+        def create(records: list) -> dict:
+            last_id = records[-1]['id']
+            
+            if not isinstance(last_id, int):
+                abort(500, description="Invalid type for 'id' in weatherdatas.")
+            
+            weatherdata = {
+                'id': last_id + 1,
+                'title': request.json['title'],
+                'data': request.json.get('data', "")
+            }
+            records.append(weatherdata)
+            return weatherdata
+
+        weatherdata = change_weatherdatas(create)
+        return respond({'weatherdata': weatherdata}, 201)
 
     @app.route('/weatherdashboard/api/v1.0/weatherdatas/<int:weatherdata_id>', methods=['PUT'])
     def update_weatherdata(weatherdata_id: int) -> Callable:
@@ -134,20 +257,23 @@ def create_api(city_name: str) -> Flask:
         weatherdata_id (int): The ID of the weather data to be updated.
 
         Returns:
-        jsonify: JSON response containing the updated weather data.
+        Response: Negotiated response (JSON by default) containing the updated weather data.
         """
-        weatherdata = list(filter(lambda t: t['id'] == weatherdata_id, weatherdatas))
-        if len(weatherdata) == 0:
-            abort(404)
-        if not request.json:
-            abort(400)
-        if 'title' in request.json and type(request.json['title']) != str:
-            abort(400)
-        if 'data' in request.json and type(request.json['data']) is not dict:
-            abort(400)
-        weatherdata[0]['title'] = request.json.get('title', weatherdata[0]['title'])
-        weatherdata[0]['data'] = request.json.get('data', weatherdata[0]['data'])
-        return jsonify({'weatherdata': weatherdata[0]})
+        def update(records: list) -> dict:
+            weatherdata = list(filter(lambda t: t['id'] == weatherdata_id, records))
+            if len(weatherdata) == 0:
+                abort(404)
+            if not request.json:
+                abort(400)
+            if 'title' in request.json and type(request.json['title']) != str:
+                abort(400)
+            if 'data' in request.json and type(request.json['data']) is not dict:
+                abort(400)
+            weatherdata[0]['title'] = request.json.get('title', weatherdata[0]['title'])
+            weatherdata[0]['data'] = request.json.get('data', weatherdata[0]['data'])
+            return weatherdata[0]
+
+        return respond({'weatherdata': change_weatherdatas(update)})
 
     @app.route('/weatherdashboard/api/v1.0/weatherdatas/<int:weatherdata_id>', methods=['DELETE'])
     def delete_weatherdata(weatherdata_id: int) -> Callable:
@@ -158,13 +284,16 @@ def create_api(city_name: str) -> Flask:
         weatherdata_id (int): The ID of the weather data to be deleted.
 
         Returns:
-        jsonify: JSON response containing the result of the deletion operation.
+        Response: Negotiated response (JSON by default) containing the result of the deletion operation.
         """
-        weatherdata = list(filter(lambda t: t['id'] == weatherdata_id, weatherdatas))
-        if len(weatherdata) == 0:
-            abort(404)
-        weatherdatas.remove(weatherdata[0])
-        return jsonify({'result': True})
+        def delete(records: list) -> None:
+            weatherdata = list(filter(lambda t: t['id'] == weatherdata_id, records))
+            if len(weatherdata) == 0:
+                abort(404)
+            records.remove(weatherdata[0])
+
+        change_weatherdatas(delete)
+        return respond({'result': True})
 
     def make_public_weatherdata(weatherdata: dict) -> dict:
         """
@@ -189,10 +318,128 @@ def create_api(city_name: str) -> Flask:
         """
         Retrieves all weather data records.
 
+        Query parameters:
+        units: "metric", "imperial" or "standard"; defaults to DEFAULT_UNITS.
+
+        Returns:
+        Response: Negotiated response (JSON by default) containing all weather data records.
+        """
+        units = requested_units()
+        return respond_cached(f"{records_key}|{records_version[0]}|{units}",
+                              lambda: {'weatherdatas': [make_public_weatherdata(localize_record(weatherdata, units))
+                                                        for weatherdata in weatherdatas],
+                                       'units': units})
+
+    @app.route('/weatherdashboard/api/v1.0/history/<string:history_city>', methods=['GET'])
+    def get_history(history_city: str) -> Callable:
+        """
+        Retrieves the recorded observations or forecast runs of a city within a time range.
+
+        Args:
+        history_city (str): The city name.
+
+        Query parameters:
+        kind: "observations" (default) or "forecasts".
+        start, end: The time range in Unix seconds; end defaults to now.
+        days: The length of the range in days when no start is given, defaulting to 30.
+        units: "metric", "imperial" or "standard"; defaults to DEFAULT_UNITS.
+
+        Returns:
+        Response: Negotiated response (JSON by default) containing one list per column.
+        """
+        kind = request.args.get('kind', 'observations')
+        units = requested_units()
+        try:
+            start, end = parse_time_range(request.args.get('start'), request.args.get('end'), request.args.get('days'))
+            columns = history_store.query_range(history_city, kind, start, end)
+        except ValueError:
+            abort(400)
+        return respond({'city': history_city, 'kind': kind, 'start': start, 'end': end, 'units': units,
+                        'history': localize(columns_to_json(columns), units)})
+
+    @app.route('/weatherdashboard/api/v1.0/history/<string:history_city>/aggregate', methods=['GET'])
+    def get_history_aggregate(history_city: str) -> Callable:
+        """
+        Retrieves one recorded variable of a city downsampled into fixed-width time buckets.
+
+        Args:
+        history_city (str): The city name.
+
+        Query parameters:
+        kind: "observations" (default) or "forecasts".
+        variable: The column to aggregate, defaulting to "temperature".
+        bucket: The bucket width in seconds, defaulting to 3600.
+        agg: "mean" (default), "min" or "max".
+        start, end, days: The time range, as for the history endpoint.
+        units: "metric", "imperial" or "standard"; defaults to DEFAULT_UNITS.
+
+        Returns:
+        Response: Negotiated response (JSON by default) containing the bucket start times and the aggregated values.
+        """
+        kind = request.args.get('kind', 'observations')
+        variable = request.args.get('variable', 'temperature')
+        aggregation = request.args.get('agg', 'mean')
+        units = requested_units()
+        try:
+            start, end = parse_time_range(request.args.get('start'), request.args.get('end'), request.args.get('days'))
+            bucket = int(request.args.get('bucket', 3600))
+            times, values = history_store.query_aggregate(history_city, kind, variable, start, end, bucket, aggregation)
+        except ValueError:
+            abort(400)
+        return respond({'city': history_city, 'kind': kind, 'variable': variable, 'agg': aggregation,
+                        'bucket': bucket, 'start': start, 'end': end, 'units': units,
+                        'history': localize(columns_to_json({'time': times, variable: values}), units)})
+
+    @app.route('/weatherdashboard/api/v1.0/export', methods=['GET', 'POST'])
+    def export_weatherdatas() -> Response:
+        """
+        Streams one processed dataset of many cities as NDJSON, CSV, Arrow IPC or Parquet.
+
+        At most EXPORT_MAX_CITIES cities are exported per request, unless the request carries the
+        admin token of profiling.py in its X-Profile-Token header.
+
+        Query parameters:
+        cities: Comma separated city names (GET only; POST sends {"cities": [...]} as the JSON body).
+        dataset: "now", "today" or "five_days" (default).
+        format: "ndjson" (default), "csv", "arrow" or "parquet".
+        units: "metric", "imperial" or "standard"; defaults to DEFAULT_UNITS.
+
         Returns:
-        jsonify: JSON response containing all weather data records.
+        Response: The export, streamed while the cities are fetched; cities that fail are left out.
+        400 if no city is given, 403 if more than EXPORT_MAX_CITIES are given without the admin token.
+        """
+        if request.method == 'POST':
+            cities = (request.get_json(silent=True) or {}).get('cities')
+        else:
+            cities = request.args.get('cities', '').split(',')
+        if not isinstance(cities, list) or not all(isinstance(city, str) for city in cities):
+            abort(400)
+        cities = [city.strip() for city in cities if city.strip()]
+        if not cities:
+            abort(400, description="No cities to export.")
+        if len(cities) > EXPORT_MAX_CITIES and not request_profiler.is_admin(request.headers.get(PROFILE_HEADER)):
+            abort(403, description=f"Exports of more than {EXPORT_MAX_CITIES} cities need the admin token.")
+        dataset = request.args.get('dataset', 'five_days')
+        output_format = request.args.get('format', 'ndjson')
+        units = requested_units()
+        try:
+            chunks = export(cities, dataset, output_format, units=units)
+        except ValueError:
+            abort(400)
+        except RuntimeError:
+            abort(501, description="The arrow and parquet formats need pyarrow on the server.")
+        return Response(chunks, content_type=FORMATS[output_format],
+                        headers={'Content-Disposition': f'attachment; filename="{dataset}.{output_format}"'})
+
+    @app.route('/metrics', methods=['GET'])
+    def get_metrics() -> Response:
         """
-        return jsonify({'weatherdatas': list(map(make_public_weatherdata, weatherdatas))})
+        Exposes the latency metrics of this process in the Prometheus text format.
+
+        Returns:
+        Response: The metrics as text/plain in the Prometheus exposition format.
+        """
+        return Response(registry.render(), content_type=PROMETHEUS_CONTENT_TYPE)
 
     return app
 
@@ -212,12 +459,10 @@ def generate_api_url(city_name: str) -> tuple:
         >>> generate_api_url('London')
         ('http://localhost:5000/weatherdashboard/api/v1.0/weatherdatas/1', 'http://localhost:5000/weatherdashboard/api/v1.0/weatherdatas/2', 'http://localhost:5000/weatherdashboard/api/v1.0/weatherdatas/3')
     """
-    app = create_api(city_name)
-    
-    with app.app_context():
-        now_url = url_for('get_weatherdata', weatherdata_id=1, _external=True)
-        today_url = url_for('get_weatherdata', weatherdata_id=2, _external=True)
-        five_days_url = url_for('get_weatherdata', weatherdata_id=3, _external=True)
+    # The URLs do not depend on the city, so they are built without constructing the API,
+    # which would fetch the city's weather data again
+    base_url = f"{API_URL_SCHEME}://{API_SERVER_NAME}/weatherdashboard/api/v1.0/weatherdatas"
+    now_url, today_url, five_days_url = (f"{base_url}/{weatherdata_id}" for weatherdata_id in (1, 2, 3))
 
     return now_url, today_url, five_days_url
     
@@ -0,0 +1,293 @@
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from cache_policy import make_store
+from config import CHART_CACHE_PROCESS_SIZE, CHART_CACHE_TTL, SHARED_CACHE_BACKEND, WEATHER_CACHE_DB
+from metrics import cache_requests
+
+
+class ProcessCache:
+    """
+    An in-process cache of values with a time to live, bounded to `maxsize` entries.
+
+    Which entries are kept follows CACHE_EVICTION_POLICY (see cache_policy.py): by default
+    the frequency-aware TinyLFU policy, so one-off keys do not evict popular ones.
+
+    Args:
+        maxsize (int): The maximum number of entries.
+
+    Usage Example:
+        >>> cache = ProcessCache(maxsize=64)
+        >>> cache.set('chart|wind_rose|3f2a', 'iVBORw0KGgo...', ttl=3600)
+        >>> cache.get('chart|wind_rose|3f2a')
+        'iVBORw0KGgo...'
+    """
+
+    def __init__(self, maxsize: int = CHART_CACHE_PROCESS_SIZE) -> None:
+        self.maxsize = maxsize
+        self._entries = make_store(maxsize)  # Key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Returns the value of a key, or None if it is missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                self._entries.pop(key)
+                return None
+            return entry[1]
+
+    def set(self, key: str, value: Any, ttl: float, expires_at: Optional[float] = None) -> None:
+        """
+        Stores a value for `ttl` seconds, or until `expires_at` when given.
+        """
+        with self._lock:
+            self._entries.put(key, (time.time() + ttl if expires_at is None else expires_at, value))
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteHostCache:
+    """
+    A cache of JSON values with a time to live shared by every process on the host through a SQLite file.
+
+    The database runs in WAL mode, so readers in other workers never wait for a writer.
+    Expired rows are ignored on read and purged every few hundred writes.
+
+    Args:
+        path (str): The SQLite database path; it can be the snapshot cache database.
+
+    Usage Example:
+        >>> cache = SQLiteHostCache('weather_cache.sqlite3')
+        >>> cache.set('chart|wind_rose|3f2a', 'iVBORw0KGgo...', ttl=3600)
+        >>> cache.get_entry('chart|wind_rose|3f2a')
+        (1739847273.0, 'iVBORw0KGgo...')
+    """
+
+    PURGE_EVERY = 256  # Writes between purges of expired rows
+
+    def __init__(self, path: str = WEATHER_CACHE_DB) -> None:
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        # SQLite connections must not be shared between threads, so open one per thread
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS shared_entries ("
+                "key TEXT PRIMARY KEY, expires_at REAL NOT NULL, payload TEXT NOT NULL)"
+            )
+            self._local.connection = connection
+        return connection
+
+    def get_entry(self, key: str) -> Optional[Tuple[float, Any]]:
+        """
+        Returns the expiry time and the value of a key, or None if it is missing or expired.
+        """
+        row = self._connection().execute(
+            "SELECT expires_at, payload FROM shared_entries WHERE key = ? AND expires_at >= ?", (key, time.time())
+        ).fetchone()
+        return (row[0], json.loads(row[1])) if row is not None else None
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        """
+        Stores a JSON serializable value for `ttl` seconds.
+        """
+        connection = self._connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO shared_entries (key, expires_at, payload) VALUES (?, ?, ?)",
+            (key, time.time() + ttl, json.dumps(value, separators=(",", ":"))),
+        )
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            connection.execute("DELETE FROM shared_entries WHERE expires_at < ?", (time.time(),))
+
+    def delete(self, key: str) -> None:
+        self._connection().execute("DELETE FROM shared_entries WHERE key = ?", (key,))
+
+    def close(self) -> None:
+        """
+        Closes the database connection of the calling thread.
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+
+class MemoryHostCache:
+    """
+    A stand-in for SQLiteHostCache that keeps the entries in this process, for tests and benchmarks.
+
+    It has the same interface and expiry behaviour but is not shared between processes.
+    """
+
+    def __init__(self) -> None:
+        self._entries: Dict[str, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get_entry(self, key: str) -> Optional[Tuple[float, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+        return entry if entry is not None and entry[0] >= time.time() else None
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        # Round trip through JSON like the SQLite tier, so callers cannot rely on sharing objects
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, json.loads(json.dumps(value)))
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def close(self) -> None:
+        pass
+
+
+class _Flight:
+    # One computation of a key, which the concurrent callers missing the same key wait for
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class TieredCache:
+    """
+    A cache looked up in this process first, then in the host tier shared by all workers, then upstream.
+
+    A host hit is copied into the process tier until the host entry expires, so a value
+    computed by one worker is reused by the others without being computed again. Concurrent
+    misses of one key in a process wait for a single computation and get its value (or its
+    exception), whether or not the process tier admitted it.
+
+    Args:
+        name (str): The cache label of the weather_cache_requests_total metric.
+        ttl (float): How many seconds a value is reused.
+        process (ProcessCache): The in-process tier.
+        host: The host tier (SQLiteHostCache or MemoryHostCache), or None for a process-only cache.
+
+    Usage Example:
+        >>> chart_cache = TieredCache('chart', ttl=3600, process=ProcessCache(64), host=SQLiteHostCache('cache.sqlite3'))
+        >>> chart_cache.get_or_set('chart|wind_rose|3f2a', lambda: create_wind_rose(speeds, directions))
+        'iVBORw0KGgo...'
+    """
+
+    def __init__(self, name: str, ttl: float, process: ProcessCache, host=None) -> None:
+        self.name = name
+        self.ttl = ttl
+        self.process = process
+        self.host = host
+        self._flights: Dict[str, _Flight] = {}  # Key -> computation in progress
+        self._flights_lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Returns the cached value of a key from the nearest tier that has it, or None.
+        """
+        value = self.process.get(key)
+        if value is not None:
+            cache_requests.inc(cache=f"{self.name}_process", result="hit")
+            return value
+        cache_requests.inc(cache=f"{self.name}_process", result="miss")
+        if self.host is None:
+            return None
+        entry = self.host.get_entry(key)
+        cache_requests.inc(cache=f"{self.name}_host", result="hit" if entry is not None else "miss")
+        if entry is None:
+            return None
+        self.process.set(key, entry[1], self.ttl, expires_at=entry[0])
+        return entry[1]
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Stores a value in every tier for `ttl` seconds, defaulting to the cache's ttl.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        self.process.set(key, value, ttl)
+        if self.host is not None:
+            self.host.set(key, value, ttl)
+
+    def delete(self, key: str) -> None:
+        self.process.delete(key)
+        if self.host is not None:
+            self.host.delete(key)
+
+    def get_or_set(self, key: str, compute: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+        """
+        Returns the cached value of a key, computing and storing it on a miss in every tier.
+
+        Args:
+            key (str): The cache key.
+            compute (callable): Computes the value; called at most once per process for concurrent misses.
+            ttl (float, optional): How many seconds the value is reused, defaulting to the cache's ttl.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            waiting = flight is not None
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+        if waiting:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+        try:
+            value = self.process.get(key)  # Stored by a computation that finished since the lookup above
+            if value is None:
+                value = compute()
+                self.set(key, value, ttl)
+            flight.value = value
+            return value
+        except BaseException as error:
+            flight.error = error
+            raise
+        finally:
+            # Waiters keep their reference to the flight, so it is removed before they are woken
+            with self._flights_lock:
+                del self._flights[key]
+            flight.done.set()
+
+
+def make_host_cache(backend: str = SHARED_CACHE_BACKEND, path: str = WEATHER_CACHE_DB):
+    """
+    Builds the host tier named by the SHARED_CACHE_BACKEND setting.
+
+    Args:
+        backend (str): "sqlite", "memory" or "none".
+        path (str): The SQLite database path; when empty the sqlite backend is disabled.
+
+    Returns:
+        The host cache, or None when there is no host tier.
+    """
+    if backend == "sqlite" and path:
+        return SQLiteHostCache(path)
+    if backend == "memory":
+        return MemoryHostCache()
+    return None
+
+
+# Rendered dashboard charts, shared by the worker processes of the host
+chart_cache = TieredCache("chart", ttl=CHART_CACHE_TTL, process=ProcessCache(CHART_CACHE_PROCESS_SIZE),
+                          host=make_host_cache())
@@ -0,0 +1,244 @@
+/*
+ * Browser renderer of the dashboard charts, used when CHART_RENDERER=client.
+ *
+ * /weather embeds the processed series as JSON in <script id="weather-chart-data">, and this
+ * file draws the temperature progress bar, humidity gauge, wind rose, temperature chart and
+ * precipitation pies on canvases, mirroring the matplotlib charts of visualization.py.
+ * No dependencies; the canvases are drawn at the device pixel ratio.
+ */
+(function () {
+    "use strict";
+
+    var FONT = "sans-serif";
+
+    function setup(canvas) {
+        var ratio = window.devicePixelRatio || 1;
+        var width = canvas.clientWidth || canvas.width;
+        var height = canvas.clientHeight || canvas.height;
+        canvas.width = Math.round(width * ratio);
+        canvas.height = Math.round(height * ratio);
+        var ctx = canvas.getContext("2d");
+        ctx.setTransform(ratio, 0, 0, ratio, 0, 0);
+        ctx.clearRect(0, 0, width, height);
+        return {ctx: ctx, width: width, height: height};
+    }
+
+    function text(ctx, value, x, y, size, color, align, baseline, style) {
+        ctx.font = (style || "") + " " + size + "px " + FONT;
+        ctx.fillStyle = color;
+        ctx.textAlign = align || "center";
+        ctx.textBaseline = baseline || "middle";
+        ctx.fillText(value, x, y);
+    }
+
+    function progressbar(canvas, temperature, scale) {
+        // scale: {min, zero, max, symbol}, in the displayed unit system
+        var c = setup(canvas), ctx = c.ctx;
+        var left = 10, right = c.width - 10, top = c.height * 0.35, barHeight = c.height * 0.25;
+        var fraction = Math.max(0, Math.min(1, (temperature - scale.min) / (scale.max - scale.min)));
+        var zero = (scale.zero - scale.min) / (scale.max - scale.min);
+        ctx.fillStyle = "#eeeeee";
+        ctx.fillRect(left, top, right - left, barHeight);
+        ctx.fillStyle = "#2196F3";
+        ctx.fillRect(left, top, (right - left) * fraction, barHeight);
+        ctx.strokeStyle = "white";
+        ctx.lineWidth = 2;
+        ctx.beginPath();
+        ctx.moveTo(left + (right - left) * zero, top + barHeight * 0.3);
+        ctx.lineTo(left + (right - left) * zero, top + barHeight * 0.7);
+        ctx.stroke();
+        var below = top + barHeight + 4;
+        text(ctx, scale.zero + scale.symbol, left + (right - left) * zero, below, 11, "#666666", "center", "top");
+        text(ctx, scale.min + scale.symbol, left, below, 9, "#666666", "left", "top");
+        text(ctx, scale.max + scale.symbol, right, below, 9, "#666666", "right", "top");
+        text(ctx, temperature.toFixed(1) + scale.symbol, left + (right - left) * fraction, top - 4, 11,
+             "#2196F3", "center", "bottom", "bold");
+    }
+
+    function gauge(canvas, humidity) {
+        var c = setup(canvas), ctx = c.ctx;
+        var radius = Math.min(c.width / 2.6, c.height / 1.6), cx = c.width / 2, cy = c.height * 0.72;
+        ctx.strokeStyle = "#66CCFF";
+        ctx.lineWidth = 4;
+        ctx.beginPath();
+        ctx.arc(cx, cy, radius, Math.PI, 2 * Math.PI);
+        ctx.stroke();
+        for (var value = 0; value <= 100; value += 10) {
+            var angle = Math.PI - value / 100 * Math.PI;
+            ctx.lineWidth = 3;
+            ctx.beginPath();
+            ctx.moveTo(cx + 0.9 * radius * Math.cos(angle), cy - 0.9 * radius * Math.sin(angle));
+            ctx.lineTo(cx + radius * Math.cos(angle), cy - radius * Math.sin(angle));
+            ctx.stroke();
+            if (value % 20 === 0) {
+                text(ctx, value + "%", cx + 1.19 * radius * Math.cos(angle), cy - 1.19 * radius * Math.sin(angle), 11, "#0000FF");
+            }
+        }
+        var pointer = Math.PI - humidity / 100 * Math.PI;
+        ctx.strokeStyle = "#FF5722";
+        ctx.lineWidth = 4;
+        ctx.beginPath();
+        ctx.moveTo(cx, cy);
+        ctx.lineTo(cx + 0.8 * radius * Math.cos(pointer), cy - 0.8 * radius * Math.sin(pointer));
+        ctx.stroke();
+        ctx.fillStyle = "#FF5722";
+        ctx.beginPath();
+        ctx.arc(cx, cy, 0.05 * radius, 0, 2 * Math.PI);
+        ctx.fill();
+        text(ctx, humidity + "%", cx, cy + 0.18 * radius, 20, "#FF5722", "center", "middle", "bold");
+    }
+
+    function windRose(canvas, speeds, directions) {
+        // Directions binned into 22.5 degree sectors, drawn like the polar bar chart of create_wind_rose
+        var c = setup(canvas), ctx = c.ctx;
+        var cx = c.width / 2, cy = c.height / 2, radius = Math.min(c.width, c.height) / 2 - 22;
+        var counts = new Array(16).fill(0);
+        directions.forEach(function (direction) {
+            counts[Math.min(15, Math.floor(((direction % 360) + 360) % 360 / 22.5))] += 1;
+        });
+        var peak = Math.max.apply(null, counts.concat([1]));
+        ctx.strokeStyle = "#dddddd";
+        ctx.lineWidth = 1;
+        for (var ring = 1; ring <= 4; ring++) {
+            ctx.beginPath();
+            ctx.arc(cx, cy, radius * ring / 4, 0, 2 * Math.PI);
+            ctx.stroke();
+        }
+        var labels = ["E", "NE", "N", "NW", "W", "SW", "S", "SE"];
+        for (var i = 0; i < 8; i++) {
+            var labelAngle = i * Math.PI / 4;
+            text(ctx, labels[i], cx + (radius + 12) * Math.cos(labelAngle), cy - (radius + 12) * Math.sin(labelAngle), 12, "#333333");
+        }
+        ctx.fillStyle = "rgba(0, 0, 255, 0.7)";
+        counts.forEach(function (count, sector) {
+            if (!count) {
+                return;
+            }
+            var center = (sector * 22.5 + 11.25 - 90) * Math.PI / 180;
+            var half = 11.25 * Math.PI / 180;
+            ctx.beginPath();
+            ctx.moveTo(cx, cy);
+            ctx.arc(cx, cy, radius * count / peak, -(center + half), -(center - half));
+            ctx.closePath();
+            ctx.fill();
+        });
+    }
+
+    function temperatureChart(canvas, series, symbol) {
+        var c = setup(canvas), ctx = c.ctx;
+        var left = 48, right = c.width - 16, top = 28, bottom = c.height - 46;
+        var all = series.highs.concat(series.lows, series.averages);
+        var low = Math.min.apply(null, all) - 5, high = Math.max.apply(null, all) + 5;
+        var step = (right - left) / series.dates.length;
+        function x(index) { return left + step * (index + 0.5); }
+        function y(value) { return bottom - (value - low) / (high - low) * (bottom - top); }
+
+        ctx.strokeStyle = "#999999";
+        ctx.lineWidth = 1;
+        ctx.strokeRect(left, top, right - left, bottom - top);
+        for (var tick = 0; tick <= 4; tick++) {
+            var value = low + (high - low) * tick / 4;
+            text(ctx, value.toFixed(0), left - 6, y(value), 10, "#000000", "right");
+        }
+        ctx.save();
+        ctx.translate(12, (top + bottom) / 2);
+        ctx.rotate(-Math.PI / 2);
+        text(ctx, "Temperature (" + symbol + ")", 0, 0, 11, "#000000");
+        ctx.restore();
+
+        ctx.fillStyle = "rgba(0, 128, 0, 0.6)";
+        series.averages.forEach(function (value, index) {
+            ctx.fillRect(x(index) - step * 0.4, y(value), step * 0.8, bottom - y(value));
+        });
+        [["highs", "red", "Daily High"], ["lows", "blue", "Daily Low"]].forEach(function (line) {
+            ctx.strokeStyle = ctx.fillStyle = line[1];
+            ctx.lineWidth = 2;
+            ctx.beginPath();
+            series[line[0]].forEach(function (value, index) {
+                if (index) { ctx.lineTo(x(index), y(value)); } else { ctx.moveTo(x(index), y(value)); }
+            });
+            ctx.stroke();
+            series[line[0]].forEach(function (value, index) {
+                ctx.beginPath();
+                ctx.arc(x(index), y(value), 3.5, 0, 2 * Math.PI);
+                ctx.fill();
+            });
+        });
+        series.dates.forEach(function (date, index) {
+            text(ctx, date, x(index), bottom + 14, 10, "#000000");
+        });
+        var legend = [["red", "Daily High"], ["blue", "Daily Low"], ["rgba(0, 128, 0, 0.6)", "Average Temperature"]];
+        legend.forEach(function (entry, index) {
+            var legendX = left + index * (right - left) / 3;
+            ctx.fillStyle = entry[0];
+            ctx.fillRect(legendX, 8, 12, 10);
+            text(ctx, entry[1], legendX + 16, 13, 10, "#000000", "left");
+        });
+    }
+
+    function precipitationPies(canvas, chances, dates) {
+        var c = setup(canvas), ctx = c.ctx;
+        var cell = c.width / chances.length, radius = Math.min(cell, c.height) * 0.28;
+        chances.forEach(function (chance, index) {
+            var cx = cell * (index + 0.5), cy = c.height * 0.38;
+            var fraction = Math.max(0, Math.min(100, chance)) / 100;
+            ctx.fillStyle = "white";
+            ctx.beginPath();
+            ctx.arc(cx, cy, radius, 0, 2 * Math.PI);
+            ctx.fill();
+            if (fraction > 0) {
+                ctx.fillStyle = "#66ccff";
+                ctx.beginPath();
+                ctx.moveTo(cx, cy);
+                ctx.arc(cx, cy, radius, -Math.PI / 2, -Math.PI / 2 + 2 * Math.PI * fraction);
+                ctx.closePath();
+                ctx.fill();
+            }
+            ctx.strokeStyle = "darkblue";
+            ctx.lineWidth = 2;
+            ctx.beginPath();
+            ctx.arc(cx, cy, radius, 0, 2 * Math.PI);
+            ctx.stroke();
+            text(ctx, chance.toFixed(2) + "%", cx, cy + radius + 18, 15, "#9370DB", "center", "middle", "italic bold");
+            text(ctx, dates[index], cx, cy + radius + 38, 12, "#6A5ACD", "center", "middle", "italic bold");
+        });
+    }
+
+    function draw(id, paint) {
+        var canvas = document.getElementById(id);
+        if (canvas) {
+            paint(canvas);
+        }
+    }
+
+    function render(data) {
+        draw("chart-progressbar", function (canvas) { progressbar(canvas, data.temperature, data.temperature_scale); });
+        draw("chart-humidity", function (canvas) { gauge(canvas, data.humidity); });
+        draw("chart-wind-rose", function (canvas) { windRose(canvas, data.wind.speeds, data.wind.directions); });
+        draw("chart-temperature", function (canvas) { temperatureChart(canvas, data.forecast, data.temperature_scale.symbol); });
+        draw("chart-precipitation", function (canvas) { precipitationPies(canvas, data.forecast.precipitation, data.forecast.dates); });
+    }
+
+    window.WeatherCharts = {
+        progressbar: progressbar,
+        gauge: gauge,
+        windRose: windRose,
+        temperatureChart: temperatureChart,
+        precipitationPies: precipitationPies,
+        render: render
+    };
+
+    function start() {
+        var blob = document.getElementById("weather-chart-data");
+        if (blob) {
+            window.WeatherCharts.data = JSON.parse(blob.textContent);
+            render(window.WeatherCharts.data);
+        }
+    }
+
+    if (document.readyState === "loading") {
+        document.addEventListener("DOMContentLoaded", start);
+    } else {
+        start();
+    }
+})();
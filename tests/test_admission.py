@@ -0,0 +1,94 @@
+"""
+Tests of the admission gate of admission.py and of the dashboard requests it sheds.
+"""
+import time
+
+import pytest
+from starlette.testclient import TestClient
+
+import getdata
+import persistent_cache
+from admission import AdmissionGate
+from providers import FakeWeatherProvider
+
+
+def test_gate_turns_away_requests_beyond_its_queue():
+    gate = AdmissionGate("test", limit=1, queue_size=0, timeout=1.0)
+    assert gate.enter()
+    assert not gate.enter()
+    gate.leave()
+    assert gate.enter()
+    gate.leave()
+
+
+def test_gate_turns_away_requests_still_waiting_at_their_deadline():
+    gate = AdmissionGate("test", limit=1, queue_size=1, timeout=0.05)
+    assert gate.enter()
+    started = time.monotonic()
+    assert not gate.enter()
+    assert time.monotonic() - started >= 0.05
+    assert gate.waiting == 0
+
+
+@pytest.fixture
+def busy_dashboard(monkeypatch, tmp_path):
+    # The dashboard with its only slot taken, the snapshots in an empty cache and every recording counted
+    import main_app
+    from history_store import history_store
+    from trend_archive import trend_archive
+
+    gate = AdmissionGate("test", limit=1, queue_size=0, timeout=0.0)
+    gate.enter()
+    monkeypatch.setattr(main_app, "dashboard_gate", gate)
+    monkeypatch.setattr(main_app, "CHART_RENDERER", "client")  # No matplotlib rendering
+    monkeypatch.setattr(getdata, "weather_cache", persistent_cache.PersistentCache(str(tmp_path / "cache.sqlite3")))
+    monkeypatch.setattr(history_store, "root", "")
+    monkeypatch.setattr(trend_archive, "root", "")
+    records = []
+    monkeypatch.setattr(history_store, "record_observation", lambda *args: records.append(args))
+    monkeypatch.setattr(trend_archive, "append", lambda *args: records.append(args))
+    provider = FakeWeatherProvider()
+    getdata.set_weather_provider(provider)
+    yield TestClient(main_app.create_app()), provider, records
+    getdata.set_weather_provider(None)
+
+
+def _store_snapshots(city: str) -> None:
+    # The snapshots OpenWeatherMapProvider would have stored for the city
+    fake = FakeWeatherProvider()
+    url, params = getdata._current_request()
+    getdata.weather_cache.set(getdata._snapshot_key(url, city, params), fake.current(city))
+    for slots in (8, 40):
+        url, params = getdata._forecast_request(slots)
+        getdata.weather_cache.set(getdata._snapshot_key(url, city, params), fake.forecast(city, slots))
+
+
+def test_reject_mode_answers_503_with_retry_after(busy_dashboard, monkeypatch):
+    import main_app
+
+    client, provider, records = busy_dashboard
+    monkeypatch.setattr(main_app, "DASHBOARD_OVERLOAD_RESPONSE", "reject")
+    _store_snapshots("Guangzhou")
+    response = client.get("/weather", params={"city_name": "Guangzhou"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(main_app.DASHBOARD_RETRY_AFTER)
+    assert provider.calls == 0
+
+
+def test_degraded_page_reads_only_stored_snapshots(busy_dashboard):
+    client, provider, records = busy_dashboard
+    _store_snapshots("Guangzhou")
+    response = client.get("/weather", params={"city_name": "Guangzhou"})
+    assert response.status_code == 200
+    assert "Guangzhou" in response.text
+    assert provider.calls == 0
+    assert records == []
+
+
+def test_degraded_request_without_snapshots_is_rejected(busy_dashboard):
+    client, provider, records = busy_dashboard
+    response = client.get("/weather", params={"city_name": "Guangzhou"})
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
+    assert provider.calls == 0
+    assert records == []
@@ -0,0 +1,59 @@
+"""
+Tests of the eviction policies of cache_policy.py.
+"""
+from cache_policy import CountMinSketch, LRUStore, TinyLFUStore, make_store
+
+
+def test_sketch_counts_from_the_second_access_and_ages():
+    sketch = CountMinSketch(width=64, sample_size=1000)
+    assert sketch.estimate("guangzhou") == 0
+    sketch.increment("guangzhou")
+    assert sketch.estimate("guangzhou") == 1  # Only the doorkeeper has seen it
+    for _ in range(8):
+        sketch.increment("guangzhou")
+    assert sketch.estimate("guangzhou") == 9
+    sketch.age()
+    assert sketch.estimate("guangzhou") == 4
+
+
+def test_sketch_counters_saturate():
+    sketch = CountMinSketch(width=64, sample_size=1000)
+    for _ in range(100):
+        sketch.increment("guangzhou")
+    assert sketch.estimate("guangzhou") == CountMinSketch.MAX_COUNT + 1
+
+
+def _scan(store: LRUStore) -> list:
+    # Popular keys read ten times, then a long tail of keys stored once and never read
+    popular = [f"popular_{index}" for index in range(50)]
+    for key in popular:
+        store.put(key, key)
+    for _ in range(10):
+        for key in popular:
+            store.get(key)
+    for index in range(1000):
+        store.put(f"once_{index}", index)
+    return [key for key in popular if store.get(key) is not None]
+
+
+def test_tinylfu_keeps_popular_keys_through_a_scan():
+    # A one-off key whose counters all collide with popular keys' can still be admitted now and then
+    assert len(_scan(TinyLFUStore(100))) >= 45
+    assert _scan(LRUStore(100)) == []
+
+
+def test_tinylfu_holds_new_keys_in_the_window():
+    store = TinyLFUStore(100)
+    for index in range(200):
+        store.put(f"key_{index}", index)
+        store.get(f"key_{index}")
+    store.put("new", "value")
+    assert store.get("new") == "value"
+    assert len(store) <= 100
+    store.pop("new")
+    assert "new" not in store
+
+
+def test_make_store_follows_the_policy():
+    assert type(make_store(10, "lru")) is LRUStore
+    assert type(make_store(10, "tinylfu")) is TinyLFUStore
@@ -0,0 +1,74 @@
+"""
+Tests of the chart atlas of chart_atlas.py and of the CSS sprites of html_widgets.py showing its panels.
+"""
+import base64
+from io import BytesIO
+
+import pytest
+
+pytest.importorskip("matplotlib")
+
+from PIL import Image  # noqa: E402
+
+import chart_atlas  # noqa: E402
+import visualization  # noqa: E402
+from html_widgets import chart_atlas_panel, chart_atlas_style  # noqa: E402
+from shared_cache import ProcessCache, TieredCache  # noqa: E402
+
+DATES = ["2025-02-18", "2025-02-19", "2025-02-20", "2025-02-21", "2025-02-22"]
+SERIES = ([25.0, 26.1, 24.3, 23.8, 27.2], [17.0, 18.4, 16.9, 15.5, 19.1], [21.0, 22.2, 20.6, 19.7, 23.1],
+          [10, 35, 80, 0, 55], DATES)
+
+
+@pytest.fixture(autouse=True)
+def chart_cache(monkeypatch):
+    # A private chart cache, so atlases of earlier tests are not reused
+    monkeypatch.setattr(visualization, "chart_cache", TieredCache("test", ttl=60, process=ProcessCache(64)))
+
+
+def _overlap(a: list, b: list) -> bool:
+    return a[0] < b[0] + b[2] and b[0] < a[0] + a[2] and a[1] < b[1] + b[3] and b[1] < a[1] + a[3]
+
+
+def test_atlas_crops_fit_their_cells_without_overlapping():
+    atlas = chart_atlas.create_chart_atlas(21.5, 64, [3.35, 3.09, 4.2], [12, 10, 200], *SERIES)
+    assert set(atlas["panels"]) == {"wind_rose", "temperature_progressbar", "temperature_chart", "humidity_gauge",
+                                    "precipitation_pies"}
+    with Image.open(BytesIO(base64.b64decode(atlas["png"]))) as image:
+        assert image.size == (atlas["width"], atlas["height"])
+    crops = list(atlas["panels"].items())
+    for name, (x, y, width, height) in crops:
+        left, top, cell_width, cell_height = (value * chart_atlas.DPI for value in chart_atlas.ATLAS_CELLS[name])
+        assert width > 0 and height > 0
+        assert left <= x and x + width <= left + cell_width + 1
+        assert top <= y and y + height <= top + cell_height + 1
+    for index, (name, crop) in enumerate(crops):
+        for other_name, other in crops[index + 1:]:
+            assert not _overlap(crop, other), (name, other_name)
+
+
+def test_atlas_includes_the_forecast_table_when_given_icons():
+    icons = [Image.new("RGBA", (50, 50), "orange") for _ in DATES]
+    atlas = chart_atlas.create_chart_atlas(21.5, 64, [3.35], [12], *SERIES, weather_icons=icons,
+                                           weather_conditions=["clear sky"] * 5)
+    assert "forecast_table" in atlas["panels"]
+    assert atlas["height"] == round(max(top + height for _, top, _, height in chart_atlas.ATLAS_CELLS.values())
+                                    * chart_atlas.DPI)
+
+
+def test_atlas_needs_wind_data():
+    with pytest.raises(ValueError):
+        chart_atlas.create_chart_atlas(21.5, 64, [], [], *SERIES)
+
+
+def test_panel_sprite_offsets_the_atlas_to_its_crop():
+    atlas = {"png": "iVBORw0KGgo", "width": 1000, "height": 500, "panels": {"wind_rose": [250, 100, 500, 250]}}
+    panel = chart_atlas_panel(atlas, "wind_rose", 150, id="live-wind-rose")
+    assert panel.attrs["aria-label"] == "wind rose"
+    assert panel.attrs["id"] == "live-wind-rose"
+    style = panel.attrs["style"]
+    assert "width: min(100%, 300px);" in style
+    assert "aspect-ratio: 500 / 250;" in style
+    assert "background-size: 200.0000% auto;" in style
+    assert "background-position: 50.0000% 40.0000%;" in style
+    assert "base64,iVBORw0KGgo" in chart_atlas_style(atlas).children[0]
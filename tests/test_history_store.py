@@ -0,0 +1,68 @@
+"""
+Tests of the day-partitioned history store of history_store.py.
+"""
+import multiprocessing
+
+import numpy as np
+import pytest
+
+import history_store
+from history_store import HistoryStore
+
+DAY_START = 1739836800  # 2025-02-18 00:00 UTC
+
+
+def test_appends_are_compacted_without_losing_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr(history_store, "COMPACT_ROWS", 8)
+    store = HistoryStore(str(tmp_path))
+    for minute in range(20):
+        store.record_observation("Guangzhou", DAY_START + minute * 60, 20.0 + minute, 50)
+    store.record_observation("Guangzhou", DAY_START + 60, 99.0, 99)  # Not newer than the last row: skipped
+
+    columns = store.query_range("Guangzhou", "observations", DAY_START, DAY_START + 86400)
+    assert columns["time"].tolist() == [DAY_START + minute * 60 for minute in range(20)]
+    assert columns["temperature"].tolist() == [20.0 + minute for minute in range(20)]
+    partition = tmp_path / "guangzhou" / "2025-02-18"
+    assert (partition / "observations.npz").exists()
+    assert (partition / "observations.log").stat().st_size < 8 * history_store._log_dtype("observations").itemsize
+
+
+def test_forecast_runs_are_appended_whole(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    for run in range(3):
+        store.record_forecast("Guangzhou", DAY_START + run * 10800, [25.0] * 5, [17.0] * 5, [21.0] * 5, [10.0] * 5)
+    columns = store.query_range("Guangzhou", "forecasts", DAY_START, DAY_START + 86400)
+    assert len(columns["time"]) == 15
+    assert columns["day_offset"].tolist() == list(range(5)) * 3
+
+
+def _record(root: str, first: int) -> None:
+    store = HistoryStore(root)
+    for minute in range(first, 60, 4):
+        store.record_observation("Guangzhou", DAY_START + minute * 60, float(minute), 50)
+
+
+def test_processes_appending_to_one_partition_keep_every_newer_row(tmp_path):
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=_record, args=(str(tmp_path), first)) for first in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    times = HistoryStore(str(tmp_path)).query_range("Guangzhou", "observations", DAY_START, DAY_START + 86400)["time"]
+    # Rows older than the last recorded one are skipped, but none is lost or duplicated
+    assert np.all(np.diff(times) > 0)
+    assert times[-1] >= DAY_START + 56 * 60
+
+
+def test_city_names_stay_inside_the_root(tmp_path):
+    root = tmp_path / "history"
+    store = HistoryStore(str(root))
+    for city in ("../escaped", "..\\escaped", "/tmp/escaped", "a/../../escaped"):
+        store.record_observation(city, DAY_START, 20.0, 50)
+        assert store.query_range(city, "observations", DAY_START, DAY_START + 1)["time"].tolist() == [DAY_START]
+    for city in ("..", ".", ""):
+        with pytest.raises(ValueError):
+            store.record_observation(city, DAY_START, 20.0, 50)
+    assert sorted(path.parent.parent.parent for path in root.rglob("*.log")) == [root] * 4
+    assert [path.name for path in tmp_path.iterdir()] == ["history"]
@@ -0,0 +1,74 @@
+"""
+Tests of the HTML widgets of html_widgets.py that replace server-rendered images.
+"""
+import json
+import re
+
+import numpy as np
+from fasthtml.common import to_xml
+from starlette.testclient import TestClient
+
+import getdata
+from html_widgets import CHART_SCRIPT_URL, create_chart_data, create_chart_scripts, create_weather_forecast_table_html
+from processingdata import weather_icon_url
+from providers import FakeWeatherProvider
+
+ICONS = ["04d", "10d", "01d", "01d", "13d"]
+CONDITIONS = ["overcast clouds", "light rain", "clear sky", "clear sky", "snow"]
+DATES = ["2025-02-18", "2025-02-19", "2025-02-20", "2025-02-21", "2025-02-22"]
+
+
+def test_forecast_table_has_one_column_per_day():
+    table = create_weather_forecast_table_html(ICONS, CONDITIONS, DATES)
+    assert len(table.children) == 5
+    assert "grid-template-columns: repeat(5, 1fr)" in table.attrs["style"]
+    html = to_xml(table)
+    for icon_code, condition, date in zip(ICONS, CONDITIONS, DATES):
+        assert f'src="{weather_icon_url(icon_code)}" alt="{condition}"' in html
+        assert date in html
+
+
+def test_forecast_table_escapes_conditions():
+    html = to_xml(create_weather_forecast_table_html(["01d"], ["<b>clear</b>"], ["2025-02-18"]))
+    assert "<b>" not in html
+    assert "&lt;b&gt;clear&lt;/b&gt;" in html
+
+
+def test_chart_data_converts_the_temperature_scale():
+    data = create_chart_data(71.6, 40, "imperial", np.array([3.0, 4.126]), [90, 180], [80.0] * 5, [60.0] * 5,
+                             [70.0] * 5, [10.0, 20.0, 30.0, 40.0, 50.0], DATES)
+    assert data["temperature_scale"] == {"min": -22, "zero": 32, "max": 122, "symbol": "°F"}
+    assert data["wind"] == {"speeds": [3.0, 4.13], "directions": [90.0, 180.0]}
+    assert data["forecast"]["dates"] == DATES
+    json.dumps(data)  # Plain values only, no numpy scalars
+
+
+def test_chart_data_cannot_close_its_script_element():
+    blob, renderer = create_chart_scripts({"forecast": {"dates": ["</script><script>alert(1)"]}})
+    html = to_xml(blob)
+    assert "</script><script>" not in html
+    assert 'type="application/json"' in html and 'id="weather-chart-data"' in html
+    assert renderer.attrs["src"] == CHART_SCRIPT_URL
+
+
+def test_client_rendered_page_carries_canvases_and_chart_data(monkeypatch):
+    import main_app
+    from history_store import history_store
+    from trend_archive import trend_archive
+
+    monkeypatch.setattr(main_app, "CHART_RENDERER", "client")
+    monkeypatch.setattr(history_store, "root", "")
+    monkeypatch.setattr(trend_archive, "root", "")
+    getdata.set_weather_provider(FakeWeatherProvider())
+    try:
+        response = TestClient(main_app.create_app()).get("/weather", params={"city_name": "Guangzhou"})
+    finally:
+        getdata.set_weather_provider(None)
+    assert response.status_code == 200
+    for canvas_id in ("chart-progressbar", "chart-humidity", "chart-wind-rose", "chart-temperature", "chart-precipitation"):
+        assert f'id="{canvas_id}"' in response.text
+    assert 'src="data:image/png;base64' not in response.text
+    blob = re.search(r'<script type="application/json" id="weather-chart-data">(.*?)</script>', response.text)
+    assert blob is not None
+    assert set(json.loads(blob.group(1))) == {"temperature", "humidity", "temperature_scale", "wind", "forecast"}
+    assert f'src="{CHART_SCRIPT_URL}"' in response.text
@@ -0,0 +1,24 @@
+"""
+Import-time budget of the application entry points, as checked by benchmarks/check_import_time.py.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from check_import_time import DEFAULT_BUDGET_MS, ENTRY_POINTS, check_entry_point  # noqa: E402
+
+
+@pytest.mark.parametrize("module", sorted(ENTRY_POINTS))
+def test_entry_point_imports_within_budget(module):
+    best_ms, eager = check_entry_point(module)
+    assert not eager, f"{module} loads {', '.join(eager)} at import time instead of on first use"
+    assert best_ms <= DEFAULT_BUDGET_MS, f"{module} takes {best_ms:.1f} ms to import (budget {DEFAULT_BUDGET_MS:.0f} ms)"
+
+
+def test_importing_the_dashboard_builds_no_app():
+    import main_app
+
+    assert not hasattr(main_app, "app")
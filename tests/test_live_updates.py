@@ -0,0 +1,81 @@
+"""
+Tests of the live update channels of live_updates.py.
+"""
+import asyncio
+import logging
+
+import pytest
+from starlette.exceptions import HTTPException
+
+import getdata
+import live_updates
+from live_updates import LiveUpdates
+from negative_cache import unknown_locations
+from providers import FakeWeatherProvider
+
+
+@pytest.fixture(autouse=True)
+def offline(monkeypatch):
+    monkeypatch.setattr(live_updates, "CHART_RENDERER", "client")  # No matplotlib rendering
+    getdata.set_weather_provider(FakeWeatherProvider())
+    yield
+    getdata.set_weather_provider(None)
+    unknown_locations.clear()
+
+
+def test_unknown_locations_get_no_channel():
+    unknown_locations.add("Atlantis")
+    updates = LiveUpdates()
+    with pytest.raises(HTTPException) as rejected:
+        updates.stream("atlantis")
+    assert rejected.value.status_code == 400
+    assert updates._channels == {}
+
+
+def test_channels_are_capped():
+    async def follow() -> None:
+        updates = LiveUpdates(max_channels=1)
+        first = updates.stream("Guangzhou")
+        await first.__anext__()
+        with pytest.raises(HTTPException) as rejected:
+            updates.stream("London")
+        assert rejected.value.status_code == 503
+        assert rejected.value.headers == {"Retry-After": str(live_updates.LIVE_RETRY_AFTER)}
+        second = updates.stream("Guangzhou")  # The open channel can still be joined
+        await second.__anext__()
+        assert updates.subscriber_count("Guangzhou") == 2
+        await first.aclose()
+        await second.aclose()
+
+    asyncio.run(follow())
+
+
+def test_poller_stops_with_the_last_subscriber():
+    async def follow() -> None:
+        updates = LiveUpdates()
+        events = updates.stream("Guangzhou")
+        assert await events.__anext__() == "retry: 5000\n\n"
+        assert (await events.__anext__()).startswith("event: ")
+        poller = updates._channels["guangzhou|metric"].poller
+        await events.aclose()
+        await asyncio.sleep(0)
+        assert poller is not None and poller.cancelled()
+        assert updates._channels == {}
+
+    asyncio.run(follow())
+
+
+def test_poll_failures_are_warnings_without_traceback(caplog):
+    getdata.set_weather_provider(FakeWeatherProvider(fail=True))
+
+    async def follow() -> None:
+        updates = LiveUpdates(heartbeat_interval=0.05)
+        events = updates.stream("Guangzhou")
+        await events.__anext__()
+        assert await events.__anext__() == ": keep-alive\n\n"
+        await events.aclose()
+
+    with caplog.at_level(logging.WARNING, logger="live_updates"):
+        asyncio.run(follow())
+    failures = [record for record in caplog.records if "poll failed" in record.getMessage()]
+    assert failures and all(record.levelno == logging.WARNING and record.exc_info is None for record in failures)
@@ -0,0 +1,31 @@
+"""
+Tests of the dashboard pages of main_app.py, with the weather of FakeWeatherProvider.
+"""
+import pytest
+from starlette.testclient import TestClient
+
+import getdata
+from providers import FakeWeatherProvider
+
+
+@pytest.fixture
+def client(monkeypatch):
+    import main_app
+    from history_store import history_store
+    from trend_archive import trend_archive
+
+    monkeypatch.setattr(history_store, "root", "")
+    monkeypatch.setattr(trend_archive, "root", "")
+    monkeypatch.setattr(main_app, "CHART_RENDERER", "client")  # No matplotlib rendering
+    getdata.set_weather_provider(FakeWeatherProvider())
+    yield TestClient(main_app.create_app())
+    getdata.set_weather_provider(None)
+
+
+def test_city_name_cannot_close_the_page_script(client):
+    city = "</script><script>alert(1)//&units=x"
+    response = client.get("/weather", params={"city_name": city})
+    assert response.status_code == 200
+    assert "</script><script>alert(1)" not in response.text
+    assert 'encodeURIComponent("<\\/script><script>alert(1)//&units=x")' in response.text
+    assert "/weather?city_name=%3C/script%3E%3Cscript%3Ealert%281%29//%26units%3Dx&amp;units=imperial" in response.text
@@ -0,0 +1,82 @@
+"""
+Tests of the Prometheus metrics of metrics.py and of the /metrics routes exposing them.
+"""
+from starlette.testclient import TestClient
+
+import getdata
+import restful_api
+from metrics import PROMETHEUS_CONTENT_TYPE, Registry
+from providers import FakeWeatherProvider
+
+
+def test_counter_and_gauge_exposition():
+    registry = Registry()
+    errors = registry.counter("test_errors_total", "Failed requests.")
+    depth = registry.gauge("test_queue_depth", "Requests waiting.")
+    errors.inc(status=500, endpoint="weather")
+    errors.inc(2, endpoint="weather", status=500)
+    depth.set(3)
+    depth.dec()
+    assert registry.counter("test_errors_total", "Ignored.") is errors
+    assert registry.render().splitlines() == [
+        "# HELP test_errors_total Failed requests.",
+        "# TYPE test_errors_total counter",
+        'test_errors_total{endpoint="weather",status="500"} 3',
+        "# HELP test_queue_depth Requests waiting.",
+        "# TYPE test_queue_depth gauge",
+        "test_queue_depth 2",
+    ]
+
+
+def test_label_values_are_escaped():
+    registry = Registry()
+    registry.counter("test_total", "Escaping.").inc(city='Say "hi"\\\n')
+    assert 'test_total{city="Say \\"hi\\"\\\\\\n"} 1' in registry.render().splitlines()
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    latency = registry.histogram("test_seconds", "Latency.", buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        latency.observe(value, route="/weather")
+    assert latency.count(route="/weather") == 4
+    assert registry.render().splitlines()[2:] == [
+        'test_seconds_bucket{route="/weather",le="0.1"} 2',
+        'test_seconds_bucket{route="/weather",le="1"} 3',
+        'test_seconds_bucket{route="/weather",le="+Inf"} 4',
+        'test_seconds_sum{route="/weather"} 2.650000',
+        'test_seconds_count{route="/weather"} 4',
+    ]
+
+
+def test_dashboard_labels_requests_by_route(monkeypatch):
+    import main_app
+
+    client = TestClient(main_app.create_app())
+    client.get("/ready")
+    client.get("/no-such-page")
+    response = client.get("/metrics")
+    assert response.headers["content-type"] == PROMETHEUS_CONTENT_TYPE
+    lines = response.text.splitlines()
+    assert any(line.startswith('weather_http_request_seconds_count{app="dashboard",route="/ready",') for line in lines)
+    assert any('route="unmatched",status="404"' in line for line in lines)
+    assert not any("no-such-page" in line for line in lines)
+
+
+def test_api_labels_requests_by_url_rule(monkeypatch):
+    from history_store import history_store
+    from trend_archive import trend_archive
+
+    monkeypatch.setattr(history_store, "root", "")
+    monkeypatch.setattr(trend_archive, "root", "")
+    getdata.set_weather_provider(FakeWeatherProvider())
+    try:
+        client = restful_api.create_api("Guangzhou").test_client()
+        client.get("/weatherdashboard/api/v1.0/weatherdatas/987654")
+        response = client.get("/metrics")
+    finally:
+        getdata.set_weather_provider(None)
+    assert response.headers["Content-Type"] == PROMETHEUS_CONTENT_TYPE
+    text = response.get_data(as_text=True)
+    assert 'route="/weatherdashboard/api/v1.0/weatherdatas/<int:weatherdata_id>"' in text
+    assert "987654" not in text
@@ -0,0 +1,63 @@
+"""
+Tests of the Bloom filter and the negative cache of negative_cache.py.
+"""
+import pytest
+from starlette.exceptions import HTTPException
+
+import negative_cache
+from negative_cache import BloomFilter, NegativeCache
+
+
+def test_bloom_filter_has_no_false_negatives_and_few_false_positives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    added = [f"city {index}" for index in range(1000)]
+    for key in added:
+        bloom.add(key)
+    assert all(key in bloom for key in added)
+    false_positives = sum(f"other {index}" in bloom for index in range(10000))
+    assert false_positives < 300  # About 1% expected
+    bloom.clear()
+    assert "city 0" not in bloom
+
+
+def test_spellings_of_a_location_share_an_entry():
+    cache = NegativeCache(maxsize=10, ttl=60)
+    cache.add("  New   York ")
+    assert "new york" in cache
+    assert "NEW YORK" in cache
+    assert "York" not in cache
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(negative_cache.time, "monotonic", lambda: now[0])
+    cache = NegativeCache(maxsize=10, ttl=60)
+    cache.add("Atlantis")
+    now[0] += 59
+    assert "Atlantis" in cache
+    now[0] += 2
+    assert "Atlantis" not in cache
+    assert len(cache) == 0
+
+
+def test_oldest_entries_are_evicted_and_the_filter_rebuilt():
+    cache = NegativeCache(maxsize=3, ttl=60)
+    for index in range(20):  # Saturates the filter (capacity 6) several times
+        cache.add(f"typo {index}")
+    assert len(cache) == 3
+    assert [f"typo {index}" in cache for index in (16, 17, 18, 19)] == [False, True, True, True]
+    assert cache._bloom.count <= cache._bloom.capacity
+
+
+def test_known_failures_are_refused_without_a_request(monkeypatch):
+    import getdata
+
+    def no_request(*args, **kwargs):
+        raise AssertionError("OpenWeatherMap was requested")
+
+    monkeypatch.setattr(getdata, "get", no_request)
+    monkeypatch.setattr(getdata, "unknown_locations", NegativeCache(maxsize=10, ttl=60))
+    getdata.unknown_locations.add("Atlantis")
+    with pytest.raises(HTTPException) as refused:
+        getdata.OpenWeatherMapProvider().current("atlantis")
+    assert refused.value.status_code == 400
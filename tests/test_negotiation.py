@@ -0,0 +1,104 @@
+"""
+Tests of the content negotiation of negotiation.py: media types, compression and conditional requests.
+"""
+import gzip
+import json
+
+import pytest
+from flask import Flask
+
+import negotiation
+from negotiation import COLUMNAR_JSON, JSON, MSGPACK, respond, respond_cached, to_columnar
+
+RECORDS = [{"id": index, "title": f"Record {index}", "temp": 20.5 + index} for index in range(40)]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # A small app answering the same records through both helpers, with a fresh response cache
+    monkeypatch.setattr(negotiation, "response_cache", negotiation.ProcessCache(maxsize=16))
+    builds = []
+    app = Flask(__name__)
+
+    @app.route("/records")
+    def records():
+        return respond({"records": RECORDS})
+
+    @app.route("/cached")
+    def cached():
+        return respond_cached("records|1", lambda: builds.append(1) or {"records": RECORDS})
+
+    @app.route("/small")
+    def small():
+        return respond({"result": True}, 201)
+
+    test_client = app.test_client()
+    test_client.builds = builds
+    return test_client
+
+
+def test_to_columnar_stores_records_column_by_column():
+    assert to_columnar({"records": [{"id": 1, "title": "a"}, {"id": 2, "title": "b"}]}) == \
+        {"records": {"id": [1, 2], "title": ["a", "b"]}}
+    assert to_columnar([{"id": 1}, {"title": "b"}]) == [{"id": 1}, {"title": "b"}]
+    assert to_columnar([]) == []
+
+
+def test_json_is_the_default(client):
+    for accept in (None, "text/html", "*/*"):
+        response = client.get("/records", headers={"Accept": accept} if accept else {})
+        assert response.mimetype == JSON
+        assert response.get_json() == {"records": RECORDS}
+        assert "Content-Encoding" not in response.headers
+        assert {"Accept", "Accept-Encoding"} <= set(response.vary)
+
+
+def test_columnar_json_on_request(client):
+    response = client.get("/records", headers={"Accept": COLUMNAR_JSON})
+    assert response.mimetype == COLUMNAR_JSON
+    assert json.loads(response.data) == {"records": to_columnar(RECORDS)}
+
+
+def test_msgpack_on_request(client):
+    msgpack = pytest.importorskip("msgpack")
+    response = client.get("/records", headers={"Accept": MSGPACK})
+    assert response.mimetype == MSGPACK
+    assert msgpack.unpackb(response.data) == {"records": RECORDS}
+
+
+def test_gzip_and_brotli_compression(client):
+    response = client.get("/records", headers={"Accept-Encoding": "gzip"})
+    assert response.content_encoding == "gzip"
+    assert json.loads(gzip.decompress(response.data)) == {"records": RECORDS}
+    brotli = pytest.importorskip("brotli")
+    response = client.get("/records", headers={"Accept-Encoding": "gzip, br"})
+    assert response.content_encoding == "br"
+    assert json.loads(brotli.decompress(response.data)) == {"records": RECORDS}
+
+
+def test_small_bodies_are_sent_uncompressed(client):
+    response = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 201
+    assert "Content-Encoding" not in response.headers
+    assert response.get_json() == {"result": True}
+
+
+def test_matching_etag_answers_304(client):
+    etag = client.get("/records").headers["ETag"]
+    response = client.get("/records", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+    assert client.get("/records", headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_cached_bodies_are_built_once_per_representation(client):
+    first = client.get("/cached", headers={"Accept-Encoding": "gzip"})
+    second = client.get("/cached", headers={"Accept-Encoding": "gzip"})
+    assert first.data == second.data
+    assert first.headers["ETag"] == second.headers["ETag"]
+    assert client.builds == [1]
+    assert client.get("/cached", headers={"If-None-Match": first.headers["ETag"],
+                                          "Accept-Encoding": "gzip"}).status_code == 304
+    assert client.builds == [1]
+    client.get("/cached", headers={"Accept": COLUMNAR_JSON})
+    assert client.builds == [1, 1]
@@ -0,0 +1,83 @@
+"""
+Tests of the local OpenWeatherMap stand-in of owm_standin.py, served on a free local port.
+"""
+import base64
+import io
+import json
+import threading
+
+import httpx
+import pytest
+
+import owm_standin
+from owm_standin import Faults, make_server, png_icon, request_key
+from processingdata import processing_data_now
+
+
+@pytest.fixture
+def standin(tmp_path):
+    servers = []
+
+    def start(**kwargs) -> str:
+        server = make_server(port=0, **kwargs)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_synthesized_weather_is_deterministic_per_city(standin, monkeypatch):
+    # Current weather carries the time of the request, so the two requests must not straddle a second
+    monkeypatch.setattr(owm_standin.time, "time", lambda: 1739847273.0)
+    base_url = standin()
+    first = httpx.get(f"{base_url}/data/2.5/weather", params={"q": "Guangzhou", "appid": "x"}).json()
+    second = httpx.get(f"{base_url}/data/2.5/weather", params={"q": "guangzhou ", "appid": "y"}).json()
+    assert first == second
+    temperature, humidity, description, city, icon_code, icon_url = processing_data_now(first)
+    assert city == "Guangzhou"
+    forecast = httpx.get(f"{base_url}/data/2.5/forecast", params={"q": "Guangzhou", "cnt": 8}).json()
+    assert forecast["cnt"] == len(forecast["list"]) == 8
+
+
+def test_faults_are_injected(standin):
+    base_url = standin(faults=Faults(unknown_cities=["Atlantis"], rate_limit=2))
+    assert httpx.get(f"{base_url}/data/2.5/weather", params={"q": "atlantis"}).status_code == 404
+    assert httpx.get(f"{base_url}/data/2.5/weather", params={"q": "London"}).status_code == 200
+    limited = httpx.get(f"{base_url}/data/2.5/weather", params={"q": "London"})
+    assert limited.status_code == 429
+    assert limited.headers["Retry-After"] == "1"
+
+    faults = httpx.post(f"{base_url}/__standin__/config", content=json.dumps({"error_rate": 1.0, "rate_limit": 0}))
+    assert faults.json()["error_rate"] == 1.0
+    assert httpx.get(f"{base_url}/data/2.5/weather", params={"q": "London"}).status_code == 500
+    stats = httpx.get(f"{base_url}/__standin__/stats").json()
+    assert (stats["not_found"], stats["rate_limited"], stats["errors_injected"]) == (1, 1, 1)
+
+
+def test_recorded_responses_are_replayed(standin, tmp_path):
+    from owm_standin import StandinState
+
+    key = request_key("/data/2.5/weather", {"q": "Guangzhou", "appid": "x", "units": "metric"})
+    recording = {"key": key, "status": 200, "content_type": "application/json",
+                 "body": base64.b64encode(b'{"name": "Recorded"}').decode()}
+    with open(StandinState(Faults())._recording_path(str(tmp_path), key), "w", encoding="utf-8") as file:
+        json.dump(recording, file)
+
+    base_url = standin(replay_dir=str(tmp_path))
+    response = httpx.get(f"{base_url}/data/2.5/weather", params={"q": "GUANGZHOU", "appid": "other", "units": "metric"})
+    assert response.json() == {"name": "Recorded"}
+    assert httpx.get(f"{base_url}/data/2.5/weather", params={"q": "London", "units": "metric"}).json()["name"] == "London"
+    stats = httpx.get(f"{base_url}/__standin__/stats").json()
+    assert (stats["replayed"], stats["synthesized"]) == (1, 1)
+
+
+def test_icons_are_valid_png():
+    from PIL import Image
+
+    icon = Image.open(io.BytesIO(png_icon("10d")))
+    assert icon.size == (50, 50)
+    assert icon.mode == "RGBA"
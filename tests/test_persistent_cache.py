@@ -0,0 +1,35 @@
+"""
+Tests of the memory tier of persistent_cache.py in front of a database shared with other processes.
+"""
+import time
+
+from persistent_cache import PersistentCache
+
+
+def test_fresh_memory_hits_skip_the_database(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    reader, writer = PersistentCache(path, revalidate_after=60), PersistentCache(path)
+    writer.set("key", "first")
+    assert reader.get("key")[1] == "first"
+    writer.set("key", "second")
+    assert reader.get("key")[1] == "first"  # Checked less than a minute ago
+    assert reader.get("key", revalidate=True)[1] == "second"
+
+
+def test_memory_hits_are_checked_after_the_interval(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    reader, writer = PersistentCache(path, revalidate_after=0.05), PersistentCache(path)
+    writer.set("key", "first")
+    assert reader.get("key")[1] == "first"
+    writer.set("key", "second")
+    time.sleep(0.1)
+    assert reader.get("key")[1] == "second"
+
+
+def test_snapshots_too_old_for_the_caller_are_checked(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    reader, writer = PersistentCache(path, revalidate_after=60), PersistentCache(path)
+    writer.set("key", "old", fetched_at=time.time() - 3600)
+    assert reader.get("key", max_age=600) is None
+    writer.set("key", "refreshed")  # Another process refetched it
+    assert reader.get("key", max_age=600)[1] == "refreshed"
@@ -0,0 +1,86 @@
+"""
+Tests of the prerendered pages of prerender.py.
+"""
+import base64
+import os
+import time
+
+import pytest
+
+import getdata
+import prerender
+from prerender import CHART_URL_PREFIX, PrerenderStore
+from providers import FakeWeatherProvider
+
+PNG = b"\x89PNG\r\n\x1a\nnot really a chart"
+PAGE = f'<html><body><img src="data:image/png;base64,{base64.b64encode(PNG).decode()}"></body></html>'
+
+
+def _age(path: str, seconds: float) -> None:
+    then = time.time() - seconds
+    os.utime(path, (then, then))
+
+
+def test_save_moves_inline_charts_to_chart_files(tmp_path):
+    store = PrerenderStore(str(tmp_path), max_age=60)
+    store.save("New York", "metric", PAGE)
+    page = store.load("new york", "metric").decode()
+    assert "data:image/png" not in page
+    name = page.split(CHART_URL_PREFIX)[1].split('"')[0]
+    with open(store.chart_path(name), "rb") as chart:
+        assert chart.read() == PNG
+    assert store.load("New York", "imperial") is None
+
+
+def test_load_ignores_pages_older_than_max_age(tmp_path):
+    store = PrerenderStore(str(tmp_path), max_age=60)
+    store.save("Guangzhou", "metric", PAGE)
+    _age(store.page_path("Guangzhou", "metric"), 120)
+    assert store.load("Guangzhou", "metric") is None
+
+
+def test_collect_garbage_keeps_the_charts_of_saved_pages(tmp_path):
+    store = PrerenderStore(str(tmp_path), max_age=60)
+    store.save("Guangzhou", "metric", PAGE)
+    store.save("London", "metric", "<html></html>")
+    chart = os.path.join(str(tmp_path), "charts", os.listdir(os.path.join(str(tmp_path), "charts"))[0])
+    for path in (store.page_path("Guangzhou", "metric"), store.page_path("London", "metric"), chart):
+        _age(path, 600)
+    store.save("Guangzhou", "metric", PAGE)  # Rewrites the page and touches its chart
+    assert store.collect_garbage() == 1
+    assert os.path.exists(chart)
+    assert store.load("Guangzhou", "metric") is not None
+    assert not os.path.exists(store.page_path("London", "metric"))
+
+
+def test_rendered_page_is_the_full_dashboard_document(monkeypatch, tmp_path):
+    import main_app
+    from history_store import history_store
+    from trend_archive import trend_archive
+
+    monkeypatch.setattr(history_store, "root", "")
+    monkeypatch.setattr(trend_archive, "root", "")
+    monkeypatch.setattr(main_app, "CHART_RENDERER", "client")  # No matplotlib rendering
+    monkeypatch.setattr(prerender, "_app", main_app.create_app())
+    getdata.set_weather_provider(FakeWeatherProvider())
+    try:
+        city_name, units, seconds, error = prerender._render("Guangzhou", "metric", str(tmp_path))
+    finally:
+        getdata.set_weather_provider(None)
+    assert error is None
+    page = PrerenderStore(str(tmp_path)).load("Guangzhou", "metric").decode()
+    assert page.startswith("<!doctype html>")
+    assert "<title>Weather in Guangzhou</title>" in page
+    assert "htmx" in page  # The app's page headers
+    assert main_app.prerender_store.enabled == bool(main_app.prerender_store.directory)
+
+
+@pytest.mark.skipif(prerender.fcntl is None, reason="no file locks")
+def test_only_one_process_holds_the_scheduler_lock(tmp_path):
+    leader = prerender._leader_lock(str(tmp_path))
+    assert leader is not None
+    assert prerender._leader_lock(str(tmp_path)) is None
+    leader.close()
+    follower = prerender._leader_lock(str(tmp_path))
+    assert follower is not None
+    follower.close()
@@ -0,0 +1,46 @@
+"""
+Tests of the five-day forecast processing of processingdata.py.
+"""
+import copy
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import processingdata  # noqa: E402
+from owm_stub import load_fixture, shift_forecast  # noqa: E402
+from processingdata import FiveDayAggregator, forecast_days, processing_data_five_days  # noqa: E402
+
+
+def test_slots_are_grouped_by_local_calendar_day():
+    forecast = load_fixture("forecast_40")  # First slot 03:00 UTC, 11:00 in Guangzhou (UTC+8)
+    days = forecast_days(forecast)
+    assert [date for date, slots in days] == ["2025-02-18", "2025-02-19", "2025-02-20", "2025-02-21", "2025-02-22"]
+    assert [len(slots) for date, slots in days] == [5, 8, 8, 8, 8]
+
+
+def test_shifted_forecast_recomputes_only_the_changed_days(monkeypatch):
+    forecast = load_fixture("forecast_40")
+    aggregated = []
+    original = processingdata._aggregate_day
+    monkeypatch.setattr(processingdata, "_aggregate_day", lambda slots: aggregated.append(slots[0]["dt"]) or original(slots))
+
+    for slots, recomputed in ((1, 1), (5, 1)):
+        aggregator = FiveDayAggregator()
+        aggregator.process("Guangzhou", forecast)
+        aggregated.clear()
+        refreshed = shift_forecast(forecast, slots)
+        result = aggregator.process("Guangzhou", refreshed)
+        # One slot later only the first day lost a slot; five slots later the first day is gone,
+        # the other four are reused and only the new fifth day is aggregated
+        assert len(aggregated) == recomputed
+        assert result == processing_data_five_days(refreshed)
+
+
+def test_unchanged_forecast_is_not_reprocessed(monkeypatch):
+    forecast = load_fixture("forecast_40")
+    aggregator = FiveDayAggregator()
+    first = aggregator.process("Guangzhou", forecast)
+    monkeypatch.setattr(processingdata, "_aggregate_day", None)  # Would fail if called
+    assert aggregator.process("Guangzhou", forecast) is first
+    assert aggregator.process("Guangzhou", copy.deepcopy(forecast)) == first
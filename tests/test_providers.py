@@ -0,0 +1,78 @@
+"""
+Tests of the provider race of providers.py and the cache tier of getdata.py.
+"""
+import time
+from typing import Dict
+
+import pytest
+from starlette.exceptions import HTTPException
+
+from providers import FakeWeatherProvider, RacingProvider, WeatherProvider
+
+
+class MissingProvider(WeatherProvider):
+    """A cache tier with nothing stored."""
+
+    name = "missing"
+
+    def current(self, location: str) -> Dict:
+        raise LookupError(f"No snapshot of {location!r}")
+
+    def forecast(self, location: str, slots: int) -> Dict:
+        raise LookupError(f"No snapshot of {location!r}")
+
+
+class UnknownCityProvider(WeatherProvider):
+    """An upstream that does not know the city."""
+
+    name = "unknown"
+
+    def current(self, location: str) -> Dict:
+        raise HTTPException(status_code=400, detail="OpenWeatherMap API error")
+
+    def forecast(self, location: str, slots: int) -> Dict:
+        raise HTTPException(status_code=400, detail="OpenWeatherMap API error")
+
+
+def test_race_returns_the_first_valid_answer():
+    provider = RacingProvider([MissingProvider(), FakeWeatherProvider()])
+    assert provider.current("Guangzhou")["name"] == "Guangzhou"
+    assert len(provider.forecast("Guangzhou", 8)["list"]) == 8
+
+
+def test_race_raises_the_upstream_error_over_a_cache_miss():
+    provider = RacingProvider([MissingProvider(), UnknownCityProvider()])
+    with pytest.raises(HTTPException) as raised:
+        provider.current("Nowhere")
+    assert raised.value.status_code == 400
+    with pytest.raises(HTTPException):
+        provider.forecast("Nowhere", 8)
+
+
+def test_race_raises_the_cache_miss_when_every_provider_misses():
+    provider = RacingProvider([MissingProvider(), MissingProvider()])
+    with pytest.raises(LookupError):
+        provider.current("Guangzhou")
+
+
+class StoredSnapshots:
+    """A stand-in for the snapshot store of persistent_cache.py holding one snapshot fetched at `fetched_at`."""
+
+    def __init__(self, fetched_at: float) -> None:
+        self.fetched_at = fetched_at
+
+    def get(self, key: str, max_age=None):
+        if max_age is not None and time.time() - self.fetched_at > max_age:
+            return None
+        return self.fetched_at, {"name": "Guangzhou"}
+
+
+def test_cache_provider_marks_snapshots_older_than_the_ttl(monkeypatch):
+    import getdata
+
+    monkeypatch.setattr(getdata, "weather_cache", StoredSnapshots(time.time() - 60))
+    assert getdata.STALE_KEY not in getdata.SnapshotCacheProvider(max_age=3600).current("Guangzhou")
+
+    fetched_at = time.time() - getdata.WEATHER_CACHE_TTL - 60
+    monkeypatch.setattr(getdata, "weather_cache", StoredSnapshots(fetched_at))
+    assert getdata.SnapshotCacheProvider(max_age=3600).current("Guangzhou")[getdata.STALE_KEY] == fetched_at
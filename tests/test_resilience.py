@@ -0,0 +1,42 @@
+"""
+Tests of the circuit breaker and retries of resilience.py.
+"""
+import httpx
+import pytest
+
+import resilience
+from resilience import CircuitBreaker, UpstreamPolicy, UpstreamUnavailable
+
+
+def test_half_open_probe_raising_any_exception_reopens_the_circuit(monkeypatch):
+    policy = UpstreamPolicy("test", deadline=1.0, max_retries=0, hedging=False)
+    policy.breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0)
+    policy.breaker.record_failure()
+    assert policy.breaker.state == CircuitBreaker.OPEN
+
+    def broken(timeout):
+        raise RuntimeError("Not an HTTP error")
+
+    with pytest.raises(RuntimeError):
+        policy.call(broken)
+    assert policy.breaker.state == CircuitBreaker.OPEN
+
+
+def test_rate_limited_attempt_waits_for_retry_after_without_tripping_the_circuit(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(resilience.time, "sleep", sleeps.append)
+    policy = UpstreamPolicy("test", deadline=5.0, max_retries=2, hedging=False)
+    policy.breaker = CircuitBreaker("test", failure_threshold=1)
+    responses = iter([httpx.Response(429, headers={"Retry-After": "2"}), httpx.Response(200)])
+
+    assert policy.call(lambda timeout: next(responses)).status_code == 200
+    assert sleeps == [2.0]
+    assert policy.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_retry_after_beyond_the_deadline_gives_up_at_once(monkeypatch):
+    monkeypatch.setattr(resilience.time, "sleep", pytest.fail)
+    policy = UpstreamPolicy("test", deadline=1.0, max_retries=2, hedging=False)
+    with pytest.raises(UpstreamUnavailable):
+        policy.call(lambda timeout: httpx.Response(429, headers={"Retry-After": "30"}))
+    assert policy.breaker.state == CircuitBreaker.CLOSED
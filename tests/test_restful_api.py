@@ -0,0 +1,98 @@
+"""
+Tests of the weather data records of restful_api.py, shared by worker processes through the persistent cache.
+"""
+import multiprocessing
+
+import pytest
+
+import getdata
+import persistent_cache
+import restful_api
+from providers import FakeWeatherProvider
+
+RECORDS = "/weatherdashboard/api/v1.0/weatherdatas"
+
+
+@pytest.fixture(autouse=True)
+def offline(monkeypatch, tmp_path):
+    from history_store import history_store
+    from trend_archive import trend_archive
+
+    monkeypatch.setattr(history_store, "root", "")
+    monkeypatch.setattr(trend_archive, "root", "")
+    monkeypatch.setattr(restful_api, "weather_cache", persistent_cache.PersistentCache(str(tmp_path / "cache.sqlite3")))
+    getdata.set_weather_provider(FakeWeatherProvider())
+    yield
+    getdata.set_weather_provider(None)
+
+
+def _create_records(path: str, count: int, start, results) -> None:
+    # A worker process: its own database connection and API over the shared database
+    restful_api.weather_cache = persistent_cache.PersistentCache(path)
+    client = restful_api.create_api("Guangzhou").test_client()
+    start.wait()
+    ids = [client.post(RECORDS, json={"title": "created"}).get_json()["weatherdata"]["id"] for _ in range(count)]
+    results.put(ids)
+
+
+def test_workers_creating_records_get_distinct_ids(tmp_path):
+    path = str(tmp_path / "shared.sqlite3")
+    context = multiprocessing.get_context("fork")
+    start, results = context.Event(), context.Queue()
+    workers = [context.Process(target=_create_records, args=(path, 20, start, results)) for _ in range(2)]
+    for worker in workers:
+        worker.start()
+    start.set()
+    ids = results.get(timeout=60) + results.get(timeout=60)
+    for worker in workers:
+        worker.join()
+
+    assert sorted(ids) == list(range(4, 44))
+    restful_api.weather_cache = persistent_cache.PersistentCache(path)
+    records = restful_api.create_api("Guangzhou").test_client().get(RECORDS).get_json()["weatherdatas"]
+    assert len(records) == 43
+
+
+def test_update_does_not_mutate_the_cached_records():
+    client = restful_api.create_api("Guangzhou").test_client()
+    created = client.post(RECORDS, json={"title": "before"}).get_json()["weatherdata"]
+    cached = restful_api.weather_cache.get(f"weatherdatas|guangzhou")[1]
+
+    assert client.put(f"{RECORDS}/{created['id']}", json={"title": "after"}).status_code == 200
+    assert [record["title"] for record in cached if record["id"] == created["id"]] == ["before"]
+    assert client.get(f"{RECORDS}/{created['id']}").get_json()["weatherdata"]["title"] == "after"
+    assert client.delete(f"{RECORDS}/{created['id']}").status_code == 200
+    assert client.delete(f"{RECORDS}/{created['id']}").status_code == 404
+
+
+EXPORT = "/weatherdashboard/api/v1.0/export"
+
+
+def test_export_streams_the_rows_of_every_city():
+    client = restful_api.create_api("Guangzhou").test_client()
+    response = client.get(EXPORT, query_string={"cities": "Guangzhou, London", "dataset": "now", "format": "csv"})
+    assert response.status_code == 200
+    lines = response.get_data(as_text=True).splitlines()
+    assert lines[0].startswith("city,observed_at,temperature")
+    assert [line.split(",")[0] for line in lines[1:]] == ["Guangzhou", "London"]
+
+
+@pytest.mark.parametrize("query", [{}, {"cities": ""}, {"cities": " , "}])
+def test_export_without_cities_is_rejected(query):
+    client = restful_api.create_api("Guangzhou").test_client()
+    assert client.get(EXPORT, query_string=query).status_code == 400
+    assert client.post(EXPORT, json={"cities": []}).status_code == 400
+
+
+def test_large_exports_need_the_admin_token(monkeypatch):
+    from profiling import PROFILE_HEADER, request_profiler
+
+    monkeypatch.setattr(restful_api, "EXPORT_MAX_CITIES", 2)
+    monkeypatch.setattr(request_profiler, "admin_token", "secret")
+    client = restful_api.create_api("Guangzhou").test_client()
+    cities = {"cities": ["Guangzhou", "London", "Paris"]}
+    assert client.post(EXPORT, json=cities).status_code == 403
+    assert client.post(EXPORT, json=cities, headers={PROFILE_HEADER: "wrong"}).status_code == 403
+    response = client.post(EXPORT, json=cities, headers={PROFILE_HEADER: "secret"})
+    assert response.status_code == 200
+    assert len(response.get_data(as_text=True).splitlines()) == 15  # Five days of three cities
@@ -0,0 +1,127 @@
+"""
+Tests of the process and host tiers of shared_cache.py and of the single-flight computation of TieredCache.
+"""
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from shared_cache import MemoryHostCache, ProcessCache, SQLiteHostCache, TieredCache, make_host_cache
+
+
+class RejectingProcessCache(ProcessCache):
+    # A process tier whose admission policy turns every new key away
+    def set(self, key, value, ttl, expires_at=None):
+        pass
+
+
+def _concurrent_calls(cache: TieredCache, compute, callers: int = 8) -> list:
+    barrier = threading.Barrier(callers)
+    results = []
+
+    def call() -> None:
+        barrier.wait()
+        try:
+            results.append(cache.get_or_set("key", compute))
+        except Exception as error:
+            results.append(error)
+
+    threads = [threading.Thread(target=call) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    return results
+
+
+def _slow(value, calls: list):
+    def compute():
+        calls.append(1)
+        time.sleep(0.2)  # Long enough for every caller to miss and wait
+        if isinstance(value, Exception):
+            raise value
+        return value
+    return compute
+
+
+@pytest.mark.parametrize("process", [ProcessCache(64), RejectingProcessCache(64)], ids=["admitted", "rejected"])
+def test_concurrent_misses_compute_once(process):
+    cache = TieredCache("test", ttl=60, process=process)
+    calls = []
+    assert _concurrent_calls(cache, _slow("value", calls)) == ["value"] * 8
+    assert len(calls) == 1
+    assert cache._flights == {}
+
+
+def test_waiters_get_the_exception_of_the_computation():
+    cache = TieredCache("test", ttl=60, process=ProcessCache(64))
+    calls = []
+    results = _concurrent_calls(cache, _slow(RuntimeError("failed"), calls))
+    assert len(calls) == 1
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert cache._flights == {}
+    assert cache.get_or_set("key", lambda: "retried") == "retried"
+
+
+def _worker_cache(path: str) -> TieredCache:
+    # The chart cache of one worker process: its own process tier and database connection
+    return TieredCache("test", ttl=60, process=ProcessCache(64), host=SQLiteHostCache(path))
+
+
+def test_value_computed_by_one_worker_is_reused_by_another(tmp_path):
+    path = str(tmp_path / "shared.sqlite3")
+    first, second = _worker_cache(path), _worker_cache(path)
+    assert first.get_or_set("chart|wind_rose", lambda: {"png": "iVBORw0KGgo"}) == {"png": "iVBORw0KGgo"}
+    calls = []
+    assert second.get_or_set("chart|wind_rose", lambda: calls.append(1)) == {"png": "iVBORw0KGgo"}
+    assert calls == []
+    assert second.process.get("chart|wind_rose") == {"png": "iVBORw0KGgo"}
+
+
+def test_host_hit_expires_with_the_host_entry(tmp_path):
+    path = str(tmp_path / "shared.sqlite3")
+    first, second = _worker_cache(path), _worker_cache(path)
+    first.set("key", "value", ttl=0.1)
+    assert second.get("key") == "value"
+    time.sleep(0.15)
+    assert second.process.get("key") is None
+    assert second.get("key") is None
+
+
+def test_delete_removes_the_key_from_every_tier(tmp_path):
+    path = str(tmp_path / "shared.sqlite3")
+    first, second = _worker_cache(path), _worker_cache(path)
+    first.set("key", "value")
+    first.delete("key")
+    assert first.get("key") is None
+    assert second.get("key") is None
+
+
+def test_sqlite_tier_purges_expired_rows(tmp_path, monkeypatch):
+    path = str(tmp_path / "shared.sqlite3")
+    monkeypatch.setattr(SQLiteHostCache, "PURGE_EVERY", 2)
+    cache = SQLiteHostCache(path)
+    cache.set("expired", "value", ttl=-1)
+    assert cache.get_entry("expired") is None
+    cache.set("fresh", "value", ttl=60)
+    with sqlite3.connect(path) as connection:
+        assert connection.execute("SELECT key FROM shared_entries").fetchall() == [("fresh",)]
+    cache.close()
+
+
+def test_memory_tier_copies_values_and_expires_them():
+    cache = MemoryHostCache()
+    value = {"speeds": (1, 2)}
+    cache.set("key", value, ttl=60)
+    value["speeds"] = ()
+    assert cache.get_entry("key")[1] == {"speeds": [1, 2]}
+    cache.set("key", "value", ttl=-1)
+    assert cache.get_entry("key") is None
+
+
+def test_make_host_cache_follows_the_backend_setting(tmp_path):
+    assert isinstance(make_host_cache("sqlite", str(tmp_path / "shared.sqlite3")), SQLiteHostCache)
+    assert make_host_cache("sqlite", "") is None
+    assert isinstance(make_host_cache("memory"), MemoryHostCache)
+    assert make_host_cache("none") is None
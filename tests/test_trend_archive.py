@@ -0,0 +1,44 @@
+"""
+Tests of the memory-mapped trend archive of trend_archive.py.
+"""
+import pytest
+
+from trend_archive import TrendArchive
+
+
+def test_memory_maps_are_bounded(tmp_path):
+    archive = TrendArchive(str(tmp_path), max_maps=4)
+    cities = [f"City {index}" for index in range(5)]
+    for city in cities:
+        archive.append(city, 1739843673, 17.5, 64)
+        archive.append(city, 1739847273, 18.5, 60)
+    for city in cities:
+        times, values = archive.read(city, 1739800000, 1739900000)
+        assert times.tolist() == [1739843673, 1739847273]
+        assert values["temperature"].tolist() == [17.5, 18.5]
+    assert len(archive._maps) == 4
+    # The most recently read maps are kept
+    assert archive._path(cities[-1], "temperature") in archive._maps
+
+
+def test_city_names_stay_inside_the_root(tmp_path):
+    root = tmp_path / "archive"
+    archive = TrendArchive(str(root))
+    for city in ("../escaped", "..\\escaped", "/tmp/escaped"):
+        archive.append(city, 1739843673, 17.5, 64)
+        assert archive.read(city, 1739800000, 1739900000)[0].tolist() == [1739843673]
+    for city in ("..", ".", ""):
+        with pytest.raises(ValueError):
+            archive.append(city, 1739843673, 17.5, 64)
+    assert sorted(path.parent.parent for path in root.rglob("time.bin")) == [root] * 3
+    assert [path.name for path in tmp_path.iterdir()] == ["archive"]
+
+
+def test_trend_page_refuses_parent_directory(monkeypatch, tmp_path):
+    import main_app
+    import trend_archive
+    from starlette.testclient import TestClient
+
+    monkeypatch.setattr(trend_archive.trend_archive, "root", str(tmp_path))
+    response = TestClient(main_app.create_app()).get("/trend", params={"city_name": ".."})
+    assert response.status_code == 400
@@ -0,0 +1,69 @@
+"""
+Tests of the unit conversions of units.py and of the `units` parameter of the API records.
+"""
+import numpy as np
+import pytest
+
+import getdata
+import persistent_cache
+import restful_api
+from providers import FakeWeatherProvider
+from units import convert, convert_pressure, convert_speed, convert_temperature, localize, normalize_units
+
+RECORDS = "/weatherdashboard/api/v1.0/weatherdatas"
+
+
+def test_normalize_units():
+    assert normalize_units(" Imperial ") == "imperial"
+    assert normalize_units(None) == normalize_units("") == "metric"
+    with pytest.raises(ValueError):
+        normalize_units("kelvin")
+
+
+def test_conversions_keep_the_type_of_their_input():
+    assert convert_temperature(20.0, "imperial") == 68.0
+    assert convert_temperature([0, -40], "imperial") == [32.0, -40.0]
+    assert convert_temperature((0,), "standard") == [273.15]
+    converted = convert_speed(np.array([1.0, 10.0]), "imperial")
+    assert isinstance(converted, np.ndarray)
+    assert converted.tolist() == [2.24, 22.37]
+    assert convert_pressure(1013.25, "imperial") == 29.92
+
+
+def test_canonical_and_unconverted_quantities_are_returned_unchanged():
+    values = [1.0, 2.0]
+    assert convert(values, "temperature", "metric") is values
+    assert convert(values, "speed", "standard") is values
+
+
+def test_localize_converts_only_numeric_quantity_fields():
+    data = {"city": "Guangzhou", "temperature": 20.0, "wind_speeds": [1.0, 10.0], "daily_highs": "n/a",
+            "pressure": True, "humidity": 64}
+    assert localize(data, "imperial") == {"city": "Guangzhou", "temperature": 68.0, "wind_speeds": [2.24, 22.37],
+                                          "daily_highs": "n/a", "pressure": True, "humidity": 64}
+    assert data["temperature"] == 20.0
+    assert localize(data, "metric") is data
+
+
+def test_api_records_are_converted_on_request(monkeypatch, tmp_path):
+    from history_store import history_store
+    from trend_archive import trend_archive
+
+    monkeypatch.setattr(history_store, "root", "")
+    monkeypatch.setattr(trend_archive, "root", "")
+    monkeypatch.setattr(restful_api, "weather_cache", persistent_cache.PersistentCache(str(tmp_path / "cache.sqlite3")))
+    provider = FakeWeatherProvider()
+    getdata.set_weather_provider(provider)
+    try:
+        client = restful_api.create_api("Guangzhou").test_client()
+        metric = client.get(f"{RECORDS}/1").get_json()
+        calls = provider.calls
+        imperial = client.get(f"{RECORDS}/1", query_string={"units": "imperial"}).get_json()
+        unknown = client.get(f"{RECORDS}/1", query_string={"units": "kelvin"})
+    finally:
+        getdata.set_weather_provider(None)
+    assert metric["units"] == "metric" and imperial["units"] == "imperial"
+    temperature = metric["weatherdata"]["data"]["temperature"]
+    assert imperial["weatherdata"]["data"]["temperature"] == round(temperature * 1.8 + 32, 2)
+    assert provider.calls == calls  # Converted locally, without another upstream request
+    assert unknown.status_code == 400
@@ -0,0 +1,25 @@
+"""
+Tests of the chart cache decorator of visualization.py.
+"""
+import pytest
+
+pytest.importorskip("matplotlib")
+
+import visualization  # noqa: E402
+from shared_cache import ProcessCache, TieredCache  # noqa: E402
+
+
+def test_equivalent_calls_share_one_cached_chart(monkeypatch):
+    monkeypatch.setattr(visualization, "chart_cache", TieredCache("test", ttl=60, process=ProcessCache(64)))
+    calls = []
+
+    @visualization.cached_chart("test")
+    def chart(temperature, units="metric"):
+        calls.append((temperature, units))
+        return f"{temperature} {units}"
+
+    assert chart(21.5) == chart(21.5, "metric") == chart(21.5, units="metric") == chart(temperature=21.5) == "21.5 metric"
+    assert calls == [(21.5, "metric")]
+    assert chart.cached(temperature=21.5, units="metric") == "21.5 metric"
+    assert chart(21.5, units="imperial") == "21.5 imperial"
+    assert len(calls) == 2
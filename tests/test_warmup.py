@@ -0,0 +1,45 @@
+"""
+Tests of the chart warm-up of warmup.py and the /ready route it drives.
+"""
+import threading
+
+import pytest
+from starlette.testclient import TestClient
+
+import warmup
+from warmup import ChartWarmUp
+
+
+def test_ready_answers_503_while_the_warm_up_runs(monkeypatch):
+    import main_app
+
+    release = threading.Event()
+    monkeypatch.setattr(warmup, "_synthetic_charts", lambda: [("blocked", lambda: release.wait(10), ())])
+    monkeypatch.setattr(main_app, "chart_warm_up", ChartWarmUp())
+    monkeypatch.setattr(main_app, "CHART_RENDERER", "image")
+    monkeypatch.setattr(main_app, "WARM_UP_CHARTS", 1)
+    with TestClient(main_app.create_app()) as client:  # Runs the startup hooks
+        response = client.get("/ready")
+        assert response.status_code == 503
+        assert response.json()["state"] in ("pending", "running")
+        release.set()
+        for thread in threading.enumerate():
+            if thread.name == "chart-warm-up":
+                thread.join(10)
+        response = client.get("/ready")
+        assert response.status_code == 200
+        assert "blocked" in response.json()["charts"]
+
+
+def test_forecast_table_warm_up_sends_no_icon_request(monkeypatch):
+    pytest.importorskip("matplotlib")
+    import visualization
+
+    def no_request(icon_code):
+        raise AssertionError(f"Icon {icon_code} requested during warm-up")
+
+    monkeypatch.setattr(visualization, "get_weather_icon", no_request)
+    monkeypatch.setattr(warmup, "FORECAST_TABLE_RENDERER", "image")
+    charts = {name: (function, arguments) for name, function, arguments in warmup._synthetic_charts()}
+    function, arguments = charts["forecast_table"]
+    assert function.uncached(*arguments)
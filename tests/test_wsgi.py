@@ -0,0 +1,57 @@
+"""
+Tests of the production entry point of wsgi.py and of the gunicorn settings loading it.
+"""
+import os
+import runpy
+
+import pytest
+from flask import Flask
+
+import config
+import getdata
+import persistent_cache
+import wsgi
+from providers import FakeWeatherProvider
+
+GUNICORN_CONF = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "gunicorn.conf.py")
+
+
+def test_create_app_needs_a_city(monkeypatch):
+    monkeypatch.setattr(wsgi, "WEATHER_API_CITY", " ")
+    with pytest.raises(RuntimeError):
+        wsgi.create_app()
+
+
+def test_gunicorn_builds_the_app_in_each_worker(monkeypatch):
+    from history_store import history_store
+    from trend_archive import trend_archive
+
+    gunicorn_util = pytest.importorskip("gunicorn.util")
+    monkeypatch.setattr(wsgi, "WEATHER_API_CITY", "Guangzhou")
+    monkeypatch.setattr(history_store, "root", "")
+    monkeypatch.setattr(trend_archive, "root", "")
+    settings = runpy.run_path(GUNICORN_CONF)
+    assert settings["wsgi_app"] == "wsgi:create_app()"
+    assert settings["preload_app"] is False
+    assert settings["worker_class"] == "gthread"
+    assert (settings["bind"], settings["workers"], settings["threads"], settings["graceful_timeout"]) == \
+        (config.API_BIND, config.API_WORKERS, config.API_THREADS, config.API_GRACEFUL_TIMEOUT)
+    getdata.set_weather_provider(FakeWeatherProvider())
+    try:
+        app = gunicorn_util.import_app(settings["wsgi_app"])
+        assert isinstance(app, Flask)
+        assert app.test_client().get("/metrics").status_code == 200
+    finally:
+        getdata.set_weather_provider(None)
+
+
+def test_worker_exit_closes_the_cache_connection(monkeypatch):
+    closed = []
+
+    class Cache:
+        def close(self):
+            closed.append(True)
+
+    monkeypatch.setattr(persistent_cache, "weather_cache", Cache())
+    runpy.run_path(GUNICORN_CONF)["worker_exit"](None, None)
+    assert closed == [True]
@@ -0,0 +1,158 @@
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterator, Tuple
+from urllib.parse import quote
+
+import numpy as np
+
+from config import TREND_ARCHIVE_DIR, TREND_ARCHIVE_MAPS
+from negative_cache import NegativeCache
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are only serialized within one process
+    fcntl = None  # type: ignore[assignment]
+
+# One raw little-endian file per column; `time` (Unix seconds) is the index the other columns are aligned with
+COLUMNS: Dict[str, np.dtype] = {
+    "time": np.dtype("<i8"),
+    "temperature": np.dtype("<f4"),
+    "humidity": np.dtype("<f4"),
+}
+
+
+class TrendArchive:
+    """
+    A per-city archive of observations stored as fixed-width columns and read through memory maps.
+
+    Each city has one file per column (`<root>/<city>/<column>.bin`). Appends write
+    the value columns first and the time index last, so readers only ever see rows
+    whose values are complete. Reads map the files read-only and return slices of
+    the maps, so worker processes share the data through the OS page cache and no
+    history is copied into Python objects. The `max_maps` most recently read column
+    maps are kept open; an evicted map is unmapped once the slices handed out from it
+    are released.
+
+    Args:
+        root (str): The root directory of the archive. An empty string disables the archive.
+        max_maps (int): The number of column memory maps kept open.
+
+    Usage Example:
+        >>> archive = TrendArchive('weather_archive')
+        >>> archive.append('Guangzhou', 1739843673, 17.64, 64)
+        >>> times, values = archive.read('Guangzhou', 1739800000, 1739900000)
+        >>> values['temperature']
+        memmap([17.64], dtype=float32)
+    """
+
+    def __init__(self, root: str = TREND_ARCHIVE_DIR, max_maps: int = TREND_ARCHIVE_MAPS) -> None:
+        self.root = root
+        self.max_maps = max_maps
+        self._lock = threading.Lock()
+        self._maps: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._maps_lock = threading.Lock()
+
+    def _path(self, city: str, name: str) -> str:
+        # Percent-encoded like the pages of prerender.py: separators are encoded, and "." or ".." refused,
+        # so that no city name reaches outside the root
+        city_dir = quote(NegativeCache.normalize(city).replace(" ", "_"), safe="")
+        path = os.path.join(self.root, city_dir)
+        if city_dir in ("", ".", "..") or os.path.dirname(os.path.abspath(path)) != os.path.abspath(self.root):
+            raise ValueError(f"Invalid city name: {city!r}")
+        return os.path.join(path, name if "." in name else f"{name}.bin")
+
+    def _map(self, city: str, column: str, rows: int) -> np.ndarray:
+        # Re-map only when the file has grown past the rows mapped so far
+        path = self._path(city, column)
+        with self._maps_lock:
+            mapped = self._maps.get(path)
+            if mapped is not None:
+                self._maps.move_to_end(path)
+        if mapped is None or len(mapped) < rows:
+            mapped = np.memmap(path, dtype=COLUMNS[column], mode="r")
+            with self._maps_lock:
+                self._maps[path] = mapped
+                self._maps.move_to_end(path)
+                while len(self._maps) > self.max_maps:
+                    # Dropping the last reference of the archive closes the map once its slices are released
+                    self._maps.popitem(last=False)
+        return mapped[:rows]
+
+    @contextmanager
+    def _city_lock(self, city: str) -> Iterator[None]:
+        # Serialize appends across threads and, where supported, across worker processes
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self._path(city, "append.lock"), "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _rows(self, city: str) -> int:
+        try:
+            return os.path.getsize(self._path(city, "time")) // COLUMNS["time"].itemsize
+        except FileNotFoundError:
+            return 0
+
+    def append(self, city: str, observed_at: int, temperature: float, humidity: float) -> None:
+        """
+        Appends one observation, skipping observations that are not newer than the last one.
+
+        Args:
+            city (str): The city name.
+            observed_at (int): The observation time in Unix seconds.
+            temperature (float): The temperature in degrees Celsius.
+            humidity (float): The humidity percentage.
+
+        Raises:
+            ValueError: If the city name is not a valid directory name.
+        """
+        if not self.root:
+            return
+        os.makedirs(os.path.dirname(self._path(city, "time")), exist_ok=True)
+        with self._city_lock(city):
+            rows = self._rows(city)
+            if rows and self._map(city, "time", rows)[-1] >= observed_at:
+                return
+            for column, value in (("temperature", temperature), ("humidity", humidity), ("time", observed_at)):
+                with open(self._path(city, column), "r+b" if rows else "wb") as file:
+                    # Truncate any partial row left behind by an interrupted append
+                    file.truncate(rows * COLUMNS[column].itemsize)
+                    file.seek(0, os.SEEK_END)
+                    file.write(np.asarray([value], dtype=COLUMNS[column]).tobytes())
+
+    def read(self, city: str, start: int, end: int) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """
+        Returns the observations of a city within a time range as views of the memory maps.
+
+        Args:
+            city (str): The city name.
+            start (int): The start of the range in Unix seconds, inclusive.
+            end (int): The end of the range in Unix seconds, exclusive.
+
+        Returns:
+            tuple: The observation times and a dictionary of value columns, all zero-copy slices.
+
+        Raises:
+            ValueError: If the city name is not a valid directory name.
+        """
+        rows = self._rows(city) if self.root else 0
+        if rows == 0:
+            empty = {column: np.empty(0, dtype=dtype) for column, dtype in COLUMNS.items() if column != "time"}
+            return np.empty(0, dtype=COLUMNS["time"]), empty
+        times = self._map(city, "time", rows)
+        low, high = np.searchsorted(times, [start, end])
+        values = {
+            column: self._map(city, column, rows)[low:high] for column in COLUMNS if column != "time"
+        }
+        return times[low:high], values
+
+
+# Archive shared by the dashboard and the RESTful API
+trend_archive = TrendArchive()
@@ -0,0 +1,140 @@
+from typing import Any, Dict, Optional
+
+from config import DEFAULT_UNITS
+
+# Unit system every OpenWeatherMap request asks for. Other systems are converted locally, so all
+# views of a city share one upstream fetch and one snapshot cache entry.
+CANONICAL_UNITS = "metric"
+
+# Display units of each unit system, named as in the OpenWeatherMap API
+UNIT_SYSTEMS: Dict[str, Dict[str, str]] = {
+    "metric": {"temperature": "°C", "speed": "m/s", "pressure": "hPa"},
+    "imperial": {"temperature": "°F", "speed": "mph", "pressure": "inHg"},
+    "standard": {"temperature": "K", "speed": "m/s", "pressure": "hPa"},
+}
+
+# Linear conversions (scale, offset) from the canonical units; missing pairs are the identity
+_CONVERSIONS = {
+    ("temperature", "imperial"): (1.8, 32.0),
+    ("temperature", "standard"): (1.0, 273.15),
+    ("speed", "imperial"): (2.2369362920544, 0.0),  # m/s to mph
+    ("pressure", "imperial"): (0.029529983071445, 0.0),  # hPa to inHg
+}
+
+# Fields of the processed data sets that hold a physical quantity
+FIELD_QUANTITIES = {
+    "temperature": "temperature",
+    "daily_highs": "temperature",
+    "daily_lows": "temperature",
+    "daily_averages": "temperature",
+    "daily_high": "temperature",
+    "daily_low": "temperature",
+    "daily_average": "temperature",
+    "wind_speeds": "speed",
+    "wind_speed": "speed",
+    "pressure": "pressure",
+}
+
+
+def normalize_units(units: Optional[str]) -> str:
+    """
+    Validates a unit system name, defaulting to DEFAULT_UNITS when it is empty.
+
+    Args:
+        units (str, optional): "metric", "imperial" or "standard", in any case.
+
+    Returns:
+        str: The unit system name in lower case.
+
+    Raises:
+        ValueError: If the unit system is unknown.
+
+    Usage Example:
+        >>> normalize_units('Imperial')
+        'imperial'
+    """
+    name = (units or DEFAULT_UNITS).strip().lower()
+    if name not in UNIT_SYSTEMS:
+        raise ValueError(f"Unknown unit system {units!r}; expected one of {', '.join(UNIT_SYSTEMS)}")
+    return name
+
+
+def unit_symbol(quantity: str, units: str) -> str:
+    """
+    Returns the display symbol of a quantity, for example unit_symbol('temperature', 'imperial') == '°F'.
+    """
+    return UNIT_SYSTEMS[units][quantity]
+
+
+def convert(values: Any, quantity: str, units: str) -> Any:
+    """
+    Converts canonical (metric) values of a quantity to a unit system in one vectorized step.
+
+    Converted values are rounded to two decimals, like the values OpenWeatherMap sends.
+    Values in the canonical units are returned unchanged.
+
+    Args:
+        values: A number, a list or tuple of numbers, or a NumPy array.
+        quantity (str): "temperature", "speed" or "pressure".
+        units (str): The target unit system.
+
+    Returns:
+        The converted values: a float for a number, a list for a list or tuple, an array for an array.
+
+    Usage Example:
+        >>> convert([17.9, 20.09], 'temperature', 'imperial')
+        [64.22, 68.16]
+    """
+    scale, offset = _CONVERSIONS.get((quantity, units), (1.0, 0.0))
+    if scale == 1.0 and offset == 0.0:
+        return values
+    import numpy as np  # Imported on first conversion so that the dashboard starts without numpy
+
+    converted = np.round(np.asarray(values, dtype=np.float64) * scale + offset, 2)
+    if isinstance(values, (list, tuple)):
+        return converted.tolist()
+    if converted.ndim == 0:
+        return float(converted)
+    return converted
+
+
+def convert_temperature(values: Any, units: str) -> Any:
+    return convert(values, "temperature", units)
+
+
+def convert_speed(values: Any, units: str) -> Any:
+    return convert(values, "speed", units)
+
+
+def convert_pressure(values: Any, units: str) -> Any:
+    return convert(values, "pressure", units)
+
+
+def localize(data: Dict[str, Any], units: str) -> Dict[str, Any]:
+    """
+    Converts the quantity fields of a processed data set, such as the API's five-day data.
+
+    Fields that are not in FIELD_QUANTITIES, or that hold non-numeric values, are copied unchanged.
+
+    Args:
+        data (dict): Field names mapped to values in the canonical units.
+        units (str): The target unit system.
+
+    Returns:
+        dict: A copy of `data` with its temperatures, wind speeds and pressures converted.
+
+    Usage Example:
+        >>> localize({'city': 'Guangzhou', 'wind_speeds': [3.35, 3.09]}, 'imperial')
+        {'city': 'Guangzhou', 'wind_speeds': [7.49, 6.91]}
+    """
+    if units == CANONICAL_UNITS:
+        return data
+    localized = dict(data)
+    for field, quantity in FIELD_QUANTITIES.items():
+        value = localized.get(field)
+        if isinstance(value, (int, float, list)) and not isinstance(value, bool):
+            try:
+                localized[field] = convert(value, quantity, units)
+            except (TypeError, ValueError):
+                pass  # A record created through the API with a field of the same name but other contents
+    return localized
@@ -1,13 +1,89 @@
 import matplotlib.pyplot as plt
 import base64
-import io
+import functools
+import hashlib
+import inspect
+import json
 from io import BytesIO
 import numpy as np
 from PIL import Image
 
 from get_icon import get_weather_icon
+from metrics import chart_render_seconds, rendered_bytes, stage_seconds
+from shared_cache import chart_cache
+from units import CANONICAL_UNITS, convert_temperature, unit_symbol
 
-def create_temperature_progressbar(temperature: float) -> str:
+
+def encode_figure(fig, chart: str, **savefig_kwargs) -> str:
+    """
+    Encodes a figure as a base64 PNG string and closes it.
+
+    The PNG encoding and base64 stages are timed separately in weather_stage_seconds,
+    and the PNG size is added to weather_rendered_bytes_total.
+
+    Args:
+    - fig: The matplotlib figure to encode.
+    - chart (str): The chart name used as the metric label.
+    - **savefig_kwargs: Extra keyword arguments for `Figure.savefig`, such as bbox_inches.
+
+    Returns:
+    - str: A base64 encoded string of the PNG image.
+    """
+    buffer = BytesIO()
+    with stage_seconds.time(stage="png_encode", chart=chart):
+        fig.savefig(buffer, format='png', **savefig_kwargs)
+    plt.close(fig)
+    png = buffer.getvalue()
+    rendered_bytes.inc(len(png), chart=chart)
+    with stage_seconds.time(stage="base64", chart=chart):
+        return base64.b64encode(png).decode()
+
+
+def cached_chart(chart: str):
+    """
+    Decorator reusing the rendered image of a chart function for identical inputs.
+
+    The images are kept in the tiered chart cache, so a chart rendered by one worker
+    process is served by every worker of the host. The undecorated function stays
+    available as the `uncached` attribute, and the `cached` attribute only looks the
+    image up, returning None instead of rendering it.
+    """
+    def decorator(function):
+        signature = inspect.signature(function)
+
+        def key_of(args, kwargs) -> str:
+            # Keyed by parameter name with the defaults filled in, so that positional, keyword
+            # and omitted default arguments of the same inputs share one image
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            inputs = json.dumps(bound.arguments, sort_keys=True, default=str)
+            return f"chart|{chart}|{hashlib.sha256(inputs.encode()).hexdigest()}"
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            return chart_cache.get_or_set(key_of(args, kwargs), lambda: function(*args, **kwargs))
+        wrapper.uncached = function  # type: ignore[attr-defined]
+        wrapper.cached = lambda *args, **kwargs: chart_cache.get(key_of(args, kwargs))  # type: ignore[attr-defined]
+        return wrapper
+    return decorator
+
+
+def timed_chart(chart: str):
+    """
+    Decorator recording the total render time of a chart function in weather_chart_render_seconds.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with chart_render_seconds.time(chart=chart):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@cached_chart('temperature_progressbar')
+@timed_chart('temperature_progressbar')
+def create_temperature_progressbar(temperature: float, units: str = CANONICAL_UNITS) -> str:
     """
     Creates a temperature progress bar image as a base64 encoded string.
 
@@ -17,7 +93,8 @@ def create_temperature_progressbar(temperature: float) -> str:
     and maximum temperature limits.
 
     Args:
-    - temperature (float): The temperature value to be represented on the progress bar.
+    - temperature (float): The temperature value to be represented on the progress bar, in `units`.
+    - units (str): The unit system of the temperature; the range and labels are shown in it.
 
     Returns:
     - str: A base64 encoded string of the progress bar image.
@@ -29,17 +106,23 @@ def create_temperature_progressbar(temperature: float) -> str:
         >>> create_temperature_progressbar(11.0)  
         It should return a Base64 encoding of a string type (specific example results are not displayed because the image converted to encoding is too long) 
     """
+    fig = plt.figure(figsize=(6, 0.5), dpi=100)
+    draw_temperature_progressbar(fig, temperature, units)
+    return encode_figure(fig, 'temperature_progressbar', bbox_inches='tight', pad_inches=0.2)
+
 
-    length = 6
-    width = 0.5
-    maxtemp = 50
-    mintemp = -30
+def draw_temperature_progressbar(fig, temperature: float, units: str = CANONICAL_UNITS) -> None:
+    """
+    Draws the temperature progress bar of `create_temperature_progressbar` into a figure or subfigure.
+    """
+    symbol = unit_symbol('temperature', units)
+    mintemp, zerotemp, maxtemp = (round(value) for value in convert_temperature([-30, 0, 50], units))
     percentage = (temperature - mintemp) / (maxtemp - mintemp) * 100
 
     # Calculate the position of 0C within the range of -30 to 50
-    zeroposition = (0 - mintemp) / (maxtemp - mintemp) * 100  # 37.5%
+    zeroposition = (zerotemp - mintemp) / (maxtemp - mintemp) * 100  # 37.5%
 
-    fig, ax = plt.subplots(figsize=(length, width), dpi=100)
+    ax = fig.subplots()
     ax.set_xlim(0, 100)
     ax.set_ylim(-1, 1)
     ax.axis('off')
@@ -50,19 +133,16 @@ def create_temperature_progressbar(temperature: float) -> str:
 
     # Add a marker for 0C
     ax.axvline(zeroposition, ymin=0.4, ymax=0.6, color='white', linestyle='-', linewidth=2)
-    ax.text(zeroposition, -1.8, '0°C', ha='center', va='top', fontsize=8, color='#666666')
+    ax.text(zeroposition, -1.8, f'{zerotemp}{symbol}', ha='center', va='top', fontsize=8, color='#666666')
 
     # Label the minimum and maximum temperature limits and the current temperature
-    ax.text(0, -1.8, f'{mintemp}°C', ha='left', va='top', fontsize=6, color='#666666')
-    ax.text(100, -1.8, f'{maxtemp}°C', ha='right', va='top', fontsize=6, color='#666666')
-    ax.text(percentage, 1.5, f'{temperature:.1f}°C', ha='center', va='bottom', fontsize=8, color='#2196F3', fontweight='bold')
-
-    buffer = BytesIO()
-    fig.savefig(buffer, format='png', bbox_inches='tight', pad_inches=0.2)
-    plt.close()
-    return base64.b64encode(buffer.getvalue()).decode()
+    ax.text(0, -1.8, f'{mintemp}{symbol}', ha='left', va='top', fontsize=6, color='#666666')
+    ax.text(100, -1.8, f'{maxtemp}{symbol}', ha='right', va='top', fontsize=6, color='#666666')
+    ax.text(percentage, 1.5, f'{temperature:.1f}{symbol}', ha='center', va='bottom', fontsize=8, color='#2196F3', fontweight='bold')
 
 
+@cached_chart('humidity_gauge')
+@timed_chart('humidity_gauge')
 def create_humidity_gauge(humidity: float) -> str:
     
     """
@@ -88,7 +168,16 @@ def create_humidity_gauge(humidity: float) -> str:
         It should return a Base64 encoding of a string type (specific example results are not displayed because the image converted to encoding is too long) 
 
     """
-    fig, ax = plt.subplots(figsize=(4, 3), dpi=100)
+    fig = plt.figure(figsize=(4, 3), dpi=100)
+    draw_humidity_gauge(fig, humidity)
+    return encode_figure(fig, 'humidity_gauge', bbox_inches='tight', pad_inches=0.2)
+
+
+def draw_humidity_gauge(fig, humidity: float) -> None:
+    """
+    Draws the humidity gauge of `create_humidity_gauge` into a figure or subfigure.
+    """
+    ax = fig.subplots()
     ax.set_xlim(-1.2, 1.2)
     ax.set_ylim(-0.2, 1.2)
     ax.axis('off')
@@ -124,13 +213,10 @@ def create_humidity_gauge(humidity: float) -> str:
             fontsize=20, color='#FF5722', 
             fontweight='bold')
 
-    buffer = BytesIO()
-    fig.savefig(buffer, format='png', bbox_inches='tight', pad_inches=0.2)
-    plt.close()
-    return base64.b64encode(buffer.getvalue()).decode()
-
 
 
+@cached_chart('wind_rose')
+@timed_chart('wind_rose')
 def create_wind_rose(wind_speeds: list, wind_directions: list) -> str:
     
     """
@@ -160,7 +246,18 @@ def create_wind_rose(wind_speeds: list, wind_directions: list) -> str:
     if not wind_speeds or not wind_directions:
         raise ValueError("No wind data available to plot.")
     
-    fig, ax = plt.subplots(figsize=(7, 7), subplot_kw={'polar': True})
+    fig = plt.figure(figsize=(7, 7))
+    draw_wind_rose(fig, wind_speeds, wind_directions)
+    
+    # Convert the image to base64 encoding
+    return encode_figure(fig, 'wind_rose')
+
+
+def draw_wind_rose(fig, wind_speeds: list, wind_directions: list) -> None:
+    """
+    Draws the wind rose of `create_wind_rose` into a figure or subfigure.
+    """
+    ax = fig.subplots(subplot_kw={'polar': True})
     # Set the zero location to North
     # Set the direction of increasing theta to clockwise
     
@@ -178,19 +275,12 @@ def create_wind_rose(wind_speeds: list, wind_directions: list) -> str:
     
     ax.set_xticks(np.deg2rad(np.arange(0, 360, 45)))
     ax.set_xticklabels(['E', 'NE', 'N', 'NW', 'W', 'SW', 'S', 'SE'])
-    
-    # Convert the image to base64 encoding
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png')
-    buf.seek(0)
-    image_base64 = base64.b64encode(buf.read()).decode('utf-8')
-    plt.close(fig)
-    
-    return image_base64
 
 
+@cached_chart('temperature_chart')
+@timed_chart('temperature_chart')
 def create_temperature_chart(daily_highs: list, daily_lows: list, 
-                            daily_averages: list, dates: list) -> str:
+                            daily_averages: list, dates: list, units: str = CANONICAL_UNITS) -> str:
     """
     Create a temperature chart and return the corresponding base64 string.
 
@@ -199,6 +289,7 @@ def create_temperature_chart(daily_highs: list, daily_lows: list,
     daily_lows (List[float]): A list of daily low temperatures.
     daily_averages (List[float]): A list of daily average temperatures.
     dates (List[str]): A list of dates corresponding to the temperature data.
+    units (str): The unit system of the temperatures, used in the axis labels.
 
     Returns:
     str: A base64 encoded string representing the temperature chart image.
@@ -216,15 +307,26 @@ def create_temperature_chart(daily_highs: list, daily_lows: list,
         
         It should return a Base64 encoding of a string type (specific example results are not displayed because the image converted to encoding is too long) 
    """
+    fig = plt.figure(figsize=(6, 3.5))
+    draw_temperature_chart(fig, daily_highs, daily_lows, daily_averages, dates, units)
+
+    # Save the image to memory
+    return encode_figure(fig, 'temperature_chart', bbox_inches='tight')
+
 
+def draw_temperature_chart(fig, daily_highs: list, daily_lows: list,
+                           daily_averages: list, dates: list, units: str = CANONICAL_UNITS) -> None:
+    """
+    Draws the temperature chart of `create_temperature_chart` into a figure or subfigure.
+    """
     # Plotting the temperature chart
-    fig, ax1 = plt.subplots(figsize=(6, 3.5))
+    ax1 = fig.subplots()
 
     # Line plots for daily high and low temperatures
     ax1.plot(range(5), daily_highs, label='Daily High', color='red', marker='o')
     ax1.plot(range(5), daily_lows, label='Daily Low', color='blue', marker='o')
     ax1.set_xlabel('Date')
-    ax1.set_ylabel('Temperature (°C)', color='black')
+    ax1.set_ylabel(f"Temperature ({unit_symbol('temperature', units)})", color='black')
     ax1.set_xticks(range(5))
     ax1.set_xticklabels(dates, rotation=45, ha='right')
     ax1.tick_params(axis='y', labelcolor='black')
@@ -233,7 +335,7 @@ def create_temperature_chart(daily_highs: list, daily_lows: list,
     # Bar chart for average temperature
     ax2 = ax1.twinx()
     ax2.bar(range(5), daily_averages, color='green', alpha=0.6, label='Average Temperature')
-    ax2.set_ylabel('Average Temperature (°C)', color='green')
+    ax2.set_ylabel(f"Average Temperature ({unit_symbol('temperature', units)})", color='green')
     ax2.tick_params(axis='y', labelcolor='green')
     ax2.legend(loc='upper right')
 
@@ -243,15 +345,47 @@ def create_temperature_chart(daily_highs: list, daily_lows: list,
     ax1.set_ylim(min_temp - 5, max_temp + 5)
     ax2.set_ylim(min_temp - 5, max_temp + 5)
 
-    # Save the image to memory
-    buf = BytesIO()
-    plt.savefig(buf, format='png', bbox_inches='tight')
-    buf.seek(0)
-    image_base64 = base64.b64encode(buf.read()).decode('utf-8')
-    plt.close(fig)
+@timed_chart('temperature_trend')
+def create_temperature_trend_chart(times, temperatures, max_points: int = 2000, units: str = CANONICAL_UNITS) -> str:
+    """
+    Create a long-range temperature trend chart and return the corresponding base64 string.
+
+    Args:
+    times (numpy.ndarray): Observation times in Unix seconds, for example a slice returned by TrendArchive.read.
+    temperatures (numpy.ndarray): The temperatures observed at those times.
+    max_points (int): The maximum number of points drawn; longer series are thinned with a strided view.
+    units (str): The unit system to display; the temperatures are given in the canonical metric units.
+
+    Returns:
+    str: A base64 encoded string representing the temperature trend chart image.
+
+    Description:
+    This function draws multi-month or multi-year temperature histories next to the
+    5-day temperature chart. The arrays are used as given (memory-mapped slices work
+    directly), and only the thinned points are converted for plotting.
+
+    Usage Example:
+        >>> times, values = trend_archive.read('Guangzhou', 1700000000, 1739900000)
+        >>> create_temperature_trend_chart(times, values['temperature'])
 
-    return image_base64
+        It should return a Base64 encoding of a string type (specific example results are not displayed because the image converted to encoding is too long)
+    """
+    step = max(1, -(-len(times) // max_points))  # Ceiling division
+    plot_times = np.asarray(times[::step]).astype('datetime64[s]')
+    plot_temperatures = convert_temperature(np.asarray(temperatures[::step]), units)
+
+    fig, ax = plt.subplots(figsize=(10, 3.5))
+    ax.plot(plot_times, plot_temperatures, color='#2196F3', linewidth=1)
+    ax.set_xlabel('Date')
+    ax.set_ylabel(f"Temperature ({unit_symbol('temperature', units)})")
+    ax.grid(True, alpha=0.3)
+    fig.autofmt_xdate()
+
+    return encode_figure(fig, 'temperature_trend', bbox_inches='tight')
 
+
+@cached_chart('precipitation_pies')
+@timed_chart('precipitation_pies')
 def create_precipitation_chances_pie_charts(precipitation_chances: list, dates: list) -> str:
     
     """
@@ -271,11 +405,24 @@ def create_precipitation_chances_pie_charts(precipitation_chances: list, dates:
         It should return a Base64 encoding of a string type (specific example results are not displayed because the image converted to encoding is too long) 
     """
     # Set the size of the figure
-    plt.figure(figsize=(15, 5))
+    fig = plt.figure(figsize=(15, 5))
+    draw_precipitation_chances_pie_charts(fig, precipitation_chances, dates)
 
+    # Adjust the spacing between subplots
+    fig.tight_layout()
+
+    # Encode the figure as a base64 PNG string
+    return encode_figure(fig, 'precipitation_pies', bbox_inches='tight', pad_inches=0.2)
+
+
+def draw_precipitation_chances_pie_charts(fig, precipitation_chances: list, dates: list) -> None:
+    """
+    Draws the pie charts of `create_precipitation_chances_pie_charts` into a figure or subfigure,
+    before the spacing is adjusted.
+    """
     # Plot a pie chart for each date
     for i, (date, chance) in enumerate(zip(dates, precipitation_chances)):
-        ax = plt.subplot(1, len(dates), i + 1)
+        ax = fig.add_subplot(1, len(dates), i + 1)
         
         # Draw the pie chart
     result = ax.pie(
@@ -304,18 +451,9 @@ def create_precipitation_chances_pie_charts(precipitation_chances: list, dates:
         ax.text(0.5, -0.3, date, transform=ax.transAxes, ha='center', va='center', fontsize=25,
                 fontweight='bold', fontstyle='italic', color='#6A5ACD')
 
-    # Adjust the spacing between subplots
-    plt.tight_layout()
-
-    # Save the figure to a BytesIO object
-    buffer = BytesIO()
-    plt.savefig(buffer, format='png', bbox_inches='tight', pad_inches=0.2)
-    plt.close()
-    
-    # Return the base64 encoded image string
-    return base64.b64encode(buffer.getvalue()).decode()
-
 
+@cached_chart('forecast_table')
+@timed_chart('forecast_table')
 def create_weather_forecast_table(weather_icons: list, weather_conditions: list, dates: list) -> str:
     """
     Creates a weather forecast table with icons and descriptions for the next five days and returns a base64 encoded image string.
@@ -336,13 +474,26 @@ def create_weather_forecast_table(weather_icons: list, weather_conditions: list,
         It should return a Base64 encoding of a string type (specific example results are not displayed because the image converted to encoding is too long) 
     """
 
+    fig = plt.figure(figsize=(15, 6))
+    draw_weather_forecast_table(fig, weather_icons, weather_conditions, dates)
+    fig.tight_layout()
+
+    # Encode the figure as a base64 PNG string
+    return encode_figure(fig, 'forecast_table', bbox_inches='tight', pad_inches=0.2)
+
+
+def draw_weather_forecast_table(fig, weather_icons: list, weather_conditions: list, dates: list) -> None:
+    """
+    Draws the forecast table of `create_weather_forecast_table` into a figure or subfigure,
+    before the spacing is adjusted.
+    """
     # Create the plot
-    fig, axs = plt.subplots(3, 5, figsize=(15, 6), gridspec_kw={'height_ratios': [0.5, 0.3, 0.2]})
+    axs = fig.subplots(3, 5, gridspec_kw={'height_ratios': [0.5, 0.3, 0.2]})
 
     # Populate the plot
     for i in range(5):
-        # Fetch and display the weather icon
-        icon = get_weather_icon(weather_icons[i])
+        # Fetch and display the weather icon; an image is used as it is (the warm-up passes local ones)
+        icon = weather_icons[i] if isinstance(weather_icons[i], Image.Image) else get_weather_icon(weather_icons[i])
         resized_icon = icon.resize((80, 80))  # Resize the icon
         axs[0, i].imshow(resized_icon, aspect='equal')
         axs[0, i].axis('off')
@@ -356,13 +507,3 @@ def create_weather_forecast_table(weather_icons: list, weather_conditions: list,
         axs[2, i].text(0.5, 0.15, dates[i], ha='center', va='center', fontsize=19,
                        fontweight='bold', fontstyle='italic', color='#6A5ACD')
         axs[2, i].axis('off')
-
-    plt.tight_layout()
-
-    # Save the figure to a BytesIO object
-    buffer = BytesIO()
-    plt.savefig(buffer, format='png', bbox_inches='tight', pad_inches=0.2)
-    plt.close()
-
-    # Return the base64 encoded image string
-    return base64.b64encode(buffer.getvalue()).decode()
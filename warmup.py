@@ -0,0 +1,163 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from config import CHART_RENDERER, FORECAST_TABLE_RENDERER
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+warm_up_seconds = registry.gauge(
+    "weather_warm_up_seconds", "Render time of each chart during warm-up, first render and steady state.")
+
+
+def _synthetic_charts() -> List[Tuple[str, Callable[..., str], Tuple[Any, ...]]]:
+    # Imported here so that building the list is what loads matplotlib
+    import numpy as np
+    from PIL import Image
+
+    from visualization import (create_temperature_progressbar, create_humidity_gauge, create_wind_rose,
+                               create_temperature_chart, create_temperature_trend_chart,
+                               create_precipitation_chances_pie_charts, create_weather_forecast_table)
+
+    dates = ['2025-02-18', '2025-02-19', '2025-02-20', '2025-02-21', '2025-02-22']
+    # Local stand-ins of the OpenWeatherMap icons, so the forecast table renders without a request
+    icons = [Image.new('RGBA', (50, 50), color) for color in
+             ('#f5b800', '#c8c8c8', '#4a90d9', '#8a8a8a', '#ffffff')]
+    trend_times = np.arange(1_700_000_000, 1_700_000_000 + 500 * 3600, 3600, dtype=np.int64)
+    charts = [
+        ('temperature_progressbar', create_temperature_progressbar, (21.5,)),
+        ('humidity_gauge', create_humidity_gauge, (64,)),
+        ('wind_rose', create_wind_rose, ([2.1, 3.4, 5.0, 1.2, 0.8, 4.4, 6.1, 2.9], [10, 45, 90, 135, 180, 225, 270, 315])),
+        ('temperature_chart', create_temperature_chart,
+         ([25.0, 26.1, 24.3, 23.8, 27.2], [17.0, 18.4, 16.9, 15.5, 19.1], [21.0, 22.2, 20.6, 19.7, 23.1], dates)),
+        ('temperature_trend', create_temperature_trend_chart,
+         (trend_times, (20 + 5 * np.sin(np.arange(len(trend_times)) / 24)).astype(np.float32))),
+        ('precipitation_pies', create_precipitation_chances_pie_charts, ([0.1, 0.35, 0.8, 0.0, 0.55], dates)),
+        ('forecast_table', create_weather_forecast_table,
+         (icons, ['clear sky', 'few clouds', 'rain', 'broken clouds', 'snow'], dates)),
+    ]
+    if CHART_RENDERER == 'atlas':
+        from chart_atlas import create_chart_atlas
+        charts.append(('atlas', create_chart_atlas,
+                       (21.5, 64, [2.1, 3.4, 5.0, 1.2, 0.8, 4.4, 6.1, 2.9], [10, 45, 90, 135, 180, 225, 270, 315],
+                        [25.0, 26.1, 24.3, 23.8, 27.2], [17.0, 18.4, 16.9, 15.5, 19.1], [21.0, 22.2, 20.6, 19.7, 23.1],
+                        [10, 35, 80, 0, 55], dates)))
+    # The HTML forecast table renders nothing, so there is nothing to warm up
+    return [chart for chart in charts if chart[0] != 'forecast_table' or FORECAST_TABLE_RENDERER == 'image']
+
+
+class ChartWarmUp:
+    """
+    Renders every chart on synthetic data so that a fresh worker pays its one-time costs before serving.
+
+    The first render of each chart loads the matplotlib backend, discovers and caches fonts,
+    and sets up projections (the polar wind rose) and gridspec layouts. Each chart is rendered
+    twice: the first time is the cold cost, the second the steady-state cost, and both are
+    reported by `status` and the weather_warm_up_seconds gauge. The image forecast table is drawn
+    with local icons, so the warm-up sends no request; a chart that fails is logged and skipped.
+
+    Usage Example:
+        >>> chart_warm_up = ChartWarmUp()
+        >>> chart_warm_up.start()
+        >>> chart_warm_up.status()['ready']
+        False
+    """
+
+    def __init__(self) -> None:
+        self.state = "pending"
+        self.timings: Dict[str, Dict[str, float]] = {}
+        self.errors: Dict[str, str] = {}
+        self.seconds = 0.0
+        self.import_seconds = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.state in ("ready", "skipped")
+
+    def skip(self) -> None:
+        """
+        Marks the worker ready without warming up, for when warm-up is disabled.
+        """
+        self.state = "skipped"
+
+    def start(self) -> threading.Thread:
+        """
+        Runs `run` in a daemon thread, so the worker serves requests (and reports its progress) while warming up.
+
+        Returns:
+            threading.Thread: The started thread.
+        """
+        thread = threading.Thread(target=self.run, name="chart-warm-up", daemon=True)
+        thread.start()
+        return thread
+
+    def run(self) -> None:
+        """
+        Renders every chart twice and records the first-render and steady-state times.
+
+        Only the first call does any work; later calls return at once.
+        """
+        with self._lock:
+            if self.state != "pending":
+                return
+            self.state = "running"
+        start = time.perf_counter()
+        charts = _synthetic_charts()
+        self.import_seconds = time.perf_counter() - start
+        for name, function, arguments in charts:
+            function = getattr(function, "uncached", function)  # Measure rendering, not the chart cache
+            try:
+                timings = {}
+                for phase in ("first", "steady"):
+                    render_start = time.perf_counter()
+                    function(*arguments)
+                    timings[phase] = time.perf_counter() - render_start
+                    warm_up_seconds.set(timings[phase], chart=name, phase=phase)
+                self.timings[name] = timings
+            except Exception as error:
+                logger.exception("Warm-up of the %s chart failed", name)
+                self.errors[name] = str(error)
+        self.seconds = time.perf_counter() - start
+        self.state = "ready"
+        logger.info("Chart warm-up finished in %.2f s (%.2f s loading matplotlib): %s",
+                    self.seconds, self.import_seconds, ", ".join(
+            f"{name} {timings['first'] * 1000:.0f} ms first, {timings['steady'] * 1000:.0f} ms steady"
+            for name, timings in self.timings.items()))
+
+    def status(self) -> Dict[str, Any]:
+        """
+        Reports whether the worker is warm, with the render time of each chart in milliseconds.
+
+        Returns:
+            dict: The readiness, the warm-up state and duration, the time spent importing the
+            chart modules, the per-chart timings and any errors.
+        """
+        return {
+            'ready': self.ready,
+            'state': self.state,
+            'warm_up_ms': round(self.seconds * 1000, 1),
+            'import_ms': round(self.import_seconds * 1000, 1),
+            'charts': {name: {'first_ms': round(timings['first'] * 1000, 1),
+                              'steady_ms': round(timings['steady'] * 1000, 1)}
+                       for name, timings in self.timings.items()},
+            'errors': self.errors,
+        }
+
+
+# Warm-up state of this worker
+chart_warm_up = ChartWarmUp()
+
+
+if __name__ == "__main__":
+    # Report the cold and steady-state render times of a fresh process
+    chart_warm_up.run()
+    report = chart_warm_up.status()
+    print(f"Warm-up {report['warm_up_ms']:.0f} ms, of which {report['import_ms']:.0f} ms importing the chart modules")
+    print(f"{'chart':<26} {'first ms':>10} {'steady ms':>10}")
+    for name, timings in report['charts'].items():
+        print(f"{name:<26} {timings['first_ms']:>10.1f} {timings['steady_ms']:>10.1f}")
+    for name, error in report['errors'].items():
+        print(f"{name:<26} failed: {error}")
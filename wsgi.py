@@ -0,0 +1,33 @@
+"""
+Production entry point of the RESTful API.
+
+The API is built by `create_app`, an app factory configured entirely from the
+environment (see config.py), and served by gunicorn with one process per core
+and several threads per process:
+
+    WEATHER_API_CITY=Guangzhou gunicorn -c gunicorn.conf.py
+
+Any other WSGI server can load `wsgi:create_app()` as well.
+"""
+from flask import Flask
+
+from config import WEATHER_API_CITY
+from restful_api import create_api
+
+
+def create_app() -> Flask:
+    """
+    Builds the weather data API of the city named by the WEATHER_API_CITY environment variable.
+
+    Each worker process calls this once after it starts, so no database connection or
+    fetched data is shared across a fork.
+
+    Returns:
+        Flask: The WSGI application.
+
+    Raises:
+        RuntimeError: If WEATHER_API_CITY is not set.
+    """
+    if not WEATHER_API_CITY.strip():
+        raise RuntimeError("Set WEATHER_API_CITY to the city the API serves")
+    return create_api(WEATHER_API_CITY)